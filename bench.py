@@ -0,0 +1,500 @@
+"""
+Офлайн-бенчмарк восприятия на записи (MP4 или каталог dataset/).
+Гоняет analyze_frame -> make_advice -> draw_overlay по кадрам ReplaySource и печатает
+пропускную способность и p50/p95/p99 по этапам. Игра не нужна — работает на Linux.
+
+    python bench.py --replay captures/wot_capture.mp4 --save-baseline
+    python bench.py --replay dataset/            # сравнить с базовой линией
+По умолчанию планировщик выключен и все детекторы работают каждый кадр: при планировщике время
+этапов зависит от частот детекторов и часов, а не от стоимости кода. Режим (планировщик, бюджет,
+процессы) пишется в результат, и с базовой линией другого режима сравнение не делается.
+    python bench.py --capture 300                # ScreenSource: весь кадр против capture.roi_only (нужен X/Xvfb)
+    python bench.py --minimap-micro              # detect_minimap на синтетике с 5/30/200 маркерами
+    python bench.py --tracker-micro              # трекер миникарты против detect_minimap на той же синтетике
+    python bench.py --shared-pool                # SharedFramePool: блоки не растут при кадрах на руках (код 1 — растут)
+    python bench.py --replay dataset/ --scheduled     # с планировщиком из конфига (как в main.py)
+    python bench.py --replay dataset/ --hud-model     # YOLO-модель HUD против HSV/шаблонов на тех же ROI
+    python bench.py --replay dataset/ --procs-scaling 4   # детекторы в 1..4 процессах (framebus.py)
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+import cv2
+import numpy as np
+import yaml
+import startup
+from capture import ReplaySource, ScreenSource, roi_grab_config, recycle
+import framebus
+from detectors import get_scheduler, close_scheduler
+from hud_model import get_hud_model, model_rois
+from layout import get_layout
+from perception import analyze_frame, detect_hud_icons, detect_minimap
+from templates import get_registry
+from tracker import MinimapTracker
+from overlay import draw_overlay
+from policy import make_advice
+
+STAGES = ('read', 'hud_icons', 'minimap', 'status_ocr', 'damage_log', 'analyze_frame',
+          'make_advice', 'draw_overlay', 'frame')
+
+
+def summarize(samples):
+    """Секунды -> миллисекунды: mean/p50/p95/p99/max."""
+    if not samples:
+        return None
+    a = np.asarray(samples, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(a, [50, 95, 99])
+    return {'n': int(a.size), 'mean_ms': float(a.mean()), 'p50_ms': float(p50),
+            'p95_ms': float(p95), 'p99_ms': float(p99), 'max_ms': float(a.max())}
+
+
+def _gc_collections():
+    return sum(s['collections'] for s in gc.get_stats())
+
+
+def run(src, cfg, max_frames=0, warmup=5, trace_alloc=False):
+    """trace_alloc — мерить пиковый объём временных аллокаций на кадр через tracemalloc (медленнее)."""
+    samples = {k: [] for k in STAGES}
+    alloc = []
+    n = 0
+    t_start = None
+    gc_start = None
+    if trace_alloc:
+        tracemalloc.start()
+    while True:
+        if trace_alloc:
+            tracemalloc.reset_peak()
+            base_mem = tracemalloc.get_traced_memory()[0]
+        t_read = time.perf_counter()
+        ok, frame = src.read()
+        if not ok or frame is None:
+            break
+        timings = {'read': time.perf_counter() - t_read}
+        t0 = time.perf_counter()
+        state = analyze_frame(frame, cfg, timings=timings)
+        t1 = time.perf_counter()
+        advice = make_advice(state)
+        t2 = time.perf_counter()
+        draw_overlay(frame, state, advice, cfg, 0.0)
+        t3 = time.perf_counter()
+        recycle(src, frame)
+
+        n += 1
+        if n <= warmup:
+            continue
+        if t_start is None:
+            t_start = t_read
+            gc_start = _gc_collections()
+        if trace_alloc:
+            alloc.append(tracemalloc.get_traced_memory()[1] - base_mem)
+        timings.update({'analyze_frame': t1 - t0, 'make_advice': t2 - t1,
+                        'draw_overlay': t3 - t2, 'frame': t3 - t0})
+        for k, v in timings.items():
+            samples.setdefault(k, []).append(v)
+        if max_frames and n - warmup >= max_frames:
+            break
+
+    measured = max(0, n - warmup)
+    wall = (time.perf_counter() - t_start) if t_start is not None else 0.0
+    result = {
+        'frames': measured,
+        'wall_s': wall,
+        'throughput_fps': (measured / wall) if wall > 0 else 0.0,
+        'gc_collections': (_gc_collections() - gc_start) if gc_start is not None else 0,
+        'stages': {k: summarize(v) for k, v in samples.items() if v},
+    }
+    if trace_alloc:
+        tracemalloc.stop()
+        if alloc:
+            result['alloc_peak_mb'] = {'mean': float(np.mean(alloc)) / 1e6, 'max': float(np.max(alloc)) / 1e6}
+    pool = getattr(src, 'pool', None)
+    if pool is not None:
+        result['frame_pool'] = dict(pool.stats)
+    sched = get_scheduler(cfg)
+    result['detectors'] = sched.stats
+    if sched.executor is not None:
+        result['procs'] = dict(sched.executor.stats, workers=len(sched.executor.groups))
+    return result
+
+
+def _replay_source(path, cfg, fps=0):
+    """ReplaySource; с procs.enabled — в разделяемый пул, и воркеры прогреты до замеров."""
+    src = ReplaySource(path, fps=fps)
+    if (cfg.get('procs', {}) or {}).get('enabled', False):
+        framebus.share_source(src, framebus.get_frame_pool(cfg))
+        executor = get_scheduler(cfg).executor
+        while startup.loading():
+            executor.poll()
+            time.sleep(0.05)
+    return src
+
+
+def bench_procs_scaling(path, cfg, max_procs, max_frames=0, warmup=5):
+    """Пропускная способность: детекторы в главном процессе против 1..max_procs воркеров."""
+    rows = []
+    for workers in [0] + list(range(1, max_procs + 1)):
+        close_scheduler()
+        cfg['procs'] = {'enabled': bool(workers), 'workers': workers}
+        src = _replay_source(path, cfg)
+        try:
+            result = run(src, cfg, max_frames=max_frames, warmup=warmup)
+        finally:
+            src.release()
+            close_scheduler()
+        procs = result.get('procs') or {}
+        rows.append({'workers': workers, 'procs': procs.get('workers', 0),
+                     'throughput_fps': result['throughput_fps'],
+                     'analyze_p50_ms': result['stages']['analyze_frame']['p50_ms'],
+                     'ipc_ms': procs.get('ipc_ms', 0.0), 'staged': procs.get('staged', 0)})
+    base = rows[0]['throughput_fps'] or 1.0
+    print(f"{'workers':<10}{'procs':>6}{'fps':>9}{'x':>7}{'analyze p50':>13}{'ipc':>8}{'staged':>8}")
+    for r in rows:
+        print(f"{r['workers'] or 'inline':<10}{r['procs']:>6}{r['throughput_fps']:>9.1f}"
+              f"{r['throughput_fps'] / base:>7.2f}{r['analyze_p50_ms']:>13.3f}{r['ipc_ms']:>8.3f}{r['staged']:>8}")
+    return rows
+
+
+def bench_mode(cfg):
+    """Режим прогона, от которого зависят цифры: планировщик и его бюджет, процессы-воркеры."""
+    scfg = cfg.get('scheduler', {}) or {}
+    pcfg = cfg.get('procs', {}) or {}
+    scheduled = bool(scfg.get('enabled', True))
+    return {'scheduler': scheduled,
+            'budget_ms': float(scfg.get('budget_ms', 8.0)) if scheduled else None,
+            'procs': int(pcfg.get('workers', 0) or 0) if pcfg.get('enabled', False) else None}
+
+
+def compare(result, baseline, tolerance, min_delta_ms=0.05):
+    """Список регрессий: этап, метрика, было, стало (p50/p95 хуже на tolerance и больше min_delta_ms)."""
+    regressions = []
+    for stage, cur in result['stages'].items():
+        base = (baseline.get('stages') or {}).get(stage)
+        if not base:
+            continue
+        for key in ('p50_ms', 'p95_ms'):
+            was, now = base[key], cur[key]
+            if now > was * (1.0 + tolerance) and now - was > min_delta_ms:
+                regressions.append((stage, key, was, now))
+    base_fps = baseline.get('throughput_fps') or 0.0
+    if base_fps and result['throughput_fps'] < base_fps * (1.0 - tolerance):
+        regressions.append(('total', 'throughput_fps', base_fps, result['throughput_fps']))
+    return regressions
+
+
+def bench_capture(cfg, frames):
+    """Время read() у ScreenSource: полный кадр против ROI-only на той же области."""
+    region = cfg.get('screen_region', [0, 0, 1920, 1080])
+    roi_cfg = dict(cfg, capture=dict(cfg.get('capture') or {}, roi_only=True))
+    results = {}
+    for name, roi_grab in (('full', None), ('roi_only', roi_grab_config(roi_cfg))):
+        src = ScreenSource(region, roi_grab=roi_grab)
+        samples = []
+        try:
+            for _ in range(frames):
+                t0 = time.perf_counter()
+                src.read()
+                samples.append(time.perf_counter() - t0)
+        finally:
+            src.release()
+        results[name] = summarize(samples[5:])
+        s = results[name]
+        print(f"[bench] capture {name:<9} p50 {s['p50_ms']:.2f}ms  p95 {s['p95_ms']:.2f}ms  "
+              f"-> {1000.0 / s['mean_ms']:.0f} fps")
+    return results
+
+
+def _hsv_mid_bgr(low, high):
+    hsv = np.uint8([[[(a + b) // 2 for a, b in zip(low, high)]]])
+    return tuple(int(v) for v in cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)[0, 0])
+
+
+def bench_minimap(cfg, counts=(5, 30, 200), size=360, repeats=300):
+    """Микробенчмарк detect_minimap: синтетическая миникарта с N маркерами (пополам враги/союзники)."""
+    hsv_cfg = cfg['minimap_hsv']
+    colours = (_hsv_mid_bgr(hsv_cfg['enemy_low'], hsv_cfg['enemy_high']),
+               _hsv_mid_bgr(hsv_cfg['ally_low'], hsv_cfg['ally_high']))
+    mcfg = cfg.get('minimap', {}) or {}
+    kwargs = {k: mcfg[k] for k in ('cluster_radius',) if k in mcfg}
+    rng = np.random.default_rng(0)
+    results = {}
+    for n in counts:
+        mini = np.full((size, size, 3), (30, 80, 50), np.uint8)
+        for i in range(n):
+            x, y = rng.integers(6, size - 6, 2)
+            cv2.circle(mini, (int(x), int(y)), 4, colours[i % 2], -1)
+        samples = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            detect_minimap(mini, hsv_cfg, **kwargs)
+            samples.append(time.perf_counter() - t0)
+        results[n] = summarize(samples)
+        print(f"[bench] detect_minimap {n:>4} маркеров: p50 {results[n]['p50_ms']:.3f}ms  "
+              f"p95 {results[n]['p95_ms']:.3f}ms")
+    return results
+
+
+def bench_tracker(cfg, counts=(5, 30, 200), size=360, frames=300, fps=60.0):
+    """
+    MinimapTracker против detect_minimap на синтетике: N движущихся маркеров, часть исчезает и
+    появляется в новом месте. Локальные кадры трекера должны быть дешевле полного прохода;
+    при большом числе маркеров трекер сам уходит в полные кадры (tracker.max_local_area).
+    """
+    hsv_cfg = cfg['minimap_hsv']
+    colours = (_hsv_mid_bgr(hsv_cfg['enemy_low'], hsv_cfg['enemy_high']),
+               _hsv_mid_bgr(hsv_cfg['ally_low'], hsv_cfg['ally_high']))
+    tcfg = cfg.get('tracker', {}) or {}
+    results = {}
+    for n in counts:
+        rng = np.random.default_rng(0)
+        pos = rng.uniform(6, size - 6, (n, 2))
+        vel = rng.uniform(-20, 20, (n, 2))  # px/s
+        tracker = MinimapTracker(full_interval=tcfg.get('full_interval', 0.5),
+                                 max_local_area=tcfg.get('max_local_area', 0.25))
+        samples = {'detect_minimap': [], 'tracker': [], 'tracker_local': []}
+        for i in range(frames):
+            pos += vel / fps
+            out = (pos < 6) | (pos > size - 6)
+            vel[out] *= -1
+            np.clip(pos, 6, size - 6, out=pos)
+            respawn = rng.random(n) < 0.005
+            pos[respawn] = rng.uniform(6, size - 6, (int(respawn.sum()), 2))
+            mini = np.full((size, size, 3), (30, 80, 50), np.uint8)
+            for k, (x, y) in enumerate(pos.astype(int).tolist()):
+                cv2.circle(mini, (x, y), 4, colours[k % 2], -1)
+            t0 = time.perf_counter()
+            detect_minimap(mini, hsv_cfg)
+            t1 = time.perf_counter()
+            state = tracker.update(mini, hsv_cfg, now=i / fps)
+            t2 = time.perf_counter()
+            samples['detect_minimap'].append(t1 - t0)
+            samples['tracker'].append(t2 - t1)
+            if state['tracker_mode'] == 'local':
+                samples['tracker_local'].append(t2 - t1)
+        results[n] = {k: summarize(v) for k, v in samples.items()}
+        results[n]['local_share'] = tracker.stats['local'] / float(frames)
+        r = results[n]
+        local = f"{r['tracker_local']['p50_ms']:.3f}ms" if r['tracker_local'] else '-'
+        print(f"[bench] трекер {n:>4} маркеров: detect_minimap p50 {r['detect_minimap']['p50_ms']:.3f}ms, "
+              f"трекер p50 {r['tracker']['p50_ms']:.3f}ms (локальные кадры {local}, "
+              f"{r['local_share']:.0%} кадров)")
+    return results
+
+
+def bench_shared_pool(cfg, frames=1000, in_flight=6, shape=(1080, 1920, 3)):
+    """
+    SharedFramePool под конвейером: in_flight кадров на руках (захват, LatestSlot, воркер, очередь
+    результатов, отрисовка). Блоков разделяемой памяти должно быть ровно по одному на разрешение,
+    а поколение слота — меняться при каждой выдаче. Ошибка — список нарушений.
+    """
+    from collections import deque
+    pool = framebus.SharedFramePool(int((cfg.get('capture', {}) or {}).get('buffers', 4)))
+    held = deque()
+    problems = []
+    seen = {}
+    try:
+        for n in range(frames):
+            # на середине — смена разрешения: старый блок закрывается, когда вернётся его последний кадр
+            cur = shape if n < frames // 2 else (shape[0] // 2, shape[1] // 2, 3)
+            buf = pool.acquire(cur)
+            where = pool.locate(buf)
+            if where is None:
+                problems.append(f'кадр {n}: буфер вне разделяемой памяти (overflow {pool.stats["overflow"]})')
+            else:
+                block, slot, gen = where
+                if seen.get((id(block), slot)) == gen:
+                    problems.append(f'кадр {n}: слот {slot} выдан повторно с тем же поколением {gen}')
+                seen[(id(block), slot)] = gen
+            held.append(buf)
+            if len(held) > in_flight:
+                pool.release(held.popleft())
+            if len(pool._blocks) > (1 if n < frames // 2 else 2):
+                problems.append(f'кадр {n}: блоков {len(pool._blocks)}')
+                break
+        while held:
+            pool.release(held.popleft())
+        blocks = len(pool._blocks)
+    finally:
+        pool.close()
+    if blocks != 1:
+        problems.append(f'после смены разрешения осталось блоков: {blocks}')
+    print(f"[bench] SharedFramePool({pool.size}), кадров на руках {in_flight}: выделено {pool.stats['allocated']}, "
+          f"переиспользовано {pool.stats['reused']}, блоков в конце {blocks}")
+    for p in problems[:10]:
+        print(f'[bench] ОШИБКА {p}')
+    return {'stats': dict(pool.stats), 'blocks': blocks, 'problems': problems}
+
+
+def bench_hud_model(src, cfg, max_frames=0, warmup=5):
+    """На кадрах записи: батч модели по hud_model.rois против шаблонов прицела + detect_minimap."""
+    model = get_hud_model(cfg)
+    if model is None:
+        print('[bench] модели HUD нет (runs/hud/*/weights/best.pt или hud_model.weights) — сравнивать не с чем')
+        return None
+    names = model_rois(cfg)
+    registry = get_registry(cfg)
+    samples = {'model_batch': [], 'hsv_templates': []}
+    n = 0
+    while not max_frames or n - warmup < max_frames:
+        ok, frame = src.read()
+        if not ok or frame is None:
+            break
+        layout = get_layout(cfg, frame.shape)
+        crops = [layout.crop(frame, name) for name in names]
+        t0 = time.perf_counter()
+        model.infer(crops)
+        t1 = time.perf_counter()
+        detect_hud_icons(layout.crop(frame, 'crosshair'), registry)
+        detect_minimap(layout.crop(frame, 'minimap'), cfg['minimap_hsv'])
+        t2 = time.perf_counter()
+        recycle(src, frame)
+        n += 1
+        if n > warmup:
+            samples['model_batch'].append(t1 - t0)
+            samples['hsv_templates'].append(t2 - t1)
+    result = {k: summarize(v) for k, v in samples.items()}
+    for k, s in result.items():
+        if s:
+            print(f"[bench] {k:<14} ({len(names)} ROI): p50 {s['p50_ms']:.2f}ms  p95 {s['p95_ms']:.2f}ms")
+    return result
+
+
+def print_report(result):
+    print(f"[bench] кадров: {result['frames']}, время: {result['wall_s']:.2f}s, "
+          f"throughput: {result['throughput_fps']:.1f} fps, сборок GC: {result['gc_collections']}")
+    if 'mode' in result:
+        print(f"[bench] режим: {result['mode']}")
+    if 'alloc_peak_mb' in result:
+        a = result['alloc_peak_mb']
+        print(f"[bench] временные аллокации на кадр: {a['mean']:.2f} MB (макс {a['max']:.2f} MB)")
+    if 'frame_pool' in result:
+        print(f"[bench] пул кадров: {result['frame_pool']}")
+    if 'procs' in result:
+        p = result['procs']
+        print(f"[bench] воркеров: {p['workers']}, накладные IPC на кадр: {p['ipc_ms']:.3f}ms, "
+              f"скопировано вне общего пула: {p['staged']}, ошибок: {p['errors']}")
+    for name, d in (result.get('detectors') or {}).items():
+        print(f"[bench] детектор {name:<12} запусков {d['runs']:>5}  пропусков по бюджету {d['skipped']:>5}  "
+              f"~{d['cost_ms']:.2f}ms")
+    print(f"{'stage':<20}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for stage, s in result['stages'].items():
+        print(f"{stage:<20}{s['mean_ms']:>9.3f}{s['p50_ms']:>9.3f}{s['p95_ms']:>9.3f}"
+              f"{s['p99_ms']:>9.3f}{s['max_ms']:>9.3f}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--config', default='config.yaml')
+    ap.add_argument('--replay', default=None, help='MP4 или каталог кадров (dataset/)')
+    ap.add_argument('--capture', type=int, default=0, metavar='N',
+                    help='вместо replay замерить N чтений ScreenSource: весь кадр и capture.roi_only')
+    ap.add_argument('--minimap-micro', action='store_true', help='микробенчмарк detect_minimap (5/30/200 маркеров)')
+    ap.add_argument('--tracker-micro', action='store_true',
+                    help='трекер миникарты против detect_minimap на синтетике (5/30/200 маркеров)')
+    ap.add_argument('--shared-pool', action='store_true',
+                    help='проверить SharedFramePool (framebus.py): кадры на руках не плодят блоки')
+    ap.add_argument('--fps', type=float, default=0, help='темп воспроизведения, 0 — максимально быстро')
+    ap.add_argument('--frames', type=int, default=0, help='ограничить число измеряемых кадров')
+    ap.add_argument('--warmup', type=int, default=5)
+    ap.add_argument('--baseline', default='bench_baseline.json')
+    ap.add_argument('--save-baseline', action='store_true', help='записать результат как базовую линию')
+    ap.add_argument('--tolerance', type=float, default=0.15, help='допустимое ухудшение, доля')
+    ap.add_argument('--out', default=None, help='сохранить результат в JSON')
+    ap.add_argument('--alloc', action='store_true', help='замерить аллокации на кадр (tracemalloc)')
+    ap.add_argument('--hud-model', action='store_true',
+                    help='сравнить задержку YOLO-модели HUD и HSV/шаблонных детекторов на --replay')
+    ap.add_argument('--scheduled', action='store_true',
+                    help='детекторы по планировщику из конфига; по умолчанию — все каждый кадр')
+    ap.add_argument('--every-frame', action='store_true', help='режим по умолчанию (оставлен для совместимости)')
+    ap.add_argument('--procs', type=int, default=None, metavar='N',
+                    help='детекторы в N процессах-воркерах (procs.enabled; 0 — по процессу на группу)')
+    ap.add_argument('--procs-scaling', type=int, default=0, metavar='N',
+                    help='сравнить пропускную способность без воркеров и с 1..N воркерами')
+    args = ap.parse_args()
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        cfg = yaml.safe_load(f)
+    cfg.setdefault('ui', {})
+    if not args.scheduled:
+        cfg['scheduler'] = dict(cfg.get('scheduler') or {}, enabled=False)
+    if args.procs is not None:
+        cfg['procs'] = {'enabled': True, 'workers': args.procs}
+
+    if args.shared_pool:
+        result = bench_shared_pool(cfg)
+        return 1 if result['problems'] else 0
+    if args.capture or args.minimap_micro or args.tracker_micro:
+        if args.capture:
+            result = bench_capture(cfg, args.capture)
+        else:
+            result = bench_minimap(cfg) if args.minimap_micro else bench_tracker(cfg)
+        if args.out:
+            with open(args.out, 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2)
+        return 0
+    if not args.replay:
+        ap.error('нужен --replay, --capture, --minimap-micro или --tracker-micro')
+
+    # мерим установившийся режим: OCR/модель/шаблоны догружены до первого кадра
+    startup.start(cfg)
+    startup.wait()
+    if args.procs_scaling:
+        rows = bench_procs_scaling(args.replay, cfg, args.procs_scaling, max_frames=args.frames,
+                                   warmup=args.warmup)
+        if args.out:
+            with open(args.out, 'w', encoding='utf-8') as f:
+                json.dump(rows, f, indent=2)
+        return 0
+    src = _replay_source(args.replay, cfg, fps=args.fps)
+    if args.hud_model:
+        try:
+            result = bench_hud_model(src, cfg, max_frames=args.frames, warmup=args.warmup)
+        finally:
+            src.release()
+        if args.out and result:
+            with open(args.out, 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2)
+        return 0 if result else 2
+    try:
+        result = run(src, cfg, max_frames=args.frames, warmup=args.warmup, trace_alloc=args.alloc)
+    finally:
+        src.release()
+    if not result['frames']:
+        print('[bench] нет кадров для измерения (запись короче warmup?)')
+        return 2
+    result['replay'] = args.replay
+    result['mode'] = bench_mode(cfg)
+    result['created'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    print_report(result)
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f'[bench] базовая линия сохранена -> {args.baseline}')
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('mode') != result['mode']:
+            print(f"[bench] базовая линия снята в другом режиме ({baseline.get('mode') or 'режим не записан'}, "
+                  f"сейчас {result['mode']}): сравнивать нельзя, пересоздайте её с --save-baseline")
+            return 2
+        regressions = compare(result, baseline, args.tolerance)
+        for stage, key, was, now in regressions:
+            print(f'[bench] РЕГРЕССИЯ {stage}.{key}: {was:.3f} -> {now:.3f}')
+        if regressions:
+            return 1
+        print('[bench] регрессий нет')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,6 +2,7 @@ import argparse
 import yaml
 import cv2
 from capture import make_source
+from layout import base_size, to_base
 
 
 class RoiCalibrator:
@@ -102,7 +103,9 @@ def main():
 
     full['source'] = 'window'
     full['window'] = cfg['window']
-    full['rois'] = rois
+    # доли раскладки base: ROI переживают смену размера окна, монитора и пропорций (layout.py)
+    h, w = frame.shape[:2]
+    full['rois'] = {name: [round(v, 5) for v in r] for name, r in to_base(rois, w, h, base_size(full)).items()}
 
     with open('config.yaml', 'w', encoding='utf-8') as f:
         yaml.safe_dump(full, f, allow_unicode=True, sort_keys=False)
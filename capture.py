@@ -1,56 +1,569 @@
+import os
+import re
+import threading
 import time
 import cv2
 import numpy as np
 from mss import mss
+import metrics
+from layout import DEFAULT_BASE, base_size, layout_for
 
+PACE_SPIN_S = 0.0005  # последние полмиллисекунды до дедлайна — короткими sleep(0), а не одним sleep
+PACE_DOWN = 0.9       # adaptive: кадр выброшен потребителем -> темп * 0.9
+PACE_UP = 1.01        # adaptive: потребитель ждал кадр -> темп * 1.01
 
-def _sleep_if_needed(last_ts, fps_limit):
-    if fps_limit and fps_limit > 0:
-        dt = time.time() - last_ts[0]
-        need = max(0.0, (1.0 / fps_limit) - dt)
-        if need > 0:
-            time.sleep(need)
-        last_ts[0] = time.time()
+
+class Pacer:
+    """
+    Темп захвата по монотонным часам perf_counter. Дедлайны идут сеткой (следующий = прошлый + период),
+    поэтому пересып и время обработки не накапливаются; если отстали больше чем на период, сетка
+    начинается заново от текущего момента (без пачки «догоняющих» кадров). fps=0 — без ограничения.
+    adaptive: slower()/faster() от потребителя (pipeline.py) двигают темп между min_fps и max_fps —
+    не снимаем кадры, которые всё равно будут выброшены, и отдаём CPU игре.
+    """
+    def __init__(self, fps=0, adaptive=False, min_fps=10, max_fps=None):
+        self.max_fps = float(max_fps or fps or 120)
+        self.fps = float(fps) if fps else (self.max_fps if adaptive else 0.0)
+        self.min_fps = min(float(min_fps), self.max_fps)
+        self.adaptive = bool(adaptive)
+        self.woke = 0.0  # момент конца последнего ожидания (начало захвата)
+        self._next = None
+        self.stats = {'frames': 0, 'late': 0, 'waited': 0, 'wait_ms': 0.0, 'oversleep_ms': 0.0}
+
+    def wait(self):
+        """Дождаться дедлайна очередного кадра."""
+        now = time.perf_counter()
+        if self.fps <= 0:
+            self.woke = now
+            return
+        period = 1.0 / self.fps
+        if self._next is None or now - self._next > period:
+            if self._next is not None:
+                self.stats['late'] += 1
+            self._next = now
+        deadline = self._next
+        left = deadline - now
+        if left > PACE_SPIN_S:
+            time.sleep(left - PACE_SPIN_S)
+        while time.perf_counter() < deadline:
+            time.sleep(0)
+        self.woke = time.perf_counter()
+        self._next = deadline + period
+        st = self.stats
+        st['frames'] += 1
+        if left > 0:
+            metrics.add('pace_wait', self.woke - now, self.woke)
+            st['waited'] += 1
+            st['wait_ms'] += (self.woke - now) * 1000.0
+            # среднее только по кадрам, которые ждали: опоздавшие не спали и не пересыпали
+            st['oversleep_ms'] += ((self.woke - deadline) * 1000.0 - st['oversleep_ms']) / st['waited']
+
+    def slower(self):
+        if self.adaptive:
+            self.fps = max(self.min_fps, self.fps * PACE_DOWN)
+
+    def faster(self):
+        if self.adaptive:
+            self.fps = min(self.max_fps, self.fps * PACE_UP)
+
+
+def paced_start(src, t0):
+    """Начало собственно захвата: после ожидания темпа внутри src.read() (для замера capture)."""
+    pacer = getattr(src, 'pacer', None)
+    return max(t0, pacer.woke) if pacer is not None else t0
+
+
+def _bgra_view(shot):
+    """Кадр mss как (h, w, 4) uint8 без копирования."""
+    return np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+
+
+class FramePool:
+    """
+    Пул заранее выделенных непрерывных BGR-буферов одного размера.
+    Владение явное: acquire() отдаёт буфер со счётчиком ссылок 1, retain() добавляет владельца,
+    release() убирает; в пул буфер возвращается только когда владельцев не осталось, поэтому
+    занятый буфер никогда не перезаписывается. Если все max_size буферов заняты (кто-то не вернул
+    кадр), выдаётся обычный массив вне пула — утечка не портит чужие кадры, а видна в stats.
+    Свободными держится не больше keep буферов (size), лишние отдаются сборщику мусора.
+    """
+    def __init__(self, size=4, max_size=None):
+        self.size = max(1, int(size))
+        self.max_size = int(max_size) if max_size else self.size * 4
+        self.keep = self.size
+        self.shape = None
+        self._free = []
+        self._refs = {}  # id(buf) -> [buf, счётчик]
+        self._lock = threading.Lock()
+        self.stats = {'allocated': 0, 'reused': 0, 'overflow': 0}
+
+    def acquire(self, shape):
+        shape = tuple(shape)
+        with self._lock:
+            if shape != self.shape:
+                self.shape = shape  # сменилось разрешение — старые свободные буферы не нужны
+                for buf in self._free:
+                    self._discard(buf)
+                self._free.clear()
+            if self._free:
+                buf = self._free.pop()
+                self.stats['reused'] += 1
+            elif len(self._refs) < self.max_size:
+                buf = self._alloc(shape)
+                self.stats['allocated'] += 1
+            else:
+                self.stats['overflow'] += 1
+                return np.empty(shape, np.uint8)
+            self._refs[id(buf)] = [buf, 1]
+            self._handout(buf)
+            return buf
+
+    def _alloc(self, shape):
+        return np.empty(shape, np.uint8)
+
+    def _handout(self, buf):
+        """Буфер выдан под новый кадр (под замком пула); для подклассов."""
+
+    def _discard(self, buf):
+        """Буфер больше не вернётся в пул (под замком пула); для подклассов."""
+
+    def retain(self, buf):
+        with self._lock:
+            ref = self._refs.get(id(buf))
+            if ref is not None:
+                ref[1] += 1
+        return buf
+
+    def release(self, buf):
+        with self._lock:
+            ref = self._refs.get(id(buf))
+            if ref is None or ref[0] is not buf:
+                return
+            ref[1] -= 1
+            if ref[1] <= 0:
+                del self._refs[id(buf)]
+                if buf.shape == self.shape and len(self._free) < self.keep:
+                    self._free.append(buf)
+                else:
+                    self._discard(buf)
+
+
+def recycle(src, frame):
+    """Вернуть кадр, полученный из src.read(), в пул источника (если он есть)."""
+    pool = getattr(src, 'pool', None)
+    if pool is not None and frame is not None:
+        pool.release(frame)
+
+
+def retain(src, frame):
+    """Ещё один владелец кадра (например, фоновая запись); каждый владелец потом зовёт recycle()."""
+    pool = getattr(src, 'pool', None)
+    if pool is not None and frame is not None:
+        pool.retain(frame)
+    return frame
+
+
+def _grab_into(sct, bbox, pool):
+    """Снимок mss сразу в буфер пула: BGRA -> BGR одним проходом cvtColor без промежуточных массивов."""
+    shot = sct.grab(bbox)
+    buf = pool.acquire((shot.height, shot.width, 3))
+    cv2.cvtColor(_bgra_view(shot), cv2.COLOR_BGRA2BGR, dst=buf)
+    return buf
+
+
+def _retrieve_into(cap, pool):
+    """VideoCapture.retrieve() уже захваченного grab() кадра в буфер пула."""
+    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if w <= 0 or h <= 0:
+        return cap.retrieve()
+    buf = pool.acquire((h, w, 3))
+    ok, frame = cap.retrieve(buf)
+    if not ok or frame is not buf:
+        pool.release(buf)
+    return ok, frame
+
+
+def _read_into(cap, pool):
+    """VideoCapture.read() в буфер пула (OpenCV пишет в переданный массив, если совпадает размер)."""
+    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if w <= 0 or h <= 0:
+        return cap.read()
+    buf = pool.acquire((h, w, 3))
+    ok, frame = cap.read(buf)
+    if not ok or frame is not buf:
+        pool.release(buf)  # размер не совпал — OpenCV выделил свой массив
+    return ok, frame
+
+
+GRAB_OVERHEAD_PX = 20000  # условная «цена» одного вызова grab в пикселях (для выбора union/per_roi)
+
+
+class RoiGrabber:
+    """
+    Снимает с экрана только ROI (одним прямоугольником-объединением или по одному grab на ROI)
+    и раскладывает их по координатам в полноразмерный кадр из пула, так что crop()
+    и остальной код работают как раньше. Фон кадра (для превью) обновляется полным снимком
+    раз в full_interval секунд; need_full=True — полный снимок каждый кадр (запись видео/датасета).
+    rois — как в конфиге (доли или пиксели base); пиксели пересчитываются при смене размера области.
+    """
+    def __init__(self, sct, pool, rois, mode='auto', full_interval=0.5, base=DEFAULT_BASE):
+        self.sct = sct
+        self.pool = pool
+        self.rois = dict(rois or {})
+        self.base = tuple(base)
+        if not self.rois:
+            raise ValueError("Для захвата только ROI нужны rois в конфиге (python calibrate.py)")
+        self.mode_cfg = mode
+        self.full_interval = float(full_interval or 0)
+        self.need_full = False
+        self._size = None
+        self._rects = []
+        self.mode = None
+
+    def _setup(self, w, h):
+        rects = []
+        for x, y, rw, rh in layout_for(self.rois, w, h, self.base).px.values():
+            x0, y0 = max(0, x), max(0, y)
+            x1, y1 = min(w, x + rw), min(h, y + rh)
+            if x1 > x0 and y1 > y0:
+                rects.append((x0, y0, x1 - x0, y1 - y0))
+        if not rects:
+            rects = [(0, 0, w, h)]  # ROI вне кадра (другое разрешение?) — снимаем всё
+        ux0 = min(r[0] for r in rects)
+        uy0 = min(r[1] for r in rects)
+        ux1 = max(r[0] + r[2] for r in rects)
+        uy1 = max(r[1] + r[3] for r in rects)
+        union = (ux0, uy0, ux1 - ux0, uy1 - uy0)
+        mode = self.mode_cfg
+        if mode == 'auto':
+            per_roi = sum(r[2] * r[3] for r in rects) + GRAB_OVERHEAD_PX * len(rects)
+            mode = 'per_roi' if per_roi < union[2] * union[3] + GRAB_OVERHEAD_PX else 'union'
+        self.mode = mode
+        self._rects = rects if mode == 'per_roi' else [union]
+        self._size = (w, h)
+        self._bg = np.zeros((h, w, 3), np.uint8)  # последний полный кадр (фон для превью)
+        self._bg_ver = 0
+        self._buf_ver = {}  # id(буфера пула) -> версия фона в нём
+        self._last_full = 0.0
+        print(f"[capture] ROI-захват: {mode}, {len(self._rects)} прямоугольник(а), "
+              f"{sum(r[2] * r[3] for r in self._rects) / float(w * h):.1%} пикселей кадра")
+
+    def grab_full(self, bbox):
+        """Полный кадр области (для записи/превью)."""
+        w, h = bbox['width'], bbox['height']
+        if self._size != (w, h):
+            self._setup(w, h)
+        buf = _grab_into(self.sct, bbox, self.pool)
+        self._bg[:] = buf
+        self._bg_ver += 1
+        self._buf_ver[id(buf)] = self._bg_ver
+        self._last_full = time.monotonic()
+        return buf
+
+    def grab(self, bbox):
+        w, h = bbox['width'], bbox['height']
+        if self._size != (w, h):
+            self._setup(w, h)
+        if self.need_full or self._bg_ver == 0 or \
+                (self.full_interval and time.monotonic() - self._last_full >= self.full_interval):
+            return self.grab_full(bbox)
+
+        buf = self.pool.acquire((h, w, 3))
+        if self._buf_ver.get(id(buf)) != self._bg_ver:
+            buf[:] = self._bg  # фон в этом буфере устарел — один раз подтягиваем последний полный кадр
+            self._buf_ver[id(buf)] = self._bg_ver
+        for x, y, rw, rh in self._rects:
+            shot = self.sct.grab({"left": bbox['left'] + x, "top": bbox['top'] + y, "width": rw, "height": rh})
+            cv2.cvtColor(_bgra_view(shot), cv2.COLOR_BGRA2BGR, dst=buf[y:y + rh, x:x + rw])
+        return buf
 
 
 class ScreenSource:
-    def __init__(self, region):
+    def __init__(self, region, roi_grab=None, buffers=4, pacer=None):
         x, y, w, h = region
         self.bbox = {"left": int(x), "top": int(y), "width": int(w), "height": int(h)}
         self.sct = mss()
-        self._last_ts = [time.time()]
+        self.pacer = pacer or Pacer()
+        self.pool = FramePool(buffers)
+        self.roi_grabber = RoiGrabber(self.sct, self.pool, **roi_grab) if roi_grab else None
 
     def read(self):
-        _sleep_if_needed(self._last_ts, 0)
-        img = np.array(self.sct.grab(self.bbox))[:, :, :3]  # BGRA -> BGR
-        return True, img
+        self.pacer.wait()
+        if self.roi_grabber is not None:
+            return True, self.roi_grabber.grab(self.bbox)
+        return True, _grab_into(self.sct, self.bbox, self.pool)
 
     def release(self):
         self.sct.close()
 
 
+class StreamReader:
+    """
+    Поток, который непрерывно вычитывает VideoCapture: CAP_PROP_BUFFERSIZE=1 большинство бэкендов
+    (FFmpeg для RTMP/HLS) игнорирует, и без него медленное восприятие копит кадры в буфере,
+    а совет отстаёт на секунды. Кадры только grab() (демультиплексирование/декодирование без
+    перевода в BGR и копии); retrieve() — лишь для кадра, который ждёт read(): это первый кадр
+    после запроса, не старше одного интервала потока. Остальные считаются в stats['skipped'].
+    open() -> VideoCapture (и для переподключения после reconnect_after подряд неудачных grab).
+    realtime — читать в темпе CAP_PROP_FPS (локальный файл вместо живого потока).
+    stats: grabbed, delivered, skipped, errors, reconnects, age_ms (возраст отданного кадра),
+    lag_ms — насколько позиция потока (CAP_PROP_POS_MSEC) отстала от часов с самого «свежего»
+    момента; осмысленно, если бэкенд отдаёт настоящие метки времени (FFmpeg: RTMP/HLS, файлы).
+    """
+    def __init__(self, open_cap, pool, realtime=False, reconnect_after=30, name='stream-reader'):
+        self._open = open_cap
+        self.pool = pool
+        self.realtime = bool(realtime)
+        self.reconnect_after = int(reconnect_after)
+        self.eof = False
+        self.stats = {'grabbed': 0, 'delivered': 0, 'skipped': 0, 'errors': 0, 'reconnects': 0,
+                      'age_ms': 0.0, 'lag_ms': None}
+        self._cond = threading.Condition()
+        self._want = False
+        self._frame = None
+        self._grabbed_at = 0.0
+        self._stop = False
+        self.cap = open_cap()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self._loop()
+        finally:
+            # VideoCapture принадлежит этому потоку: освобождаем здесь, а не в close() — иначе
+            # зависший в grab() поток (RTMP/HLS без данных) остался бы с уже освобождённым cap
+            self.cap.release()
+            if self._stop:
+                with self._cond:
+                    if self._frame is not None:
+                        self.pool.release(self._frame)
+                        self._frame = None
+
+    def _loop(self):
+        period = 0.0
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if self.realtime else 0.0
+        if fps and fps > 0:
+            period = 1.0 / fps
+        next_t = time.perf_counter()
+        drift_min = None
+        fails = 0
+        while not self._stop:
+            if period:
+                next_t += period
+                left = next_t - time.perf_counter()
+                if left > 0:
+                    time.sleep(left)
+                else:
+                    next_t = time.perf_counter()
+            if not self.cap.grab():
+                fails += 1
+                self.stats['errors'] += 1
+                if self.realtime:
+                    break  # файл кончился
+                if fails >= self.reconnect_after:
+                    print('[capture] поток не отвечает, переподключение…')
+                    self.cap.release()
+                    time.sleep(1.0)
+                    self.cap = self._open()
+                    self.stats['reconnects'] += 1
+                    fails, drift_min = 0, None
+                else:
+                    time.sleep(0.01)
+                continue
+            fails = 0
+            t = time.perf_counter()
+            st = self.stats
+            st['grabbed'] += 1
+            pos = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+            if pos > 0:
+                drift = t * 1000.0 - pos
+                if drift_min is None or drift < drift_min:
+                    drift_min = drift
+                st['lag_ms'] = drift - drift_min
+            with self._cond:
+                want = self._want
+            if not want:
+                st['skipped'] += 1
+                continue
+            ok, frame = _retrieve_into(self.cap, self.pool)
+            if not ok:
+                st['errors'] += 1
+                continue
+            with self._cond:
+                if self._frame is not None:
+                    self.pool.release(self._frame)
+                self._frame, self._grabbed_at = frame, t
+                self._want = False
+                self._cond.notify_all()
+        with self._cond:
+            self.eof = True
+            self._cond.notify_all()
+
+    def read(self, timeout=1.0):
+        """Свежий кадр (ok, кадр из пула); (False, None) — за timeout кадра не было или поток закончился."""
+        with self._cond:
+            if self._frame is None:
+                self._want = True
+                self._cond.wait_for(lambda: self._frame is not None or self.eof, timeout)
+            frame, self._frame = self._frame, None
+            grabbed_at = self._grabbed_at
+        if frame is None:
+            return False, None
+        age = time.perf_counter() - grabbed_at
+        metrics.add('frame_age', age)
+        st = self.stats
+        st['delivered'] += 1
+        st['age_ms'] += (age * 1000.0 - st['age_ms']) / st['delivered']
+        return True, frame
+
+    def close(self):
+        """Остановить поток; cap он освобождает сам, когда выйдет из grab() (даже если позже timeout)."""
+        self._stop = True
+        self._thread.join(timeout=2.0)
+        if self._thread.is_alive():
+            print('[capture] поток чтения ещё в grab(): источник закроется, когда тот вернётся')
+        with self._cond:
+            if self._frame is not None:
+                self.pool.release(self._frame)
+                self._frame = None
+
+
+def _open_capture(target, backend=None):
+    cap = cv2.VideoCapture(target) if backend is None else cv2.VideoCapture(target, backend)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # где бэкенд это умеет; остальное вычитывает StreamReader
+    return cap
+
+
 class CameraSource:
-    def __init__(self, index):
-        self.cap = cv2.VideoCapture(index, cv2.CAP_DSHOW)
-        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    """Камера/карта захвата; reader=True — StreamReader (всегда самый свежий кадр)."""
+    def __init__(self, index, buffers=4, pacer=None, reader=True):
+        self.pacer = pacer or Pacer()
+        self.pool = FramePool(buffers)
+        self.reader = StreamReader(lambda: _open_capture(index, cv2.CAP_DSHOW), self.pool,
+                                   name='camera-reader') if reader else None
+        self.cap = None if reader else _open_capture(index, cv2.CAP_DSHOW)
 
     def read(self):
-        return self.cap.read()
+        self.pacer.wait()
+        if self.reader is not None:
+            return self.reader.read()
+        return _read_into(self.cap, self.pool)
 
     def release(self):
-        self.cap.release()
+        if self.reader is not None:
+            self.reader.close()
+        else:
+            self.cap.release()
 
 
 class UrlSource:
-    def __init__(self, url):
-        self.cap = cv2.VideoCapture(url)
-        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    """
+    RTMP/HLS/HTTP-поток; reader=True — StreamReader (всегда самый свежий кадр, отставание в stats).
+    Локальный видеофайл вместо URL читается в темпе записи, как живой поток (для проверки).
+    """
+    def __init__(self, url, buffers=4, pacer=None, reader=True):
+        self.pacer = pacer or Pacer()
+        self.pool = FramePool(buffers)
+        self.reader = StreamReader(lambda: _open_capture(url), self.pool, realtime=os.path.isfile(url),
+                                   name='url-reader') if reader else None
+        self.cap = None if reader else _open_capture(url)
+
+    @property
+    def eof(self):
+        return self.reader is not None and self.reader.eof
+
+    def read(self):
+        self.pacer.wait()
+        if self.reader is not None:
+            return self.reader.read()
+        return _read_into(self.cap, self.pool)
+
+    def release(self):
+        if self.reader is not None:
+            self.reader.close()
+        else:
+            self.cap.release()
+
+
+_IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp')
+_ROI_CROP_RE = re.compile(r'^frame_\d+_[A-Za-z]\w*\.')  # frame_<ts>_<roi>.jpg из dataset/
+
+
+def _list_frame_files(path):
+    """Полные кадры из каталога (кропы ROI вида frame_<ts>_<roi>.jpg пропускаем)."""
+    files = [f for f in os.listdir(path)
+             if f.lower().endswith(_IMAGE_EXTS) and not _ROI_CROP_RE.match(f)]
+    return [os.path.join(path, f) for f in sorted(files)]
+
+
+class ReplaySource:
+    """
+    Воспроизведение записи: MP4 (или любое видео, которое открывает OpenCV), каталог кадров
+    frame_<ts>.jpg или сессия шардов dataset_io (полные кадры по индексу).
+    fps=0 — как можно быстрее, иначе фиксированный темп.
+    По окончании записи read() возвращает (False, None) и выставляет eof=True.
+    """
+    def __init__(self, path, fps=0, loop=False, buffers=4):
+        if not path:
+            raise ValueError("Для source=replay укажи путь к записи (replay.path / --replay)")
+        self.path = path
+        self.fps_limit = float(fps) if fps else 0
+        self.loop = bool(loop)
+        self.eof = False
+        self.pacer = Pacer(self.fps_limit)
+        self.cap = None
+        self.pool = FramePool(buffers)
+        self._files = []
+        self._idx = 0
+        self._reader = None
+        if os.path.isdir(path) and os.path.isfile(os.path.join(path, 'index.jsonl')):
+            from dataset_io import DatasetReader, FULL_FRAME  # dataset_io сам импортирует capture
+            self._reader = DatasetReader(path)
+            self._files = self._reader.items(FULL_FRAME)
+            if not self._files:
+                raise ValueError(f"В сессии {path} нет полных кадров")
+        elif os.path.isdir(path):
+            self._files = _list_frame_files(path)
+            if not self._files:
+                raise ValueError(f"В каталоге {path} нет кадров")
+        else:
+            self.cap = cv2.VideoCapture(path)
+            if not self.cap.isOpened():
+                raise ValueError(f"Не удалось открыть запись: {path}")
+
+    def _next(self):
+        if self.cap is not None:
+            ok, frame = _read_into(self.cap, self.pool)
+            if not ok and self.loop:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ok, frame = _read_into(self.cap, self.pool)
+            return ok, frame
+        if self._idx >= len(self._files) and self.loop:
+            self._idx = 0
+        while self._idx < len(self._files):
+            item = self._files[self._idx]
+            frame = self._reader.read(item) if self._reader is not None else cv2.imread(item, cv2.IMREAD_COLOR)
+            self._idx += 1
+            if frame is not None:
+                return True, frame
+        return False, None
 
     def read(self):
-        return self.cap.read()
+        self.pacer.wait()
+        ok, frame = self._next()
+        if not ok or frame is None:
+            self.eof = True
+            return False, None
+        return True, frame
 
     def release(self):
-        self.cap.release()
+        if self.cap is not None:
+            self.cap.release()
+        if self._reader is not None:
+            self._reader.close()
 
 
 class WindowSource:
@@ -60,7 +573,8 @@ class WindowSource:
     """
     def __init__(self, match_by="process_name", process_name=None, pid=None,
                  title=None, match_mode="contains", prefer_client=True,
-                 fps_limit=60, fallback_region=None, allow_fallback=True):
+                 fps_limit=60, fallback_region=None, allow_fallback=True, roi_grab=None, buffers=4,
+                 pacer=None):
         try:
             import win32gui, win32con, win32process
             import ctypes
@@ -88,7 +602,9 @@ class WindowSource:
         self.fallback_region = fallback_region
 
         self._sct = mss()
-        self._last_ts = [time.time()]
+        self.pacer = pacer or Pacer(self.fps_limit)
+        self.pool = FramePool(buffers)
+        self.roi_grabber = RoiGrabber(self._sct, self.pool, **roi_grab) if roi_grab else None
         self.hwnd = self._find_window()
         if self.hwnd is None:
             if allow_fallback and fallback_region:
@@ -198,29 +714,67 @@ class WindowSource:
         return {"left": int(x), "top": int(y), "width": int(w), "height": int(h)}
 
     def read(self):
-        _sleep_if_needed(self._last_ts, self.fps_limit)
+        self.pacer.wait()
         if getattr(self, "_screen_fallback", False):
-            img = np.array(self._sct.grab(self.bbox))[:, :, :3]
-            return True, img
-
-        bbox = self._compute_bbox()
-        if bbox is None:
-            return False, None
-        img = np.array(self._sct.grab(bbox))[:, :, :3]
-        return True, img
+            bbox = self.bbox
+        else:
+            bbox = self._compute_bbox()
+            if bbox is None:
+                return False, None
+        if self.roi_grabber is not None:
+            return True, self.roi_grabber.grab(bbox)
+        return True, _grab_into(self._sct, bbox, self.pool)
 
     def release(self):
         self._sct.close()
 
 
+def roi_grab_config(cfg):
+    """Параметры RoiGrabber из секции capture (None — снимаем кадр целиком)."""
+    ccfg = cfg.get('capture', {}) or {}
+    if not ccfg.get('roi_only', False):
+        return None
+    return {
+        'rois': cfg.get('rois') or {},
+        'base': base_size(cfg),
+        'mode': ccfg.get('roi_mode', 'auto'),
+        'full_interval': ccfg.get('full_interval', 0.5),
+    }
+
+
+def make_pacer(cfg, fps):
+    """Pacer живого источника по секции capture (adaptive, min_fps); fps — потолок темпа."""
+    ccfg = cfg.get('capture', {}) or {}
+    return Pacer(fps, adaptive=ccfg.get('adaptive', False), min_fps=ccfg.get('min_fps', 10))
+
+
 def make_source(cfg):
+    """Источник по конфигу; с procs.enabled кадры пишутся в разделяемую память (framebus.py)."""
+    src = _make_source(cfg)
+    if (cfg.get('procs', {}) or {}).get('enabled', False):
+        import framebus  # framebus сам импортирует capture
+        framebus.share_source(src, framebus.get_frame_pool(cfg))
+    return src
+
+
+def _make_source(cfg):
     src = cfg.get('source', 'screen')
+    ccfg = cfg.get('capture', {}) or {}
+    buffers = int(ccfg.get('buffers', 4))
+    fps_limit = ccfg.get('fps_limit', 60)
     if src == 'screen':
-        return ScreenSource(cfg.get('screen_region', [0, 0, 1920, 1080]))
+        return ScreenSource(cfg.get('screen_region', [0, 0, 1920, 1080]),
+                            roi_grab=roi_grab_config(cfg), buffers=buffers, pacer=make_pacer(cfg, fps_limit))
     elif src == 'camera':
-        return CameraSource(cfg.get('camera_index', 0))
+        return CameraSource(cfg.get('camera_index', 0), buffers=buffers, pacer=make_pacer(cfg, fps_limit),
+                            reader=ccfg.get('reader', True))
     elif src in ('rtmp', 'hls'):
-        return UrlSource(cfg.get('url'))
+        return UrlSource(cfg.get('url'), buffers=buffers, pacer=make_pacer(cfg, fps_limit),
+                         reader=ccfg.get('reader', True))
+    elif src == 'replay':
+        rcfg = cfg.get('replay', {}) or {}
+        return ReplaySource(rcfg.get('path'), fps=rcfg.get('fps', 0), loop=rcfg.get('loop', False),
+                            buffers=buffers)
     elif src == 'window':
         wcfg = cfg.get('window', {}) or {}
         return WindowSource(
@@ -230,9 +784,12 @@ def make_source(cfg):
             title=wcfg.get('title', 'World of Tanks'),
             match_mode=wcfg.get('match_mode', 'contains'),
             prefer_client=wcfg.get('prefer_client_area', True),
-            fps_limit=wcfg.get('fps_limit', 60),
+            fps_limit=wcfg.get('fps_limit', fps_limit),
             fallback_region=cfg.get('screen_region'),
             allow_fallback=wcfg.get('allow_fallback_to_screen', True),
+            roi_grab=roi_grab_config(cfg),
+            buffers=buffers,
+            pacer=make_pacer(cfg, wcfg.get('fps_limit', fps_limit)),
         )
     else:
         raise ValueError(f"Неизвестный source: {src}")
@@ -1,42 +1,86 @@
 import argparse
-import os
 import time
 import yaml
-import cv2
-from capture import make_source
+from capture import make_source, recycle
+from dataset_io import make_dataset_writer
+from layout import base_size
+from sampling import AdaptiveSampler
 
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument('--config', default='config.yaml')
     ap.add_argument('--out', default='dataset')
-    ap.add_argument('--interval', type=float, default=1.0)
+    ap.add_argument('--interval', type=float, default=1.0, help='базовый интервал сохранения, сек')
+    ap.add_argument('--min-interval', type=float, default=None, help='при быстрой смене сцены (по умолчанию interval/4)')
+    ap.add_argument('--max-interval', type=float, default=None, help='на статичной сцене (по умолчанию interval*10)')
+    ap.add_argument('--max-distance', type=int, default=None, help='dHash: бит различия, не больше — дубликат')
+    ap.add_argument('--events', action='store_true',
+                    help='гонять детекторы и сохранять сразу при лампочке/смене числа врагов')
+    ap.add_argument('--no-dedup', action='store_true', help='как раньше: кадр раз в --interval без отбора')
     args = ap.parse_args()
 
     with open(args.config, 'r', encoding='utf-8') as f:
         cfg = yaml.safe_load(f)
 
-    os.makedirs(args.out, exist_ok=True)
     src = make_source(cfg)
+    scfg = cfg.get('sampling', {}) or {}
+    sampler = None
+    if not args.no_dedup:
+        sampler = AdaptiveSampler(
+            cfg.get('rois', {}), base_interval=args.interval,
+            min_interval=args.min_interval or scfg.get('min_interval', args.interval / 4),
+            max_interval=args.max_interval or scfg.get('max_interval', args.interval * 10),
+            max_distance=args.max_distance if args.max_distance is not None else scfg.get('max_distance', 6),
+            history=scfg.get('history', 32), roi_base=base_size(cfg))
+    analyze = None
+    if args.events and sampler is not None:
+        from perception import analyze_frame
+        analyze = analyze_frame
+    writer = make_dataset_writer(cfg, args.out, meta={'interval': args.interval, 'adaptive': sampler is not None})
 
+    t_start = time.monotonic()
     try:
         while True:
             ok, frame = src.read()
             if not ok:
+                if getattr(src, 'eof', False):
+                    break
                 time.sleep(0.01)
                 continue
-            ts = int(time.time()*1000)
-            cv2.imwrite(f"{args.out}/frame_{ts}.jpg", frame)
-            # сохраним ROI
-            for name, roi in cfg['rois'].items():
-                x, y, w, h = roi
-                crop = frame[y:y+h, x:x+w]
-                cv2.imwrite(f"{args.out}/frame_{ts}_{name}.jpg", crop)
-            time.sleep(args.interval)
+            if sampler is None:
+                writer.add(frame)
+                recycle(src, frame)
+                time.sleep(args.interval)
+                continue
+            # подпись кадра дешёвая, поэтому смотрим чаще, а сохраняем по решению сэмплера
+            state = analyze(frame, cfg) if analyze is not None else None
+            save, _ = sampler.decide(frame, state)
+            if save:
+                # полный кадр и все ROI кодируются в фоне в шарды сессии (dataset_io.py)
+                writer.add(frame)
+            recycle(src, frame)
+            time.sleep(sampler.min_interval)
     except KeyboardInterrupt:
         pass
     finally:
         src.release()
+        st = writer.close()
+        print(f"[dataset] кадров: {st['frames']}, выброшено: {st['dropped']} -> {writer.path}")
+        if sampler is not None:
+            report_savings(sampler, st, time.monotonic() - t_start, args.interval, len(cfg.get('rois', {})))
+
+
+def report_savings(sampler, st, elapsed, interval, n_rois):
+    """Сколько кадров, байт и файлов не записано по сравнению с «кадр раз в interval»."""
+    s = sampler.stats
+    fixed = int(elapsed / interval) if interval > 0 else s['seen']
+    avoided = max(0, fixed - st['frames'])
+    per_frame = st['bytes'] / st['frames'] if st['frames'] else 0.0
+    print(f"[sampling] просмотрено: {s['seen']}, сохранено: {s['saved']} "
+          f"(событий {s['event']}), дубликатов: {s['duplicate']}, рано: {s['rate']}")
+    print(f"[sampling] против кадра раз в {interval:g}s ({fixed}): сэкономлено кадров {avoided}, "
+          f"~{avoided * per_frame / 1e6:.1f} MB, ~{avoided * (1 + n_rois)} JPEG-записей")
 
 
 if __name__ == '__main__':
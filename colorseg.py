@@ -0,0 +1,101 @@
+"""
+Цветовая сегментация миникарты за один проход для всех классов маркеров.
+Каждый класс из minimap_hsv (<class>_low / <class>_high) — один или несколько HSV-параллелепипедов.
+Для каждого канала H, S, V строится таблица 256 -> битовая маска диапазонов, в которые попадает
+значение; пиксель принадлежит диапазону, если бит стоит во всех трёх каналах.
+За кадр: cvtColor + split + 3 cv2.LUT + 2 AND — и карта битов готова сразу для всех классов;
+маска отдельного класса — ещё один bitwise_and. Таблицы пересобираются только при смене конфига.
+"""
+import threading
+import cv2
+import numpy as np
+
+MAX_RANGES = 8  # битов в uint8
+
+
+def parse_classes(hsv_cfg):
+    """{class: [(low, high), ...]} из ключей <class>_low/<class>_high в порядке конфига."""
+    classes = {}
+    for key in hsv_cfg:
+        if not key.endswith('_low'):
+            continue
+        name = key[:-4]
+        if f'{name}_high' not in hsv_cfg:
+            raise ValueError(f"minimap_hsv: для {key} нет {name}_high")
+        lows, highs = np.array(hsv_cfg[key]), np.array(hsv_cfg[f'{name}_high'])
+        lows, highs = lows.reshape(-1, 3), highs.reshape(-1, 3)
+        if len(lows) != len(highs):
+            raise ValueError(f"minimap_hsv: у {name} разное число нижних и верхних границ")
+        classes[name] = [(tuple(int(v) for v in lo), tuple(int(v) for v in hi)) for lo, hi in zip(lows, highs)]
+    return classes
+
+
+class HsvClassifier:
+    def __init__(self, hsv_cfg):
+        self.classes = parse_classes(hsv_cfg)
+        n_ranges = sum(len(r) for r in self.classes.values())
+        if n_ranges > MAX_RANGES:
+            raise ValueError(f"minimap_hsv: не больше {MAX_RANGES} HSV-диапазонов на все классы, задано {n_ranges}")
+        self.luts = [np.zeros(256, np.uint8) for _ in range(3)]
+        self.class_bits = {}
+        bit = 0
+        for name, ranges in self.classes.items():
+            mask = 0
+            for lo, hi in ranges:
+                for c in range(3):
+                    if lo[c] <= hi[c]:
+                        self.luts[c][lo[c]:hi[c] + 1] |= (1 << bit)
+                    elif c == 0:  # H через 0: например 170..10 для красного
+                        self.luts[c][lo[c]:] |= (1 << bit)
+                        self.luts[c][:hi[c] + 1] |= (1 << bit)
+                    else:
+                        raise ValueError(f"minimap_hsv: у {name} нижняя граница {'SV'[c - 1]} больше верхней "
+                                         f"({lo[c]} > {hi[c]}); через 0 переходит только H")
+                mask |= 1 << bit
+                bit += 1
+            self.class_bits[name] = mask
+        self._local = threading.local()  # свои буферы на поток (воркеры конвейера)
+
+    def _scratch(self, shape):
+        sc = getattr(self._local, 'sc', None)
+        if sc is None or sc['shape'] != shape:
+            h, w = shape
+            sc = {'shape': shape, 'hsv': np.empty((h, w, 3), np.uint8),
+                  'ch': [np.empty((h, w), np.uint8) for _ in range(3)],
+                  'lab': [np.empty((h, w), np.uint8) for _ in range(3)]}
+            self._local.sc = sc
+        return sc
+
+    def classify(self, bgr):
+        """Карта битов диапазонов (uint8, h x w). Буфер переиспользуется следующим вызовом в этом потоке."""
+        sc = self._scratch(bgr.shape[:2])
+        cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV, dst=sc['hsv'])
+        cv2.split(sc['hsv'], sc['ch'])
+        lab = sc['lab']
+        for c in range(3):
+            cv2.LUT(sc['ch'][c], self.luts[c], dst=lab[c])
+        cv2.bitwise_and(lab[0], lab[1], dst=lab[0])
+        cv2.bitwise_and(lab[0], lab[2], dst=lab[0])
+        return lab[0]
+
+    def mask(self, bits, name):
+        """Маска класса (ненулевые пиксели — класс), годится для morphologyEx/findContours."""
+        return cv2.bitwise_and(bits, self.class_bits[name])
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_hsv_classifier(hsv_cfg):
+    """Классификатор для данного minimap_hsv; таблицы строятся один раз на набор границ."""
+    key = repr(sorted((k, repr(v)) for k, v in hsv_cfg.items()))
+    clf = _cache.get(key)
+    if clf is None:
+        with _cache_lock:
+            clf = _cache.get(key)
+            if clf is None:
+                clf = HsvClassifier(hsv_cfg)
+                _cache.clear()  # держим только актуальный конфиг
+                _cache[key] = clf
+    return clf
@@ -0,0 +1,242 @@
+"""
+Датасет кадров в шардах: режим R в main.py и collect.py.
+Сессия — каталог <out_dir>/session_<дата-время>/ с файлами:
+    session.json   — метаданные (ROI, источник, качество JPEG, время начала/конца, число сэмплов);
+    shard_00000.bin, shard_00001.bin ... — подряд записанные JPEG полного кадра и кропов ROI;
+    index.jsonl    — строка на сэмпл: ts (мс), roi ('_full' — полный кадр), shard, offset, size, shape.
+JPEG кодируются пулом потоков (cv2.imencode отпускает GIL), цикл захвата только копирует кадр.
+Чтение по ROI идёт через индекс, без обхода каталога; старый формат frame_<ts>[_<roi>].jpg
+доступен как экспорт:
+
+    python dataset_io.py info dataset/session_20240101-120000
+    python dataset_io.py export dataset/session_20240101-120000 dataset_files/
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import metrics
+from capture import FramePool
+from layout import DEFAULT_BASE, base_size, layout_for
+
+FULL_FRAME = '_full'
+INDEX_FILE = 'index.jsonl'
+SESSION_FILE = 'session.json'
+
+
+class DatasetWriter:
+    """
+    add(frame, ts) не блокирует: если в работе уже queue_size кадров, кадр выбрасывается
+    (stats['dropped']). Записи в шард и индекс идут под одним замком в порядке готовности.
+    """
+    def __init__(self, out_dir, rois, shard_mb=256, quality=95, workers=2, queue_size=16, meta=None,
+                 roi_base=DEFAULT_BASE):
+        self.rois = dict(rois or {})  # как в конфиге; пиксели — под размер каждого кадра (layout.py)
+        self.roi_base = tuple(roi_base)
+        self.quality = int(quality)
+        self.shard_bytes = int(float(shard_mb) * 1e6)
+        self.path = os.path.join(out_dir, time.strftime('session_%Y%m%d-%H%M%S'))
+        n = 1
+        while os.path.exists(self.path):
+            self.path = os.path.join(out_dir, time.strftime('session_%Y%m%d-%H%M%S') + f'_{n}')
+            n += 1
+        os.makedirs(self.path)
+        self.meta = {'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'rois': self.rois, 'roi_base': list(self.roi_base),
+                     'format': 'jpg', 'quality': self.quality, **(meta or {})}
+        self.stats = {'frames': 0, 'samples': 0, 'bytes': 0, 'dropped': 0, 'shards': 0}
+        self.pool = FramePool(size=queue_size + 1)
+        self._slots = threading.BoundedSemaphore(max(1, int(queue_size)))
+        self._exec = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix='dataset')
+        self._lock = threading.Lock()
+        self._shard = None
+        self._shard_idx = -1
+        self._shard_size = 0
+        self._index = open(os.path.join(self.path, INDEX_FILE), 'a', encoding='utf-8')
+        self._write_meta()
+        print(f'[dataset] сессия -> {self.path}')
+
+    def _write_meta(self, **extra):
+        with open(os.path.join(self.path, SESSION_FILE), 'w', encoding='utf-8') as f:
+            json.dump({**self.meta, **extra}, f, ensure_ascii=False, indent=2)
+
+    def add(self, frame, ts=None):
+        """Поставить кадр (полный + все ROI) в очередь. ts — мс с эпохи. False — кадр выброшен."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.stats['dropped'] += 1
+            return False
+        ts = int(time.time() * 1000) if ts is None else int(ts)
+        buf = self.pool.acquire(frame.shape)
+        np.copyto(buf, frame)
+        self._exec.submit(self._encode, buf, ts)
+        return True
+
+    def _encode(self, buf, ts):
+        t0 = time.perf_counter()
+        try:
+            params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+            parts = [(FULL_FRAME, buf)]
+            px = layout_for(self.rois, buf.shape[1], buf.shape[0], self.roi_base).px
+            for name, (x, y, w, h) in px.items():
+                parts.append((name, buf[y:y + h, x:x + w]))
+            encoded = []
+            for name, img in parts:
+                ok, data = cv2.imencode('.jpg', img, params)
+                if ok:
+                    encoded.append((name, img.shape, data))
+            self._append(ts, encoded)
+        except Exception as e:
+            print(f'[dataset] ошибка кодирования кадра {ts}: {e}')
+        finally:
+            self.pool.release(buf)
+            self._slots.release()
+            metrics.record('dataset_encode', t0)
+
+    def _append(self, ts, encoded):
+        with self._lock:
+            if self._shard is None or self._shard_size >= self.shard_bytes:
+                self._next_shard()
+            lines = []
+            for name, shape, data in encoded:
+                self._shard.write(data)
+                lines.append(json.dumps({'ts': ts, 'roi': name, 'shard': self._shard_idx,
+                                         'offset': self._shard_size, 'size': int(data.size),
+                                         'shape': list(shape)}))
+                self._shard_size += int(data.size)
+                self.stats['bytes'] += int(data.size)
+            self._shard.flush()  # индекс не должен ссылаться на незаписанные байты
+            self._index.write('\n'.join(lines) + '\n')
+            self._index.flush()
+            self.stats['frames'] += 1
+            self.stats['samples'] += len(lines)
+
+    def _next_shard(self):
+        if self._shard is not None:
+            self._shard.close()
+        self._shard_idx += 1
+        self._shard = open(os.path.join(self.path, f'shard_{self._shard_idx:05d}.bin'), 'ab')
+        self._shard_size = self._shard.tell()
+        self.stats['shards'] += 1
+
+    def close(self):
+        """Дождаться кодирования очереди, закрыть шарды и дописать session.json."""
+        self._exec.shutdown(wait=True)
+        with self._lock:
+            if self._shard is not None:
+                self._shard.close()
+                self._shard = None
+            self._index.close()
+            self._write_meta(finished=time.strftime('%Y-%m-%d %H:%M:%S'), **self.stats)
+        return dict(self.stats)
+
+
+def make_dataset_writer(cfg, out_dir=None, meta=None):
+    """DatasetWriter по секции recording конфига."""
+    rcfg = cfg.get('recording', {}) or {}
+    return DatasetWriter(out_dir or rcfg.get('out_dir', 'dataset'), cfg.get('rois', {}),
+                         shard_mb=rcfg.get('shard_mb', 256),
+                         quality=rcfg.get('jpeg_quality', 95),
+                         workers=rcfg.get('workers', 2),
+                         queue_size=rcfg.get('queue_size', 16),
+                         meta=dict({'source': cfg.get('source')}, **(meta or {})),
+                         roi_base=base_size(cfg))
+
+
+def is_session(path):
+    return os.path.isfile(os.path.join(path, INDEX_FILE))
+
+
+class DatasetReader:
+    """Сессия шардов: индекс читается один раз, items(roi) — записи индекса, read(item) — картинка."""
+    def __init__(self, path):
+        if not is_session(path):
+            raise ValueError(f'{path}: нет {INDEX_FILE} (не сессия датасета)')
+        self.path = path
+        meta_path = os.path.join(path, SESSION_FILE)
+        self.meta = {}
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                self.meta = json.load(f)
+        self.index = []
+        with open(os.path.join(path, INDEX_FILE), 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        self.index.append(json.loads(line))
+                    except ValueError:
+                        break  # оборванная последняя строка после аварийного завершения
+        self._by_roi = {}
+        for item in self.index:
+            self._by_roi.setdefault(item['roi'], []).append(item)
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.index)
+
+    def rois(self):
+        return list(self._by_roi)
+
+    def items(self, roi=None):
+        return self.index if roi is None else self._by_roi.get(roi, [])
+
+    def read_bytes(self, item):
+        with self._lock:
+            f = self._files.get(item['shard'])
+            if f is None:
+                f = self._files[item['shard']] = open(
+                    os.path.join(self.path, f"shard_{item['shard']:05d}.bin"), 'rb')
+            f.seek(item['offset'])
+            return f.read(item['size'])
+
+    def read(self, item, flags=cv2.IMREAD_COLOR):
+        return cv2.imdecode(np.frombuffer(self.read_bytes(item), np.uint8), flags)
+
+    def close(self):
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
+
+
+def export_files(session_path, out_dir):
+    """Старый формат: frame_<ts>.jpg и frame_<ts>_<roi>.jpg (байты JPEG без перекодирования)."""
+    reader = DatasetReader(session_path)
+    os.makedirs(out_dir, exist_ok=True)
+    try:
+        for item in reader.items():
+            suffix = '' if item['roi'] == FULL_FRAME else f"_{item['roi']}"
+            with open(os.path.join(out_dir, f"frame_{item['ts']}{suffix}.jpg"), 'wb') as f:
+                f.write(reader.read_bytes(item))
+    finally:
+        reader.close()
+    return len(reader)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    p = sub.add_parser('info', help='сводка по сессии')
+    p.add_argument('session')
+    p = sub.add_parser('export', help='выгрузить в формат frame_<ts>[_<roi>].jpg')
+    p.add_argument('session')
+    p.add_argument('out')
+    args = ap.parse_args()
+
+    if args.cmd == 'info':
+        reader = DatasetReader(args.session)
+        print(json.dumps(reader.meta, ensure_ascii=False, indent=2))
+        for roi in reader.rois():
+            print(f'{roi:<12} {len(reader.items(roi))}')
+    else:
+        n = export_files(args.session, args.out)
+        print(f'[dataset] выгружено файлов: {n} -> {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,394 @@
+"""
+Реестр HUD-детекторов и планировщик на бюджет времени кадра.
+Каждый детектор объявляет свой ROI, целевую частоту, ожидаемую стоимость и зависимости.
+За кадр Scheduler запускает только те, чья очередь подошла, в порядке просроченности,
+пока укладывается в budget_ms (оценка стоимости уточняется по замерам). Остальные поля
+state берутся из последних известных значений; возраст каждого детектора — в state['ages'].
+Новый детектор регистрируется register_detector(...) и не замедляет остальные: он получает
+свою частоту и ждёт места в бюджете.
+Тяжёлые ресурсы грузятся в фоне (startup.py): детектор не запускается, пока не готовы его needs,
+готовность каждого — в state['ready'] (ready / loading / unavailable).
+"""
+import threading
+import time
+import cv2
+import numpy as np
+import metrics
+import perception  # модулем: perception.analyze_frame сам обращается к этому модулю
+import startup
+import tracker as minimap_tracker
+from ocr import get_ocr_worker, crop_signature
+from templates import get_registry
+from hud_model import get_hud_model, hud_model_configured, model_rois
+from digits import get_digit_reader
+from layout import get_layout, work_scale
+
+STARVE_FACTOR = 3.0  # детектор, просроченный в столько раз, запускается даже сверх бюджета
+COST_ALPHA = 0.2     # сглаживание оценки стоимости
+
+
+class Detector:
+    """
+    run(crop_bgr, cfg) -> dict с полями state. roi — ключ из cfg['rois'] (None — весь кадр).
+    rate — целевая частота, Гц (0 — каждый кадр); cost — начальная оценка, мс;
+    depends — имена детекторов, которые должны отработать раньше (их поля уже в state).
+    defaults — значения полей до первого запуска.
+    needs — ресурсы startup, без которых детектор не запускается; uses — необязательные
+    (пока грузятся, детектор работает, но считается loading). replaces — детекторы,
+    которые этот заменяет, когда готов (hud_model вместо шаблонов у прицела).
+    """
+    def __init__(self, name, run, roi=None, rate=0.0, cost=1.0, depends=(), defaults=None,
+                 needs=(), uses=(), replaces=()):
+        self.name = name
+        self.run = run
+        self.roi = roi
+        self.rate = float(rate)
+        self.cost = float(cost)
+        self.depends = tuple(depends)
+        self.defaults = dict(defaults or {})
+        self.needs = tuple(needs)
+        self.uses = tuple(uses)
+        self.replaces = tuple(replaces)
+
+    def readiness(self):
+        """(статус для state['ready'], можно ли запускать)."""
+        needs = [startup.status(n) for n in self.needs]
+        if any(st in (startup.UNAVAILABLE, startup.FAILED) for st in needs):
+            return startup.UNAVAILABLE, False
+        can_run = all(st == startup.READY for st in needs)
+        if not can_run or any(startup.status(n) == startup.LOADING for n in self.uses):
+            return startup.LOADING, can_run
+        return startup.READY, True
+
+
+DETECTORS = {}
+
+
+def register_detector(detector):
+    """Добавить детектор в общий реестр (повторная регистрация по имени заменяет)."""
+    DETECTORS[detector.name] = detector
+    return detector
+
+
+def _order(detectors):
+    """Топологический порядок по depends; неизвестная зависимость или цикл — ValueError."""
+    out, seen, stack = [], set(), set()
+
+    def visit(name):
+        if name in seen:
+            return
+        if name in stack:
+            raise ValueError(f"detectors: цикл зависимостей через '{name}'")
+        if name not in detectors:
+            raise ValueError(f"detectors: неизвестная зависимость '{name}'")
+        stack.add(name)
+        for dep in detectors[name].depends:
+            visit(dep)
+        stack.discard(name)
+        seen.add(name)
+        out.append(detectors[name])
+
+    for name in detectors:
+        visit(name)
+    return out
+
+
+class _Slot:
+    """Состояние планирования одного детектора."""
+    __slots__ = ('det', 'period', 'cost', 'last', 'running', 'runs', 'skipped', 'status', 'can_run')
+
+    def __init__(self, det, rate, cost):
+        self.det = det
+        self.period = 1.0 / rate if rate > 0 else 0.0
+        self.cost = cost / 1000.0
+        self.last = None
+        self.running = False
+        self.runs = 0
+        self.skipped = 0
+        self.status, self.can_run = det.readiness()
+
+    def urgency(self, now):
+        if self.last is None or self.period <= 0:
+            return float('inf')
+        return (now - self.last) / self.period
+
+
+class Scheduler:
+    """
+    budget_ms — сколько времени кадра отдаём детекторам (0 — без ограничения).
+    enabled=False — все детекторы каждый кадр, как раньше (для сравнения в bench.py).
+    overrides — {name: {rate, cost, enabled}} из секции detectors конфига.
+    executor — framebus.ProcessExecutor: выбранные детекторы кадра считаются в процессах-воркерах.
+    """
+    def __init__(self, detectors, budget_ms=8.0, enabled=True, overrides=None, rois=None, executor=None):
+        overrides = overrides or {}
+        active = {}
+        for name, det in detectors.items():
+            o = overrides.get(name) or {}
+            if not o.get('enabled', True):
+                continue
+            if det.roi is not None and rois is not None and det.roi not in rois:
+                print(f"[detectors] нет ROI '{det.roi}' для детектора '{name}', выключен")
+                continue
+            active[name] = det
+        for name, det in list(active.items()):
+            missing = [d for d in det.depends if d not in active]
+            if missing:
+                print(f"[detectors] '{name}' выключен: нет зависимостей {missing}")
+                del active[name]
+        self.slots = [_Slot(d, float((overrides.get(d.name) or {}).get('rate', d.rate)),
+                            float((overrides.get(d.name) or {}).get('cost', d.cost)))
+                      for d in _order(active)]
+        self.budget = float(budget_ms) / 1000.0
+        self.enabled = bool(enabled)
+        self.state = {}
+        self.updated = {}
+        self.executor = executor
+        for s in self.slots:
+            self.state.update(s.det.defaults)
+        self._pending = [s for s in self.slots if s.status == startup.LOADING]
+        self._replaced = set()
+        self._lock = threading.Lock()
+        self._refresh()
+
+    def _refresh(self):
+        """Пересчитать готовность тех, кто ещё грузится; после полной загрузки ничего не стоит."""
+        if not self._pending:
+            return
+        for s in self._pending:
+            s.status, s.can_run = s.det.readiness()
+        self._pending = [s for s in self._pending if s.status == startup.LOADING]
+        self._replaced = {name for s in self.slots if s.can_run for name in s.det.replaces}
+
+    def readiness(self):
+        """{name: ready|loading|unavailable}; заменённый детектор — тоже unavailable."""
+        return {s.det.name: startup.UNAVAILABLE if s.det.name in self._replaced else s.status
+                for s in self.slots}
+
+    def _pick(self, now):
+        """Детекторы на этот кадр (в порядке зависимостей); помечает их running."""
+        self._refresh()
+        ready = [s for s in self.slots if not s.running and s.can_run and s.det.name not in self._replaced]
+        if not self.enabled:
+            chosen = ready
+        else:
+            due = [s for s in ready if s.urgency(now) >= 1.0]
+            due.sort(key=lambda s: s.urgency(now), reverse=True)
+            chosen, spent = set(), 0.0
+            for s in due:
+                deps = [d for d in self.slots if d.det.name in s.det.depends]
+                if any(d.last is None and d not in chosen for d in deps):
+                    continue  # зависимость ещё ни разу не отработала
+                if self.budget <= 0 or not chosen or spent + s.cost <= self.budget or \
+                        s.urgency(now) >= STARVE_FACTOR:
+                    chosen.add(s)
+                    spent += s.cost
+                else:
+                    s.skipped += 1
+            chosen = [s for s in ready if s in chosen]
+        for s in chosen:
+            s.running = True
+        return chosen
+
+    def _run_inline(self, chosen, frame_bgr, cfg):
+        layout = get_layout(cfg, frame_bgr.shape)
+        for s in chosen:
+            det = s.det
+            t0 = time.perf_counter()
+            if det.roi is None:
+                roi = frame_bgr
+            else:
+                roi = layout.crop(frame_bgr, det.roi)
+                metrics.record('crop', t0)
+            out = det.run(roi, cfg)
+            yield s, out, time.perf_counter() - t0
+
+    def _run_executor(self, chosen, frame_bgr):
+        slots = {s.det.name: s for s in chosen}
+        for name, out, dt in self.executor.run(frame_bgr, list(slots)):
+            yield slots[name], out, dt
+
+    def run(self, frame_bgr, cfg, timings=None):
+        now = time.monotonic()
+        if self.executor is not None:
+            self.executor.poll()
+        with self._lock:
+            chosen = self._pick(now)
+            state = dict(self.state)
+        try:
+            if self.executor is not None and chosen:
+                results = self._run_executor(chosen, frame_bgr)
+            else:
+                results = self._run_inline(chosen, frame_bgr, cfg)
+            for s, out, dt in results:
+                det = s.det
+                metrics.add(det.name, dt)
+                state.update(out)
+                with self._lock:
+                    self.state.update(out)
+                    self.updated[det.name] = now
+                    s.last = now
+                    s.runs += 1
+                    s.cost += COST_ALPHA * (dt - s.cost)
+                    s.running = False
+                if timings is not None:
+                    timings[det.name] = dt
+        finally:
+            with self._lock:
+                for s in chosen:
+                    s.running = False
+        done = time.monotonic()
+        with self._lock:
+            state['ages'] = {name: done - ts for name, ts in self.updated.items()}
+            state['ready'] = self.readiness()
+        return state
+
+    @property
+    def stats(self):
+        """{name: {runs, skipped, cost_ms, rate, status}} — для отладки и bench.py."""
+        with self._lock:
+            ready = self.readiness()
+            return {s.det.name: {'runs': s.runs, 'skipped': s.skipped, 'cost_ms': s.cost * 1000.0,
+                                 'rate': (1.0 / s.period) if s.period > 0 else 0.0,
+                                 'status': ready[s.det.name]}
+                    for s in self.slots}
+
+
+# --- встроенные детекторы ---
+
+def _run_minimap(mini, cfg):
+    tracker = minimap_tracker.get_tracker(cfg)
+    if tracker is not None:
+        # треки между кадрами: полный поиск по расписанию, в остальных кадрах — локальный
+        return tracker.update(mini, cfg['minimap_hsv'])
+    mcfg = cfg.get('minimap', {}) or {}
+    return perception.detect_minimap(mini, cfg['minimap_hsv'],
+                                     cluster_radius=mcfg.get('cluster_radius', perception.CLUSTER_RADIUS),
+                                     min_area=mcfg.get('min_marker_area', perception.MIN_MARKER_AREA) *
+                                     work_scale(cfg) ** 2)
+
+
+def _run_hud_icons(cross, cfg):
+    icons = perception.detect_hud_icons(cross, get_registry(cfg))
+    on, score, _ = icons.get('sixth_sense', (False, 0.0, None))
+    return {'sixth_sense': on, 'sixth_sense_score': score,
+            'hud_icons': {name: v[1] for name, v in icons.items()}}
+
+
+def _run_status_ocr(status, cfg):
+    # сначала шаблоны глифов (доли миллисекунды); чего они не прочли — из фонового EasyOCR
+    out = {'hp': None, 'max_hp': None, 'speed': None, 'hp_conf': 0.0, 'speed_conf': 0.0,
+           'status_text': '', 'ocr_age': None, 'status_source': None}
+    reader = get_digit_reader(cfg)
+    if reader is not None:
+        out.update(reader.read(status))
+        if out['hp'] is not None and out['speed'] is not None:
+            out.update(ocr_age=0.0, status_source='glyphs')
+            return out
+    ocr = get_ocr_worker(cfg)
+    if ocr is None:
+        return out
+    ocr.submit(status)
+    latest = ocr.latest()
+    for key in ('hp', 'max_hp', 'speed'):
+        if out[key] is None and latest.get(key) is not None:
+            out[key] = latest[key]
+    out.update(status_text=out['status_text'] or latest['status_text'], ocr_age=latest['ocr_age'],
+               status_source='easyocr' if reader is None else 'glyphs+easyocr')
+    return out
+
+
+def _run_hud_model(frame, cfg):
+    """Один батч по ROI из hud_model.rois; класс sixth_sense заменяет шаблонную лампочку."""
+    layout = get_layout(cfg, frame.shape)
+    names = model_rois(cfg)
+    results = get_hud_model(cfg).infer([layout.crop(frame, n) for n in names])
+    dets, best = [], {}
+    for name, found in zip(names, results):
+        for cls, conf, box in found:
+            dets.append({'cls': cls, 'conf': conf, 'roi': name, 'box': layout.box_to_frame(name, box)})
+            best[cls] = max(best.get(cls, 0.0), conf)
+    return {'hud_detections': dets, 'hud_icons': best,
+            'sixth_sense': 'sixth_sense' in best, 'sixth_sense_score': best.get('sixth_sense', 0.0)}
+
+
+class DamageLogWatcher:
+    """
+    Лог урона: новые строки меняют уменьшенную копию ROI. Отдаёт момент последнего изменения
+    (damage_log_event_age, сек) — признак того, что по нам недавно попали/мы попали.
+    """
+    def __init__(self, change_threshold=20.0):
+        self.change_threshold = float(change_threshold)
+        self._sig = None
+        self._event = None
+        self._lock = threading.Lock()
+
+    def __call__(self, log_bgr, cfg):
+        sig = crop_signature(cv2.cvtColor(log_bgr, cv2.COLOR_BGR2GRAY))
+        now = time.monotonic()
+        with self._lock:
+            if self._sig is not None and float(np.max(np.abs(sig - self._sig))) >= self.change_threshold:
+                self._event = now
+            self._sig = sig
+            age = (now - self._event) if self._event is not None else None
+        return {'damage_log_event_age': age}
+
+
+register_detector(Detector('hud_icons', _run_hud_icons, roi='crosshair', rate=30.0, cost=1.0,
+                           defaults={'sixth_sense': False, 'sixth_sense_score': 0.0, 'hud_icons': {}},
+                           needs=('templates',)))
+register_detector(Detector('minimap', _run_minimap, roi='minimap', rate=10.0, cost=2.0,
+                           defaults={'enemy_points': [], 'ally_points': [], 'enemy_clusters': [],
+                                     'ally_clusters': [], 'enemy_cluster_sizes': [], 'ally_cluster_sizes': []}))
+HUD_MODEL = Detector('hud_model', _run_hud_model, roi=None, rate=15.0, cost=15.0,
+                     defaults={'hud_detections': [], 'hud_icons': {}, 'sixth_sense': False, 'sixth_sense_score': 0.0},
+                     needs=('hud_model',), replaces=('hud_icons',))
+register_detector(Detector('status_ocr', _run_status_ocr, roi='status', rate=5.0, cost=0.3,
+                           defaults={'hp': None, 'max_hp': None, 'speed': None, 'hp_conf': 0.0,
+                                     'speed_conf': 0.0, 'status_text': '', 'ocr_age': None,
+                                     'status_source': None},
+                           uses=('digits', 'easyocr')))
+register_detector(Detector('damage_log', DamageLogWatcher(), roi='damage_log', rate=5.0, cost=0.1,
+                           defaults={'damage_log_event_age': None}))
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(cfg):
+    """
+    Общий планировщик по секциям scheduler/detectors конфига; заодно запускает фоновый прогрев.
+    С procs.enabled детекторы считаются в процессах-воркерах (framebus.py).
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            startup.start(cfg)
+            scfg = cfg.get('scheduler', {}) or {}
+            dets = dict(DETECTORS)
+            if hud_model_configured(cfg):
+                # обученная модель заменит шаблоны у прицела, когда загрузится; не загрузится — останутся они
+                dets['hud_model'] = HUD_MODEL
+            overrides = cfg.get('detectors', {}) or {}
+            executor = None
+            pcfg = cfg.get('procs', {}) or {}
+            if pcfg.get('enabled', False):
+                import framebus
+                active = [d for n, d in dets.items() if (overrides.get(n) or {}).get('enabled', True)]
+                executor = framebus.ProcessExecutor(cfg, active, workers=pcfg.get('workers', 0),
+                                                    timeout=pcfg.get('timeout', 2.0),
+                                                    pool=framebus.get_frame_pool(cfg))
+            _scheduler = Scheduler(dets, budget_ms=scfg.get('budget_ms', 8.0),
+                                   enabled=scfg.get('enabled', True), overrides=overrides,
+                                   rois=cfg.get('rois'), executor=executor)
+        return _scheduler
+
+
+def close_scheduler():
+    """Остановить процессы-воркеры общего планировщика (если есть); следующий get_scheduler создаст новый."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is not None and _scheduler.executor is not None:
+            _scheduler.executor.close()
+        _scheduler = None
@@ -0,0 +1,278 @@
+"""
+Чтение HP и скорости из ROI status по шаблонам глифов (шрифт HUD фиксированный).
+Кроп бинаризуется (светлый текст на тёмном), строки и символы режутся по проекциям,
+каждый символ приводится к GLYPH_W x GLYPH_H и сравнивается со всеми шаблонами одним
+матричным умножением (нормированная корреляция). Символы собираются в токены по промежуткам:
+'a/b' -> hp / max_hp, отдельное число -> speed. Уверенность поля — минимальная по его символам.
+
+Шаблоны — PNG в glyphs_dir, имя файла: <символ>[_<что угодно>].png, '/' — slash; буквы подписей
+(k, m, h ...) тоже можно оставить шаблонами — они просто разделяют числа.
+Набрать их из записи:
+
+    python digits.py extract --replay captures/wot_capture.mp4 --out assets/glyphs
+    # переименовать unk_*.png в 0.png ... 9.png, slash.png, буквы — в k.png и т.п. (мусор удалить)
+    python digits.py test --replay captures/wot_capture.mp4
+"""
+import argparse
+import os
+import re
+import threading
+import cv2
+import numpy as np
+
+GLYPH_W, GLYPH_H = 8, 12
+_NAMES = {'slash': '/'}
+# число не должно касаться нераспознанного символа: '?00' — это не 0
+_NUMBER_RE = re.compile(r'(?<![\d?])\d+(?![\d?])')
+_FRACTION_RE = re.compile(r'(?<![\d?])(\d+) ?/ ?(\d+)(?![\d?])')
+
+
+def binarize(gray, threshold=0):
+    """Текст — 255. threshold=0 — порог Оцу по кропу."""
+    flags = cv2.THRESH_BINARY | (cv2.THRESH_OTSU if not threshold else 0)
+    return cv2.threshold(gray, threshold, 255, flags)[1]
+
+
+def _runs(profile, min_len=1):
+    """Отрезки [start, end) ненулевых значений одномерного профиля."""
+    on = np.concatenate([[False], profile > 0, [False]])
+    edges = np.flatnonzero(on[1:] != on[:-1])
+    runs = edges.reshape(-1, 2)
+    return runs[(runs[:, 1] - runs[:, 0]) >= min_len]
+
+
+def segment(binary, min_height=5):
+    """Боксы символов (x, y, w, h), слева направо по строкам."""
+    boxes = []
+    for y0, y1 in _runs(binary.sum(axis=1, dtype=np.int64), min_height):
+        band = binary[y0:y1] > 0
+        cols = _runs(band.sum(axis=0))
+        if not len(cols):
+            continue
+        # верх/низ чернил по каждому столбцу, затем минимум/максимум по отрезкам столбцов сразу
+        inked = band.any(axis=0)
+        top = np.where(inked, band.argmax(axis=0), band.shape[0])
+        bottom = np.where(inked, band.shape[0] - 1 - band[::-1].argmax(axis=0), -1)
+        tops = np.minimum.reduceat(top, cols[:, 0])
+        bottoms = np.maximum.reduceat(bottom, cols[:, 0])
+        # reduceat берёт отрезок до следующего начала — промежутки пустые и на результат не влияют
+        for (x0, x1), t, b in zip(cols.tolist(), tops.tolist(), bottoms.tolist()):
+            boxes.append((x0, y0 + t, x1 - x0, b - t + 1))
+    return boxes
+
+
+def _resized(glyphs):
+    return np.stack([cv2.resize(g, (GLYPH_W, GLYPH_H), interpolation=cv2.INTER_AREA).ravel()
+                     for g in glyphs]).astype(np.float32)
+
+
+def normalize_all(glyphs):
+    """Символы -> матрица векторов GLYPH_W*GLYPH_H с нулевым средним и единичной нормой."""
+    v = _resized(glyphs)
+    v -= v.mean(axis=1, keepdims=True)
+    n = np.linalg.norm(v, axis=1, keepdims=True)
+    return v / np.maximum(n, 1e-6)
+
+
+def normalize(glyph):
+    return normalize_all([glyph])[0]
+
+
+class DigitReader:
+    """
+    read(status_bgr) -> {hp, max_hp, speed, hp_conf, speed_conf, status_text}.
+    min_confidence — символ хуже этого считается нераспознанным ('?'), число с ним не собирается;
+    чего не хватило — можно добрать EasyOCR.
+    """
+    def __init__(self, glyphs_dir='assets/glyphs', threshold=0, min_confidence=0.7, gap=0.8):
+        self.threshold = int(threshold)
+        self.min_confidence = float(min_confidence)
+        self.gap = float(gap)  # промежуток шире gap * медианной ширины символа — новый токен
+        self.chars = []
+        vecs, aspects = [], []
+        if os.path.isdir(glyphs_dir):
+            for f in sorted(os.listdir(glyphs_dir)):
+                stem, ext = os.path.splitext(f)
+                if ext.lower() != '.png' or stem.startswith('unk'):
+                    continue
+                img = cv2.imread(os.path.join(glyphs_dir, f), cv2.IMREAD_GRAYSCALE)
+                if img is None:
+                    continue
+                name = stem.split('_')[0]
+                self.chars.append(_NAMES.get(name, name))
+                vecs.append(normalize(binarize(img, 127)))
+                aspects.append(img.shape[1] / img.shape[0])
+        self.templates = np.stack(vecs) if vecs else np.zeros((0, GLYPH_W * GLYPH_H), np.float32)
+        self.aspect = float(np.median(aspects)) if aspects else 0.6  # ширина/высота типичного символа
+
+    def split_touching(self, boxes):
+        """Каждый бокс -> части: слипшиеся символы (шире 1.6 типичного) режутся на равные доли."""
+        out = []
+        for x, y, w, h in boxes:
+            expected = self.aspect * h
+            k = int(round(w / expected)) if expected > 0 and w > 1.6 * expected else 1
+            if k <= 1:
+                out.append([(x, y, w, h)])
+                continue
+            edges = np.linspace(x, x + w, k + 1).round().astype(int).tolist()
+            out.append([(a, y, b - a, h) for a, b in zip(edges[:-1], edges[1:])])
+        return out
+
+    @property
+    def available(self):
+        return len(self.chars) > 0
+
+    def classify(self, binary, boxes):
+        """Символы и уверенности для всех боксов одним умножением матриц."""
+        if not boxes or not self.available:
+            return [], []
+        g = normalize_all([binary[y:y + h, x:x + w] for x, y, w, h in boxes])
+        corr = g @ self.templates.T
+        best = corr.argmax(axis=1)
+        return [self.chars[i] for i in best.tolist()], corr[np.arange(len(best)), best].tolist()
+
+    def text(self, boxes, chars, conf):
+        """Строка символов с пробелами на промежутках и уверенность каждой позиции (пробел — 1.0)."""
+        if not boxes:
+            return '', []
+        width = sorted(b[2] for b in boxes)[len(boxes) // 2]
+        text, confs, prev = [], [], None
+        for (x, y, w, h), ch, c in zip(boxes, chars, conf):
+            if prev is not None and (x < prev[0] or x - (prev[0] + prev[2]) > self.gap * width):
+                text.append(' ')
+                confs.append(1.0)
+            # символ без хорошего шаблона (буквы без своих PNG, мусор) разрывает число
+            text.append(ch if c >= self.min_confidence else '?')
+            confs.append(c)
+            prev = (x, y, w, h)
+        return ''.join(text), confs
+
+    def read(self, status_bgr):
+        gray = cv2.cvtColor(status_bgr, cv2.COLOR_BGR2GRAY)
+        binary = binarize(gray, self.threshold)
+        boxes = segment(binary)
+        chars, conf = self.classify(binary, boxes)
+        wide = [i for i, parts in enumerate(self.split_touching(boxes))
+                if len(parts) > 1 and conf[i] < self.min_confidence]
+        if wide:
+            # широкий бокс, не похожий ни на один шаблон (в отличие от, например, «m»), — слипшиеся цифры
+            parts = self.split_touching([boxes[i] for i in wide])
+            new_boxes, new_chars, new_conf, j = [], [], [], 0
+            for i, b in enumerate(boxes):
+                if j < len(wide) and wide[j] == i:
+                    pc, pf = self.classify(binary, parts[j])
+                    new_boxes += parts[j]
+                    new_chars += pc
+                    new_conf += pf
+                    j += 1
+                else:
+                    new_boxes.append(b)
+                    new_chars.append(chars[i])
+                    new_conf.append(conf[i])
+            boxes, chars, conf = new_boxes, new_chars, new_conf
+        text, confs = self.text(boxes, chars, conf)
+        res = {'hp': None, 'max_hp': None, 'speed': None, 'hp_conf': 0.0, 'speed_conf': 0.0,
+               'status_text': text}
+        numbers = [(int(m.group()), min(confs[m.start():m.end()]), m.span()) for m in _NUMBER_RE.finditer(text)]
+        frac = _FRACTION_RE.search(text)
+        if frac:
+            res['hp'], res['max_hp'] = int(frac.group(1)), int(frac.group(2))
+            res['hp_conf'] = min(confs[frac.start(1):frac.end(1)] + confs[frac.start(2):frac.end(2)])
+            numbers = [n for n in numbers if n[2][0] >= frac.end() or n[2][1] <= frac.start()]
+        elif '/' in text:
+            # дробь не прочиталась целиком: её части не выдавать ни за hp, ни за скорость
+            numbers = [n for n in numbers if '/' not in text[max(0, n[2][0] - 2):n[2][1] + 2]]
+        elif numbers:
+            res['hp'], res['hp_conf'] = numbers[0][:2]
+            numbers = numbers[1:]
+        if numbers:
+            res['speed'], res['speed_conf'] = numbers[-1][:2]
+        return res
+
+
+_reader = None
+_reader_lock = threading.Lock()
+
+
+def get_digit_reader(cfg):
+    """Общий DigitReader по секции digits; None — выключен или шаблонов нет (остаётся EasyOCR)."""
+    global _reader
+    dcfg = cfg.get('digits', {}) or {}
+    if not dcfg.get('enabled', True):
+        return None
+    with _reader_lock:
+        if _reader is None:
+            _reader = DigitReader(dcfg.get('glyphs_dir', 'assets/glyphs'),
+                                  threshold=dcfg.get('threshold', 0),
+                                  min_confidence=dcfg.get('min_confidence', 0.7),
+                                  gap=dcfg.get('gap', 0.8))
+            if not _reader.available:
+                print(f"[digits] нет шаблонов глифов в {dcfg.get('glyphs_dir', 'assets/glyphs')}, HP/скорость — через EasyOCR")
+        return _reader if _reader.available else None
+
+
+def _status_crops(cfg, replay, limit):
+    from capture import ReplaySource, recycle
+    from layout import get_layout
+    src = ReplaySource(replay)
+    n = 0
+    try:
+        while not limit or n < limit:
+            ok, frame = src.read()
+            if not ok:
+                break
+            yield get_layout(cfg, frame.shape).crop(frame, 'status').copy()  # глифы — в рабочем разрешении
+            recycle(src, frame)
+            n += 1
+    finally:
+        src.release()
+
+
+def extract(cfg, replay, out_dir, limit=0, threshold=0, same=0.95):
+    """Уникальные символы из ROI status записи -> out_dir/unk_NNN.png (для ручной разметки)."""
+    os.makedirs(out_dir, exist_ok=True)
+    vecs = []
+    for status in _status_crops(cfg, replay, limit):
+        binary = binarize(cv2.cvtColor(status, cv2.COLOR_BGR2GRAY), threshold)
+        for x, y, w, h in segment(binary):
+            glyph = binary[y:y + h, x:x + w]
+            v = normalize(glyph)
+            if vecs and float(np.max(np.stack(vecs) @ v)) >= same:
+                continue
+            cv2.imwrite(os.path.join(out_dir, f'unk_{len(vecs):03d}.png'), glyph)
+            vecs.append(v)
+    print(f'[digits] уникальных символов: {len(vecs)} -> {out_dir} (переименуй в 0.png..9.png, slash.png)')
+
+
+def main():
+    import time
+    import yaml
+    ap = argparse.ArgumentParser()
+    ap.add_argument('cmd', choices=['extract', 'test'])
+    ap.add_argument('--config', default='config.yaml')
+    ap.add_argument('--replay', required=True, help='MP4, каталог кадров или сессия датасета')
+    ap.add_argument('--out', default=None, help='extract: каталог для глифов (по умолчанию digits.glyphs_dir)')
+    ap.add_argument('--frames', type=int, default=0)
+    args = ap.parse_args()
+    with open(args.config, 'r', encoding='utf-8') as f:
+        cfg = yaml.safe_load(f)
+    dcfg = cfg.get('digits', {}) or {}
+    if args.cmd == 'extract':
+        extract(cfg, args.replay, args.out or dcfg.get('glyphs_dir', 'assets/glyphs'), args.frames,
+                dcfg.get('threshold', 0))
+        return
+    reader = get_digit_reader(cfg)
+    if reader is None:
+        return
+    times = []
+    for status in _status_crops(cfg, args.replay, args.frames or 200):
+        t0 = time.perf_counter()
+        res = reader.read(status)
+        times.append(time.perf_counter() - t0)
+        print(res)
+    if times:
+        print(f'[digits] p50 {np.median(times) * 1000:.3f}ms, max {max(times) * 1000:.3f}ms')
+
+
+if __name__ == '__main__':
+    main()
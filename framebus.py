@@ -0,0 +1,347 @@
+"""
+Многопроцессное восприятие: детекторы работают в отдельных процессах, а кадры к ним не копируются.
+Буферы пула кадров источника — слоты одного блока разделяемой памяти (SharedFramePool), так что
+захват пишет кадр сразу туда. На кадр главный процесс (тот же Scheduler из detectors.py) решает,
+какие детекторы запустить, и шлёт их воркерам сообщение (блок, форма, смещение, поколение слота, имена);
+воркер режет свои ROI прямо из слота, запускает детекторы и возвращает только их поля state.
+Пул пишет в заголовок слота новое поколение каждый раз, когда отдаёт слот под кадр (до записи
+пикселей); воркер сверяет его после детекторов — кадр, слот которого успели отдать заново,
+не выдаётся за текущий. Все выделенные слоты остаются в пуле: блок на разрешение не растёт.
+
+Детекторы, связанные depends, живут в одном воркере; остальные раскладываются по procs.workers
+процессам по оценке стоимости (0 — по процессу на группу). Тяжёлые ресурсы (EasyOCR, HUD-модель,
+шаблоны) грузятся только в том воркере, которому нужны, и их статусы приходят в startup главного.
+
+    python bench.py --replay captures/wot_capture.mp4 --procs-scaling 4
+"""
+import atexit
+import multiprocessing as mp
+import signal
+import threading
+import time
+import numpy as np
+from multiprocessing import shared_memory
+import startup
+from capture import FramePool
+
+_ALIGN = 64
+
+
+def _round(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class _Block:
+    """Блок разделяемой памяти: заголовок поколений по слотам (int64) и сами слоты одной формы."""
+    def __init__(self, slots, shape):
+        self.shape = tuple(shape)
+        self.slots = int(slots)
+        self.frame_bytes = _round(int(np.prod(self.shape)))
+        self.header = _round(8 * self.slots)
+        self.shm = shared_memory.SharedMemory(create=True, size=self.header + self.frame_bytes * self.slots)
+        self.seq = np.ndarray((self.slots,), np.int64, self.shm.buf[:8 * self.slots])
+        self.seq[:] = -1
+        self.used = 0
+        self.live = 0  # слотов, выданных и ещё не выброшенных пулом
+
+    def view(self, i):
+        off = self.header + i * self.frame_bytes
+        return np.ndarray(self.shape, np.uint8, self.shm.buf, off)
+
+    def close(self):
+        self.seq = None
+        try:
+            self.shm.unlink()  # имя убираем сразу; отображение живёт, пока на буферы есть ссылки
+        except FileNotFoundError:
+            pass
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # кадры ещё у кого-то на руках — память освободится с последней ссылкой
+
+
+class SharedFramePool(FramePool):
+    """
+    FramePool, чьи буферы лежат в разделяемой памяти; locate(buf) -> (блок, слот, поколение) или None.
+    Свободными держатся все max_size слотов блока (keep), поэтому на разрешение нужен один блок;
+    блок прошлого разрешения закрывается, когда вернулся его последний кадр.
+    """
+    def __init__(self, size=4):
+        super().__init__(size, max_size=2 * size)
+        self.keep = self.max_size
+        self._block = None
+        self._blocks = []
+        self._where = {}  # id(buf) -> (buf, блок, слот); buf держим, чтобы id не переиспользовался
+        self._gen = 0
+
+    def _alloc(self, shape):
+        if self._block is None or self._block.shape != tuple(shape):
+            # новое разрешение: новый блок; старый закроется, когда отдадут его кадры
+            old = self._block
+            self._block = _Block(self.max_size, shape)
+            self._blocks.append(self._block)
+            if old is not None and not old.live:
+                self._close_block(old)
+        block = self._block
+        # в пуле не больше max_size буферов текущей формы, и все свободные возвращаются в _free
+        i = block.used
+        block.used += 1
+        block.live += 1
+        buf = block.view(i)
+        self._where[id(buf)] = (buf, block, i)
+        return buf
+
+    def _handout(self, buf):
+        _, block, i = self._where[id(buf)]
+        self._gen += 1
+        block.seq[i] = self._gen
+
+    def _discard(self, buf):
+        where = self._where.pop(id(buf), None)
+        if where is None:
+            return
+        block = where[1]
+        block.live -= 1
+        if block is not self._block and not block.live:
+            self._close_block(block)
+
+    def _close_block(self, block):
+        self._blocks.remove(block)
+        block.close()
+
+    def locate(self, buf):
+        with self._lock:
+            where = self._where.get(id(buf))
+            if where is None or where[0] is not buf:
+                return None
+            _, block, i = where
+            return block, i, int(block.seq[i])
+
+    def close(self):
+        self._where.clear()
+        self._free.clear()
+        self._refs.clear()
+        for b in self._blocks:
+            b.close()
+        self._blocks.clear()
+
+
+def share_source(src, pool):
+    """Подменить пул источника (и RoiGrabber) на разделяемый; вызывать до первого read()."""
+    src.pool = pool
+    grabber = getattr(src, 'roi_grabber', None)
+    if grabber is not None:
+        grabber.pool = pool
+    return src
+
+
+def _worker_main(cfg, names, conn):
+    """Процесс-воркер: детекторы names; сообщения (seq, блок, форма, смещение, слот, поколение, имена) -> поля."""
+    import detectors
+    from layout import get_layout
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C ловит главный процесс и закрывает воркеры сам
+    dets = {n: (detectors.HUD_MODEL if n == 'hud_model' else detectors.DETECTORS[n]) for n in names}
+    send_lock = threading.Lock()
+
+    def send(msg):
+        with send_lock:
+            conn.send(msg)
+
+    resources = {r for d in dets.values() for r in d.needs + d.uses}
+    startup.start(dict(cfg, procs={'enabled': False}), only=resources)
+
+    def report_status():
+        last = None
+        while True:
+            st = {k: v for k, v in startup.status().items() if k in resources}
+            if st != last:
+                send(('status', st))
+                last = st
+            if not startup.loading():
+                return
+            time.sleep(0.1)
+    threading.Thread(target=report_status, name='status', daemon=True).start()
+
+    shms = {}
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        seq, shm_name, shape, offset, seq_index, gen, run = msg
+        shm = shms.get(shm_name)
+        if shm is None:
+            shm = shms[shm_name] = shared_memory.SharedMemory(name=shm_name)
+        frame = np.ndarray(shape, np.uint8, shm.buf, offset)
+        slot_seq = np.ndarray((1,), np.int64, shm.buf, 8 * seq_index)
+        layout = get_layout(cfg, shape)
+        results, error = [], None
+        for name in run:
+            det = dets[name]
+            t0 = time.perf_counter()
+            try:
+                roi = frame if det.roi is None else layout.crop(frame, det.roi)
+                out = det.run(roi, cfg)
+            except Exception as e:
+                error = f'{name}: {e.__class__.__name__}: {e}'
+                break
+            results.append((name, out, time.perf_counter() - t0))
+        if int(slot_seq[0]) != gen:
+            results, error = [], f'слот отдан под новый кадр (поколение {int(slot_seq[0])} != {gen})'
+        del frame, slot_seq
+        send(('result', seq, results, error))
+    for shm in shms.values():
+        shm.close()
+
+
+def _groups(detectors, workers):
+    """Компоненты связности по depends, разложенные по workers процессам (жадно по стоимости)."""
+    parent = {d.name: d.name for d in detectors}
+
+    def find(n):
+        while parent[n] != n:
+            parent[n] = parent[parent[n]]
+            n = parent[n]
+        return n
+    for d in detectors:
+        for dep in d.depends:
+            if dep in parent:
+                parent[find(d.name)] = find(dep)
+    comps = {}
+    for d in detectors:
+        comps.setdefault(find(d.name), []).append(d)
+    comps = sorted(comps.values(), key=lambda c: -sum(d.cost for d in c))
+    n = len(comps) if not workers or workers <= 0 else min(int(workers), len(comps))
+    bins = [[] for _ in range(n)]
+    load = [0.0] * n
+    for comp in comps:
+        i = load.index(min(load))
+        bins[i] += [d.name for d in comp]
+        load[i] += sum(d.cost for d in comp)
+    return [b for b in bins if b]
+
+
+class ProcessExecutor:
+    """Запуск выбранных детекторов кадра в процессах-воркерах; run() ждёт все ответы этого кадра."""
+    def __init__(self, cfg, detectors, workers=0, timeout=2.0, pool=None):
+        self.timeout = float(timeout)
+        self.pool = pool  # SharedFramePool источника (share_source): кадры из него не копируются
+        ctx = mp.get_context('spawn')  # как на Windows; fork с потоками OpenCV/torch ненадёжен
+        self.groups = _groups(detectors, workers)
+        for r in {r for d in detectors for r in d.needs + d.uses}:
+            startup.set_status(r, startup.LOADING)  # грузят воркеры, статусы придут в poll()
+        self.owner = {}
+        self._conns = []
+        self._procs = []
+        for i, names in enumerate(self.groups):
+            parent, child = ctx.Pipe()
+            p = ctx.Process(target=_worker_main, args=(cfg, names, child), name=f'perception-proc-{i}', daemon=True)
+            p.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(p)
+            for n in names:
+                self.owner[n] = i
+        self._staging = None
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.stats = {'frames': 0, 'staged': 0, 'errors': 0, 'ipc_ms': 0.0}
+        atexit.register(self.close)
+        print(f'[framebus] воркеров: {len(self.groups)}: ' + '; '.join(', '.join(g) for g in self.groups))
+
+    def poll(self):
+        """Забрать статусы прогрева воркеров (без ожидания)."""
+        for conn in self._conns:
+            while conn.poll():
+                self._handle(conn.recv())
+
+    def _handle(self, msg):
+        if msg[0] == 'status':
+            for name, st in msg[1].items():
+                startup.set_status(name, st)
+            return None
+        return msg
+
+    def _place(self, frame, seq):
+        """(блок, слот, поколение) кадра в разделяемой памяти; кадр вне общего пула копируется в запасной слот."""
+        where = self.pool.locate(frame) if self.pool is not None else None
+        if where is not None:
+            return where
+        if self._staging is None or self._staging.shape != frame.shape:
+            if self._staging is not None:
+                self._staging.close()
+            self._staging = _Block(1, frame.shape)
+        self._staging.seq[0] = seq  # запасной слот пишем только мы и только под замком run()
+        np.copyto(self._staging.view(0), frame)
+        self.stats['staged'] += 1
+        return self._staging, 0, seq
+
+    def run(self, frame, names):
+        """[(имя, поля, сек)] в порядке names (только успешно отработавшие)."""
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            block, slot, gen = self._place(frame, seq)
+            offset = block.header + slot * block.frame_bytes
+            by_worker = {}
+            for n in names:
+                by_worker.setdefault(self.owner[n], []).append(n)
+            t0 = time.perf_counter()
+            for i, run in by_worker.items():
+                self._conns[i].send((seq, block.shm.name, block.shape, offset, slot, gen, run))
+            results = {}
+            for i in by_worker:
+                conn = self._conns[i]
+                while True:
+                    if not conn.poll(self.timeout):
+                        print(f'[framebus] воркер {i} не ответил за {self.timeout}s')
+                        self.stats['errors'] += 1
+                        break
+                    msg = self._handle(conn.recv())
+                    if msg is None:
+                        continue
+                    _, rseq, res, error = msg
+                    if rseq != seq:
+                        continue  # опоздавший ответ на прошлый кадр после таймаута
+                    if error:
+                        print(f'[framebus] воркер {i}: {error}')
+                        self.stats['errors'] += 1
+                    for name, out, dt in res:
+                        results[name] = (out, dt)
+                    break
+            wall = time.perf_counter() - t0
+            self.stats['frames'] += 1
+            busy = max((sum(results[n][1] for n in run if n in results) for run in by_worker.values()), default=0.0)
+            self.stats['ipc_ms'] += ((wall - busy) * 1000.0 - self.stats['ipc_ms']) / self.stats['frames']
+        return [(n,) + results[n] for n in names if n in results]
+
+    def close(self):
+        for conn in self._conns:
+            try:
+                conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for p in self._procs:
+            p.join(timeout=2.0)
+            if p.is_alive():
+                p.terminate()
+        for conn in self._conns:
+            conn.close()
+        self._conns, self._procs = [], []
+        if self._staging is not None:
+            self._staging.close()
+            self._staging = None
+
+
+_pool = None
+
+
+def get_frame_pool(cfg):
+    """Общий SharedFramePool, если procs.enabled (источник должен писать кадры в него), иначе None."""
+    global _pool
+    pcfg = cfg.get('procs', {}) or {}
+    if not pcfg.get('enabled', False):
+        return None
+    if _pool is None:
+        _pool = SharedFramePool(int((cfg.get('capture', {}) or {}).get('buffers', 4)))
+        atexit.register(_pool.close)
+    return _pool
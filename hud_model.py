@@ -0,0 +1,205 @@
+"""
+Обученный YOLO-детектор HUD (train_hud.py -> runs/hud) как бэкенд восприятия на CPU.
+Модель загружается один раз и экспортируется рядом с весами в TorchScript (или ONNX, с int8-
+квантованием через onnxruntime); экспорт переиспользуется, пока веса не поменялись.
+Кропы всех ROI из hud_model.rois вписываются в imgsz x imgsz и идут одним батчем; ONNX
+экспортируется с динамическим батчем, а трассированный TorchScript — с батчем ровно на число ROI
+(у трассировки YOLO размер батча зашит в граф), другой размер режется на куски этого батча.
+Сразу после загрузки модель прогоняется на пустых кропах: неработающий экспорт не доходит до кадров.
+Число потоков ограничено threads, чтобы инференс не отнимал ядра у захвата.
+Если весов нет или torch/ultralytics не установлены — get_hud_model() возвращает None,
+и работают HSV/шаблонные детекторы. Загружается в фоне (startup.py): пока модели нет,
+у прицела работают шаблоны.
+"""
+import glob
+import json
+import os
+import threading
+import cv2
+import numpy as np
+from startup import optional_import
+
+DEFAULT_WEIGHTS = 'runs/hud/*/weights/best.pt'
+
+
+def find_weights(pattern):
+    """Самые свежие веса по шаблону пути (train_hud.py пишет в runs/hud/<name>/weights/best.pt)."""
+    files = glob.glob(pattern)
+    return max(files, key=os.path.getmtime) if files else None
+
+
+def export_model(weights, backend='torchscript', imgsz=320, int8=False, batch=1):
+    """
+    Путь к экспортированной модели и имена классов; экспорт — только если его нет или веса новее.
+    batch — батч TorchScript (фиксированный), ONNX всегда с динамическим.
+    """
+    stem = os.path.splitext(weights)[0]
+    batch = max(1, int(batch))
+    out = stem + (f'.b{batch}.torchscript' if backend == 'torchscript' else ('.int8.onnx' if int8 else '.onnx'))
+    names_path = stem + '.names.json'
+    if os.path.exists(out) and os.path.exists(names_path) and \
+            os.path.getmtime(out) >= os.path.getmtime(weights):
+        with open(names_path, 'r', encoding='utf-8') as f:
+            return out, {int(k): v for k, v in json.load(f).items()}
+    ultralytics = optional_import('ultralytics')
+    if ultralytics is None:
+        raise ImportError('нужен ultralytics для экспорта (pip install ultralytics)')
+    model = ultralytics.YOLO(weights)
+    names = dict(model.names)
+    print(f'[hud_model] экспорт {weights} -> {backend}, imgsz={imgsz}')
+    if backend == 'torchscript':
+        exported = model.export(format='torchscript', imgsz=imgsz, batch=batch)
+    else:
+        exported = model.export(format='onnx', imgsz=imgsz, dynamic=True)
+        if int8:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(exported, out, weight_type=QuantType.QUInt8)
+            exported = out
+    if os.path.abspath(exported) != os.path.abspath(out):
+        os.replace(exported, out)
+    with open(names_path, 'w', encoding='utf-8') as f:
+        json.dump(names, f, ensure_ascii=False)
+    return out, names
+
+
+class HudModel:
+    """
+    infer(crops) -> для каждого кропа список (класс, уверенность, (x, y, w, h) в координатах кропа).
+    batch — фиксированный батч TorchScript-экспорта (None — модель принимает любой).
+    """
+    def __init__(self, path, names, backend='torchscript', imgsz=320, conf=0.4, iou=0.5, threads=2, batch=None):
+        self.names = names
+        self.backend = backend
+        self.batch = int(batch) if batch and backend == 'torchscript' else None
+        self.imgsz = int(imgsz)
+        self.conf = float(conf)
+        self.iou = float(iou)
+        self._lock = threading.Lock()
+        if backend == 'torchscript':
+            torch = optional_import('torch')
+            if torch is None:
+                raise ImportError('нужен torch (pip install torch)')
+            if threads:
+                torch.set_num_threads(int(threads))
+            self._torch = torch
+            self._model = torch.jit.load(path, map_location='cpu').eval()
+        else:
+            ort = optional_import('onnxruntime')
+            if ort is None:
+                raise ImportError('нужен onnxruntime (pip install onnxruntime)')
+            opts = ort.SessionOptions()
+            if threads:
+                opts.intra_op_num_threads = int(threads)
+                opts.inter_op_num_threads = 1
+            self._session = ort.InferenceSession(path, opts, providers=['CPUExecutionProvider'])
+            self._input = self._session.get_inputs()[0].name
+        self._batch = None
+
+    def _letterbox(self, crop, dst):
+        """Вписать кроп в квадрат imgsz (серые поля), вернуть масштаб и смещение."""
+        h, w = crop.shape[:2]
+        s = min(self.imgsz / w, self.imgsz / h)
+        nw, nh = max(1, int(round(w * s))), max(1, int(round(h * s)))
+        px, py = (self.imgsz - nw) // 2, (self.imgsz - nh) // 2
+        dst[:] = 114
+        dst[py:py + nh, px:px + nw] = cv2.resize(crop, (nw, nh), interpolation=cv2.INTER_LINEAR)
+        return s, px, py
+
+    def _forward(self, batch):
+        if self.backend == 'torchscript':
+            n, k = len(batch), self.batch or len(batch)
+            if n % k:  # трассированный граф принимает ровно k кропов: добиваем нулями и режем обратно
+                batch = np.concatenate([batch, np.zeros((k - n % k,) + batch.shape[1:], batch.dtype)])
+            outs = []
+            with self._torch.inference_mode():
+                for i in range(0, len(batch), k):
+                    out = self._model(self._torch.from_numpy(batch[i:i + k]))
+                    out = out[0] if isinstance(out, (list, tuple)) else out
+                    outs.append(out.numpy())
+            return np.concatenate(outs)[:n]
+        return self._session.run(None, {self._input: batch})[0]
+
+    def check(self, n):
+        """Прогон на n пустых кропах: экспорт, который не принимает такой батч, падает здесь, а не на кадрах."""
+        out = self.infer([np.zeros((self.imgsz, self.imgsz, 3), np.uint8)] * n)
+        if len(out) != n:
+            raise RuntimeError(f'на батч {n} модель вернула {len(out)} ответов')
+
+    def infer(self, crops):
+        n, s = len(crops), self.imgsz
+        with self._lock:
+            if self._batch is None or self._batch.shape[0] != n:
+                self._batch = np.empty((n, s, s, 3), np.uint8)
+            boxes = [self._letterbox(c, self._batch[i]) for i, c in enumerate(crops)]
+            # BGR HWC uint8 -> RGB CHW float32 одним проходом на весь батч
+            x = np.ascontiguousarray(self._batch[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32)
+            x *= 1.0 / 255
+            pred = self._forward(x)  # (N, 4 + классы, якоря): cx, cy, w, h, оценки классов
+        out = []
+        for i, (scale, px, py) in enumerate(boxes):
+            p = pred[i].T
+            scores = p[:, 4:]
+            cls = scores.argmax(1)
+            conf = scores[np.arange(len(cls)), cls]
+            keep = conf >= self.conf
+            if not keep.any():
+                out.append([])
+                continue
+            xywh, cls, conf = p[keep, :4], cls[keep], conf[keep]
+            rects = np.stack([(xywh[:, 0] - xywh[:, 2] / 2 - px) / scale,
+                              (xywh[:, 1] - xywh[:, 3] / 2 - py) / scale,
+                              xywh[:, 2] / scale, xywh[:, 3] / scale], axis=1)
+            idx = cv2.dnn.NMSBoxes(rects.tolist(), conf.tolist(), self.conf, self.iou)
+            out.append([(self.names.get(int(cls[j]), str(int(cls[j]))), float(conf[j]),
+                         tuple(float(v) for v in rects[j])) for j in np.asarray(idx).ravel()])
+        return out
+
+
+_model = None
+_model_failed = False
+_model_lock = threading.Lock()
+
+
+def hud_model_configured(cfg):
+    """Модель включена и веса есть — дёшево, без импорта torch (решает, ждать ли модель)."""
+    mcfg = cfg.get('hud_model', {}) or {}
+    return bool(mcfg.get('enabled', True)) and find_weights(mcfg.get('weights', DEFAULT_WEIGHTS)) is not None
+
+
+def loaded_hud_model():
+    """Уже загруженная модель или None; никогда не ждёт загрузки."""
+    return _model
+
+
+def get_hud_model(cfg):
+    """Общая модель по секции hud_model конфига; None — модели нет (работают HSV/шаблоны)."""
+    global _model, _model_failed
+    mcfg = cfg.get('hud_model', {}) or {}
+    if not mcfg.get('enabled', True):
+        return None
+    with _model_lock:
+        if _model is not None or _model_failed:
+            return _model
+        weights = find_weights(mcfg.get('weights', DEFAULT_WEIGHTS))
+        if weights is None:
+            _model_failed = True  # не искать веса и не импортировать torch каждый кадр
+            return None
+        backend = mcfg.get('backend', 'torchscript')
+        batch = max(1, len(model_rois(cfg)))
+        try:
+            path, names = export_model(weights, backend, mcfg.get('imgsz', 320), mcfg.get('int8', False), batch)
+            model = HudModel(path, names, backend=backend, imgsz=mcfg.get('imgsz', 320),
+                             conf=mcfg.get('conf', 0.4), iou=mcfg.get('iou', 0.5),
+                             threads=mcfg.get('threads', 2), batch=batch)
+            model.check(batch)
+            _model = model
+            print(f'[hud_model] {path}: батч {batch}, классы {sorted(names.values())}')
+        except Exception as e:
+            print(f'[hud_model] модель {weights} не загружена ({e}), работают HSV/шаблоны')
+            _model_failed = True
+        return _model
+
+
+def model_rois(cfg):
+    mcfg = cfg.get('hud_model', {}) or {}
+    return [r for r in mcfg.get('rois', ['crosshair', 'minimap']) if r in cfg['rois']]
@@ -0,0 +1,150 @@
+"""
+ROI в долях кадра и рабочее разрешение детекторов.
+rois в конфиге — доли кадра [x, y, w, h] (так пишет calibrate.py); старые пиксельные ROI
+считаются снятыми на layout.base (по умолчанию 1920x1080). Пиксельные ROI под конкретный размер
+кадра считаются один раз на размер и кэшируются: окно игры сменило размер или монитор —
+пересчёт на следующем кадре, а не тихо съехавшие кропы.
+Кропы приводятся к рабочему разрешению (layout.work_size, по умолчанию base): шаблоны, ядра и
+пороги детекторов настроены под него, поэтому detect_minimap и поиск лампочки стоят одинаково
+на 1080p и 4K, а координаты в state (точки миникарты) не зависят от разрешения кадра.
+На самом base кропы — срезы кадра без копии, как раньше.
+
+Масштаб один на обе оси: раскладка base вписывается в кадр, и HUD не растягивается. Если пропорции
+кадра другие (ultrawide, 4:3, обрезанное окно), каждый ROI привязывается к ближайшему краю
+кадра по своему центру: левая/правая треть — к левому/правому краю, середина — к центру
+(так же по вертикали). Миникарта в правом нижнем углу остаётся в углу, а не уезжает в середину
+широкого кадра. При пропорциях base все привязки дают одно и то же.
+"""
+import threading
+import cv2
+
+DEFAULT_BASE = (1920, 1080)
+ASPECT_TOLERANCE = 0.01  # относительная разница пропорций кадра и base, после которой ROI привязываются к краям
+
+
+def is_normalized(rois):
+    """ROI в долях кадра (все числа в 0..1), а не в пикселях."""
+    return bool(rois) and all(0.0 <= float(v) <= 1.0 for r in rois.values() for v in r)
+
+
+def normalize(rois, width, height):
+    """Пиксельные ROI кадра width x height -> доли этого же кадра (старые пиксельные конфиги на base)."""
+    return {name: [x / width, y / height, w / width, h / height] for name, (x, y, w, h) in rois.items()}
+
+
+def _anchor(center):
+    """Доля центра ROI по оси -> привязка: 0 — к началу, 1 — к концу, 0.5 — к середине."""
+    return 0.0 if center < 1.0 / 3.0 else 1.0 if center > 2.0 / 3.0 else 0.5
+
+
+def _place(pos, base_len, frame_len, scale, anchor):
+    """Координата base -> кадр: расстояние до привязанной точки масштабируется вместе с HUD."""
+    return anchor * frame_len + (pos - anchor * base_len) * scale
+
+
+def frame_scale(width, height, base=DEFAULT_BASE):
+    """Пикселей кадра на пиксель base — одинаково по обеим осям (base вписан в кадр)."""
+    return min(width / float(base[0]), height / float(base[1]))
+
+
+def to_base(rois, width, height, base=DEFAULT_BASE):
+    """
+    Пиксельные ROI кадра width x height -> доли раскладки base (обратное к Layout).
+    Для calibrate.py: ROI, размеченные в ultrawide-окне, ложатся на те же элементы HUD и в 16:9.
+    """
+    bw, bh = base
+    scale = frame_scale(width, height, base)
+    out = {}
+    for name, (x, y, w, h) in rois.items():
+        ax = _anchor((x + w / 2.0) / width)
+        ay = _anchor((y + h / 2.0) / height)
+        bx = ax * bw + (x - ax * width) / scale
+        by = ay * bh + (y - ay * height) / scale
+        out[name] = [bx / bw, by / bh, w / scale / bw, h / scale / bh]
+    return out
+
+
+def base_size(cfg):
+    return tuple(int(v) for v in ((cfg.get('layout') or {}).get('base') or DEFAULT_BASE))
+
+
+def work_size(cfg):
+    return tuple(int(v) for v in ((cfg.get('layout') or {}).get('work_size') or base_size(cfg)))
+
+
+def work_scale(cfg):
+    """Во сколько раз рабочее разрешение крупнее base: множитель для шаблонов и пиксельных порогов."""
+    return work_size(cfg)[1] / float(base_size(cfg)[1])
+
+
+class Layout:
+    """
+    ROI одного размера кадра: px — пиксельные [x, y, w, h] (обрезаны по кадру), crop(frame, name) —
+    кроп в рабочем разрешении, to_frame / box_to_frame — координаты из кропа обратно в кадр.
+    scale — кадр -> рабочее разрешение, один на обе оси.
+    """
+    def __init__(self, rois, width, height, base=DEFAULT_BASE, work=None):
+        self.width, self.height = int(width), int(height)
+        work = work or base
+        bw, bh = base
+        norm = rois if is_normalized(rois) else normalize(rois, bw, bh)
+        hud = frame_scale(self.width, self.height, base)
+        self.aspect_mismatch = abs(self.width * bh / float(self.height * bw) - 1.0) > ASPECT_TOLERANCE
+        if self.aspect_mismatch:
+            print(f'[layout] пропорции кадра {self.width}x{self.height} не как у base {bw}x{bh}: '
+                  f'масштаб HUD {hud:.3f}, ROI привязаны к ближайшим краям')
+        self.scale = min(work[0] / float(bw), work[1] / float(bh)) / hud
+        self.identity = abs(self.scale - 1.0) < 1e-9
+        self.px = {}
+        self.work = {}
+        for name, (fx, fy, fw, fh) in norm.items():
+            ax, ay = _anchor(fx + fw / 2.0), _anchor(fy + fh / 2.0)
+            x = _place(fx * bw, bw, self.width, hud, ax)
+            y = _place(fy * bh, bh, self.height, hud, ay)
+            x = min(max(0, int(round(x))), self.width - 1)
+            y = min(max(0, int(round(y))), self.height - 1)
+            w = max(1, min(int(round(fw * bw * hud)), self.width - x))
+            h = max(1, min(int(round(fh * bh * hud)), self.height - y))
+            self.px[name] = [x, y, w, h]
+            self.work[name] = (max(1, int(round(w * self.scale))), max(1, int(round(h * self.scale))))
+        self._interp = cv2.INTER_AREA if self.scale < 1.0 else cv2.INTER_LINEAR
+
+    def crop(self, frame, name):
+        x, y, w, h = self.px[name]
+        view = frame[y:y + h, x:x + w]
+        if self.identity:
+            return view
+        return cv2.resize(view, self.work[name], interpolation=self._interp)
+
+    def to_frame(self, name, x, y):
+        """Точка кропа name в рабочем разрешении -> пиксели кадра."""
+        rx, ry = self.px[name][:2]
+        return rx + x / self.scale, ry + y / self.scale
+
+    def box_to_frame(self, name, box):
+        x, y, w, h = box
+        fx, fy = self.to_frame(name, x, y)
+        return int(round(fx)), int(round(fy)), int(round(w / self.scale)), int(round(h / self.scale))
+
+
+_layouts = {}
+_layouts_lock = threading.Lock()
+
+
+def layout_for(rois, width, height, base=DEFAULT_BASE, work=None):
+    """Layout из кэша: пересчёт только при новом размере кадра (или другом словаре rois)."""
+    key = (id(rois), int(width), int(height), tuple(base), tuple(work or base))
+    lay = _layouts.get(key)
+    if lay is not None and lay[0] is rois:
+        return lay[1]
+    with _layouts_lock:
+        if len(_layouts) >= 16:
+            _layouts.clear()  # размеры кадра меняются редко; старые просто выбрасываем
+        layout = Layout(rois, width, height, base, work)
+        _layouts[key] = (rois, layout)  # держим rois: id не переиспользуется, пока запись жива
+    return layout
+
+
+def get_layout(cfg, shape):
+    """Layout секции rois конфига под кадр формы shape (h, w[, c])."""
+    return layout_for(cfg.get('rois') or {}, shape[1], shape[0], base_size(cfg), work_size(cfg))
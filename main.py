@@ -1,13 +1,19 @@
+import startup  # первым: от его импорта считается профиль старта
 import argparse
 import time
 import yaml
 import cv2
 import numpy as np
-from utils import FpsMeter
-from capture import make_source
+import metrics
+from utils import FpsMeter, LatencyMeter
+from capture import make_source, recycle, paced_start
 from perception import analyze_frame
 from overlay import draw_overlay
 from policy import make_advice
+from pipeline import Pipeline
+from recorder import make_recorder
+from dataset_io import make_dataset_writer
+from service import make_server, run_headless, DEFAULT_LISTEN
 
 
 def load_config(path: str):
@@ -15,15 +21,35 @@ def load_config(path: str):
         return yaml.safe_load(f)
 
 
+def _close_recorder(recorder):
+    st = recorder.close()
+    print(f"[video] записано кадров: {st['written']}, выброшено: {st['dropped']}, "
+          f"сегментов: {st['segments']}, кодирование ~{st['encode_ms']:.1f}ms/кадр")
+
+
+def _close_dataset(dataset):
+    st = dataset.close()
+    print(f"[dataset] кадров: {st['frames']}, выброшено: {st['dropped']}, "
+          f"{st['bytes'] / 1e6:.1f} MB в {st['shards']} шардах -> {dataset.path}")
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument('--config', default='config.yaml')
-    ap.add_argument('--source', default=None, help='window|screen|camera|rtmp|hls (переопределяет config)')
+    ap.add_argument('--source', default=None, help='window|screen|camera|rtmp|hls|replay (переопределяет config)')
     ap.add_argument('--camera-index', type=int, default=None)
     ap.add_argument('--url', type=str, default=None)
     ap.add_argument('--window-title', type=str, default=None, help='подстрока заголовка окна для source=window')
+    ap.add_argument('--replay', type=str, default=None, help='MP4 или каталог кадров (включает source=replay)')
     ap.add_argument('--debug', action='store_true')
+    ap.add_argument('--pipeline', action='store_true', help='захват/восприятие/рендер в отдельных потоках')
+    ap.add_argument('--workers', type=int, default=None, help='число воркеров восприятия в режиме --pipeline')
+    ap.add_argument('--profile-startup', action='store_true',
+                    help='напечатать время до первого кадра и до полной готовности по этапам')
+    ap.add_argument('--headless', action='store_true', help='без окна: восприятие и раздача состояния (service.py)')
+    ap.add_argument('--listen', default=None, help='host:port или unix:/путь для подписчиков (включает service)')
     args = ap.parse_args()
+    startup.mark('imports')
 
     cfg = load_config(args.config)
     if args.source:
@@ -34,15 +60,45 @@ def main():
         cfg['url'] = args.url
     if args.window_title:
         cfg.setdefault('window', {})['title'] = args.window_title
+    if args.replay:
+        cfg['source'] = 'replay'
+        cfg.setdefault('replay', {})['path'] = args.replay
     if args.debug:
         cfg.setdefault('ui', {})['show_debug'] = True
+    pcfg = cfg.setdefault('pipeline', {}) or {}
+    if args.pipeline:
+        pcfg['enabled'] = True
+    if args.workers is not None:
+        pcfg['workers'] = args.workers
+    startup.mark('config')
+    metrics.configure(cfg)
+    # OCR/модели/шаблоны грузятся в фоне, пока открывается окно и идут первые кадры
+    startup.start(cfg)
+
+    if args.headless:
+        listen = args.listen or (cfg.get('service', {}) or {}).get('listen', DEFAULT_LISTEN)
+        server = make_server(cfg, listen)
+        try:
+            run_headless(cfg, server)
+        finally:
+            server.close()
+            metrics.close()
+        return
+    server = make_server(cfg, args.listen)
 
     # подготовим окно заранее — так оно появится гарантированно
     cv2.namedWindow('WoT Assistant', cv2.WINDOW_NORMAL)
-    cv2.resizeWindow('WoT Assistant', 960, 540)
+    win_w, win_h = (cfg.get('ui') or {}).get('display_size') or (960, 540)
+    cv2.resizeWindow('WoT Assistant', int(win_w), int(win_h))
+    startup.mark('window')
 
     src = make_source(cfg)
+    startup.mark('source')
     fps = FpsMeter()
+    latency = LatencyMeter()
+    pipe = None
+    if pcfg.get('enabled', False):
+        pipe = Pipeline(src, cfg, workers=pcfg.get('workers', 1), queue_size=pcfg.get('queue_size', 2)).start()
 
     print("[WoT Assistant] Запуск… Q — выход, D — отладка, R — датасет, V — запись MP4")
     debug = cfg.get('ui', {}).get('show_debug', False)
@@ -51,57 +107,95 @@ def main():
     every_n = int(rec_cfg.get('save_every_n_frames', 30))
     out_dir = rec_cfg.get('out_dir', 'dataset')
     frame_idx = 0
+    dataset = None
 
-    # Видео запись
+    # Видео запись (в фоне, см. recorder.py)
     vcfg = cfg.get('video', {}) or {}
     video_enabled = bool(vcfg.get('enabled', False))
-    video_path = vcfg.get('path', 'captures/wot_capture.mp4')
-    video_fourcc = vcfg.get('fourcc', 'mp4v')
-    video_fps = int(vcfg.get('fps', 60))
     record_overlay = bool(vcfg.get('record_overlay', False))
-    writer = None
-    wrote_size = None
+    recorder = None
+    profile = args.profile_startup
 
     try:
         while True:
-            ok, frame = src.read()
-            if not ok or frame is None:
-                print('[WoT Assistant] Нет кадра… (проверь окно игры/режим Borderless)')
-                time.sleep(0.05)
-                continue
-
-            state = analyze_frame(frame, cfg)
-            advice_txt = make_advice(state)
-
+            if pipe is not None:
+                item = pipe.get(timeout=0.05)
+                if item is None:
+                    if pipe.finished:
+                        print('[WoT Assistant] Запись закончилась')
+                        break
+                    if (cv2.waitKey(1) & 0xFF) in (ord('q'), ord('Q'), 27):
+                        break
+                    continue
+                _, captured_at, frame, state, advice_txt = item
+                state['dropped_frames'] = pipe.stats['dropped_stale']
+                if server is not None:
+                    server.publish(state, advice_txt)
+            else:
+                t0 = time.perf_counter()
+                ok, frame = src.read()
+                captured_at = metrics.record('capture', paced_start(src, t0))
+                if not ok or frame is None:
+                    if getattr(src, 'eof', False):
+                        print('[WoT Assistant] Запись закончилась')
+                        break
+                    print('[WoT Assistant] Нет кадра… (проверь окно игры/режим Borderless)')
+                    time.sleep(0.05)
+                    continue
+
+                t = time.perf_counter()
+                state = analyze_frame(frame, cfg)
+                t = metrics.record('analyze', t)
+                advice_txt = make_advice(state)
+                t = metrics.record('policy', t)
+                if server is not None:
+                    server.publish(state, advice_txt)
+                    metrics.record('publish', t)
+
+            # задержка «захват -> показ» измеряется после imshow и выводится со следующим кадром
+            state['latency_ms'] = latency.avg * 1000.0
+            t = time.perf_counter()
             shown = draw_overlay(frame, state, advice_txt, cfg, fps.tick())
+            t = metrics.record('overlay', t)
             cv2.imshow('WoT Assistant', shown)
-
-            # dataset (jpg)
+            t = metrics.record('imshow', t)
+            latency.add(t - captured_at)
+            metrics.add('latency', t - captured_at, t)
+            startup.mark('first frame')
+            if profile and not startup.loading():
+                print('\n'.join(startup.report()))
+                profile = False
+
+            # dataset: кадр копируется в очередь, JPEG кодируются пулом потоков в шарды
             frame_idx += 1
             if recording and frame_idx % every_n == 0:
-                import os
-                os.makedirs(out_dir, exist_ok=True)
-                ts = int(time.time() * 1000)
-                cv2.imwrite(f"{out_dir}/frame_{ts}.jpg", frame)
-                for name, roi in cfg['rois'].items():
-                    x, y, w, h = roi
-                    crop = frame[y:y + h, x:x + w].copy()
-                    cv2.imwrite(f"{out_dir}/frame_{ts}_{name}.jpg", crop)
-
-            # video (mp4)
-            if video_enabled:
-                cur = shown if record_overlay else frame
-                h, w = cur.shape[:2]
-                if (writer is None) or wrote_size != (w, h):
-                    import os
-                    os.makedirs(os.path.dirname(video_path), exist_ok=True) if os.path.dirname(video_path) else None
-                    fourcc = cv2.VideoWriter_fourcc(*video_fourcc)
-                    writer = cv2.VideoWriter(video_path, fourcc, video_fps, (w, h))
-                    wrote_size = (w, h)
-                    print(f"[video] запись -> {video_path} @ {video_fps}fps, size={w}x{h}, overlay={record_overlay}")
-                writer.write(cur)
+                if dataset is None:
+                    dataset = make_dataset_writer(cfg, out_dir)
+                t = time.perf_counter()
+                dataset.add(frame)
+                metrics.record('dataset_write', t)
 
+            # video (mp4): кадр копируется в очередь рекордера, кодирование в его потоке
+            if video_enabled:
+                if recorder is None:
+                    recorder = make_recorder(cfg)
+                t = time.perf_counter()
+                recorder.write(shown if record_overlay else frame, captured_at)
+                metrics.record('video_write', t)
+            elif recorder is not None:
+                _close_recorder(recorder)
+                recorder = None
+
+            recycle(src, frame)  # кадр больше не нужен — буфер обратно в пул источника
+
+            # в режиме capture.roi_only полный кадр нужен только для записи
+            if getattr(src, 'roi_grabber', None) is not None:
+                src.roi_grabber.need_full = bool(video_enabled or recording)
+
+            metrics.tick()
+            t = time.perf_counter()
             key = cv2.waitKey(1) & 0xFF
+            metrics.record('waitkey', t)
             if key in (ord('q'), ord('Q'), 27):
                 break
             elif key in (ord('d'), ord('D')):
@@ -110,14 +204,39 @@ def main():
             elif key in (ord('r'), ord('R')):
                 recording = not recording
                 print('[dataset]', 'REC ON' if recording else 'rec off')
+                if not recording and dataset is not None:
+                    _close_dataset(dataset)
+                    dataset = None
             elif key in (ord('v'), ord('V')):
                 video_enabled = not video_enabled
                 print('[video]', 'REC ON' if video_enabled else 'rec off')
 
     finally:
+        if profile:
+            print('\n'.join(startup.report()))
+        metrics.close()
+        if pipe is not None:
+            pipe.stop()
+            print(f"[pipeline] кадров: {pipe.stats['captured']}, обработано: {pipe.stats['processed']}, "
+                  f"выброшено устаревших: {pipe.stats['dropped_stale']}")
+        pacer = getattr(src, 'pacer', None)
+        if pacer is not None and pacer.stats['frames']:
+            st = pacer.stats
+            print(f"[capture] темп {pacer.fps:.1f} fps, опозданий: {st['late']}, "
+                  f"пересып ~{st['oversleep_ms']:.2f}ms на {st['waited']} ожиданий")
+        reader = getattr(src, 'reader', None)
+        if reader is not None and reader.stats['grabbed']:
+            st = reader.stats
+            print(f"[capture] поток: принято {st['grabbed']}, отдано {st['delivered']}, пропущено {st['skipped']}, "
+                  f"возраст кадра ~{st['age_ms']:.1f}ms, отставание {st['lag_ms'] or 0.0:.0f}ms, "
+                  f"переподключений: {st['reconnects']}")
         src.release()
-        if writer is not None:
-            writer.release()
+        if server is not None:
+            server.close()
+        if recorder is not None:
+            _close_recorder(recorder)
+        if dataset is not None:
+            _close_dataset(dataset)
         cv2.destroyAllWindows()
 
 
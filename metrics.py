@@ -0,0 +1,213 @@
+"""
+Замеры горячего пути: время каждого этапа (захват, кроп, детекторы, политика, оверлей, imshow,
+запись датасета и видео) в скользящих гистограммах с логарифмическими корзинами (~9% точности).
+Запись — пара арифметических операций и инкремент; p50/p95/p99/max считаются только в snapshot()
+по последним window_s..2*window_s секундам.
+
+    t = time.perf_counter()
+    ...
+    t = metrics.record('capture', t)   # длительность от t до сейчас; возвращает «сейчас»
+    metrics.add('minimap', dt)         # уже измеренная длительность
+
+Секция metrics конфига: dump_path (.jsonl или .csv) и dump_interval — периодический сброс сводки
+(tick() из главного цикла), trace_path — Chrome trace (chrome://tracing, Perfetto) с событиями
+всех потоков: видно, как этапы конвейера перекрываются.
+"""
+import csv
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+_BUCKETS_PER_OCTAVE = 8
+_MIN_S = 1e-6   # нижняя граница первой корзины, сек
+_N_BUCKETS = _BUCKETS_PER_OCTAVE * 24  # до ~16 с; длиннее — в последнюю корзину
+
+
+def _bucket_upper(i):
+    return _MIN_S * 2.0 ** ((i + 1) / _BUCKETS_PER_OCTAVE)
+
+
+class Histogram:
+    """Скользящая гистограмма: две половины окна, текущая и предыдущая."""
+    __slots__ = ('cur', 'prev', 'cur_max', 'prev_max', 'started')
+
+    def __init__(self, now):
+        self.cur = [0] * _N_BUCKETS
+        self.prev = [0] * _N_BUCKETS
+        self.cur_max = self.prev_max = 0.0
+        self.started = now
+
+    def add(self, seconds, now, window):
+        if now - self.started >= window:
+            self.prev, self.cur = self.cur, self.prev
+            self.cur[:] = [0] * _N_BUCKETS
+            self.prev_max, self.cur_max = self.cur_max, 0.0
+            self.started = now
+        i = int(math.log2(seconds / _MIN_S) * _BUCKETS_PER_OCTAVE) if seconds > _MIN_S else 0
+        self.cur[i if i < _N_BUCKETS else _N_BUCKETS - 1] += 1
+        if seconds > self.cur_max:
+            self.cur_max = seconds
+
+    def summary(self):
+        """{n, p50_ms, p95_ms, p99_ms, max_ms} или None, если замеров нет."""
+        counts = [a + b for a, b in zip(self.cur, self.prev)]
+        n = sum(counts)
+        if not n:
+            return None
+        out = {'n': n}
+        targets = [('p50_ms', 0.50), ('p95_ms', 0.95), ('p99_ms', 0.99)]
+        seen, k = 0, 0
+        for i, c in enumerate(counts):
+            seen += c
+            while k < len(targets) and seen >= targets[k][1] * n:
+                out[targets[k][0]] = _bucket_upper(i) * 1000.0
+                k += 1
+            if k == len(targets):
+                break
+        mx = max(self.cur_max, self.prev_max) * 1000.0
+        for key, _ in targets:
+            out[key] = min(out[key], mx)  # верхняя граница корзины не больше реального максимума
+        out['max_ms'] = mx
+        return out
+
+
+class Metrics:
+    def __init__(self, window_s=10.0, dump_path=None, dump_interval=10.0, trace_path=None,
+                 trace_max_events=200000):
+        self.window = float(window_s) / 2.0
+        self.dump_path = dump_path
+        self.dump_interval = float(dump_interval)
+        self.trace_path = trace_path
+        self._hist = {}
+        self._lock = threading.Lock()
+        self._trace = deque(maxlen=int(trace_max_events)) if trace_path else None
+        self._threads = {}
+        self._last_dump = time.monotonic()
+        self._snapshot = ({}, 0.0)
+
+    def add(self, name, seconds, end=None):
+        now = time.perf_counter() if end is None else end
+        with self._lock:
+            h = self._hist.get(name)
+            if h is None:
+                h = self._hist[name] = Histogram(now)
+            h.add(seconds, now, self.window)
+            if self._trace is not None:
+                tid = threading.get_ident()
+                if tid not in self._threads:
+                    self._threads[tid] = threading.current_thread().name
+                self._trace.append((name, tid, now - seconds, seconds))
+
+    def record(self, name, t0):
+        now = time.perf_counter()
+        self.add(name, now - t0, now)
+        return now
+
+    def snapshot(self, max_age=0.0):
+        """{этап: summary} по окну; max_age — отдать кэш, если он свежее (для оверлея)."""
+        cached, at = self._snapshot
+        now = time.monotonic()
+        if max_age and now - at < max_age:
+            return cached
+        with self._lock:
+            hist = list(self._hist.items())
+        snap = {}
+        for name, h in hist:
+            s = h.summary()
+            if s is not None:
+                snap[name] = s
+        self._snapshot = (snap, now)
+        return snap
+
+    def tick(self):
+        """Вызывать раз в кадр из главного цикла: по dump_interval дописывает сводку в dump_path."""
+        if not self.dump_path:
+            return
+        now = time.monotonic()
+        if now - self._last_dump < self.dump_interval:
+            return
+        self._last_dump = now
+        try:
+            self.dump(self.dump_path)
+        except OSError as e:
+            print(f'[metrics] не записать {self.dump_path}: {e}')
+            self.dump_path = None
+
+    def dump(self, path):
+        snap = self.snapshot()
+        ts = time.time()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if path.lower().endswith('.csv'):
+            new = not os.path.exists(path)
+            with open(path, 'a', newline='', encoding='utf-8') as f:
+                w = csv.writer(f)
+                if new:
+                    w.writerow(['ts', 'stage', 'n', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'])
+                for name, s in sorted(snap.items()):
+                    w.writerow([f'{ts:.3f}', name, s['n']] +
+                               [f"{s[k]:.3f}" for k in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms')])
+        else:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'ts': round(ts, 3), 'window_s': self.window * 2, 'stages': snap}) + '\n')
+
+    def write_trace(self, path=None):
+        """Chrome trace JSON: полные события (ph=X) с именами потоков. Возвращает путь или None."""
+        path = path or self.trace_path
+        if not path or self._trace is None:
+            return None
+        with self._lock:
+            events = list(self._trace)
+            threads = dict(self._threads)
+        pid = os.getpid()
+        out = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+               for tid, name in threads.items()]
+        out += [{'name': name, 'ph': 'X', 'pid': pid, 'tid': tid, 'ts': round(start * 1e6, 1),
+                 'dur': round(dur * 1e6, 1)} for name, tid, start, dur in events]
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': out, 'displayTimeUnit': 'ms'}, f)
+        print(f'[metrics] trace: {len(events)} событий -> {path}')
+        return path
+
+
+_metrics = Metrics()
+
+
+def configure(cfg):
+    """Пересоздать общий Metrics по секции metrics конфига (вызывать до начала замеров)."""
+    global _metrics
+    mcfg = cfg.get('metrics', {}) or {}
+    _metrics = Metrics(window_s=mcfg.get('window_s', 10.0), dump_path=mcfg.get('dump_path'),
+                       dump_interval=mcfg.get('dump_interval', 10.0), trace_path=mcfg.get('trace_path'),
+                       trace_max_events=mcfg.get('trace_max_events', 200000))
+    return _metrics
+
+
+def get_metrics():
+    return _metrics
+
+
+def add(name, seconds, end=None):
+    _metrics.add(name, seconds, end)
+
+
+def record(name, t0):
+    return _metrics.record(name, t0)
+
+
+def tick():
+    _metrics.tick()
+
+
+def close():
+    """Последняя сводка в dump_path и Chrome trace в trace_path (если заданы)."""
+    m = _metrics
+    if m.dump_path:
+        try:
+            m.dump(m.dump_path)
+        except OSError as e:
+            print(f'[metrics] не записать {m.dump_path}: {e}')
+    m.write_trace()
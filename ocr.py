@@ -0,0 +1,162 @@
+"""
+Фоновое OCR для ROI status (HP/скорость) — запасной путь, если digits.py не прочёл по глифам.
+EasyOCR работает в отдельном потоке и перечитывает кроп, только если он заметно изменился
+(сравнение уменьшенной 32x8 серой копии) и не чаще max_rate раз в секунду.
+analyze_frame получает последние известные значения и их возраст без ожидания OCR.
+warm() заранее импортирует easyocr и строит Reader в том же потоке (статус — в startup).
+"""
+import re
+import threading
+import time
+import cv2
+import numpy as np
+import startup
+
+_SIG_SIZE = (32, 8)  # (w, h) уменьшенной копии для сравнения
+
+
+def parse_status(txt):
+    """Грубый разбор чисел: первое — HP (a/b — ещё и max_hp), последнее — скорость."""
+    nums = re.findall(r"\d+", txt or '')
+    hp = int(nums[0]) if nums else None
+    speed = int(nums[-1]) if nums else None
+    frac = re.search(r"(\d+)\s*/\s*(\d+)", txt or '')
+    max_hp = int(frac.group(2)) if frac else None
+    return {'hp': hp, 'max_hp': max_hp, 'speed': speed, 'status_text': txt or ''}
+
+
+def crop_signature(gray):
+    """Уменьшенная копия серого кропа (float32) — сравнивать кропы «изменилось или нет»."""
+    return cv2.resize(gray, _SIG_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+class OcrWorker:
+    def __init__(self, languages=('en', 'ru'), max_rate=2.0, change_threshold=12.0, gpu=False):
+        self.languages = list(languages)
+        self.min_interval = 1.0 / max_rate if max_rate and max_rate > 0 else 0.0
+        self.change_threshold = float(change_threshold)
+        self.gpu = bool(gpu)
+        self.available = True  # станет False, если easyocr не установлен
+        self.reads = 0
+        self.unchanged = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._job = None
+        self._warm = False
+        self._busy = False
+        self._sig = None
+        self._last_start = 0.0
+        self._result = parse_status('')
+        self._result_ts = None
+        self._thread = threading.Thread(target=self._run, name='ocr', daemon=True)
+        self._thread.start()
+
+    def submit(self, status_bgr):
+        """Отдать кроп на распознавание. True — кроп принят в работу, False — пропущен."""
+        if not self.available:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if self._busy or self._job is not None or now - self._last_start < self.min_interval:
+                return False
+        gray = cv2.cvtColor(status_bgr, cv2.COLOR_BGR2GRAY)
+        sig = crop_signature(gray)
+        with self._lock:
+            # смена одной цифры меняет лишь пару ячеек сигнатуры, поэтому смотрим максимум, а не среднее
+            if self._sig is not None and float(np.max(np.abs(sig - self._sig))) < self.change_threshold:
+                self.unchanged += 1
+                return False
+            self._sig = sig
+            self._last_start = now
+            self._job = (now, gray)
+        self._wake.set()
+        return True
+
+    def warm(self):
+        """Загрузить Reader сейчас, не дожидаясь первого кропа."""
+        with self._lock:
+            self._warm = True
+        self._wake.set()
+
+    def _load(self):
+        """Reader или None (easyocr не установлен — worker выключается)."""
+        startup.set_status('easyocr', startup.LOADING)
+        easyocr = startup.optional_import('easyocr')
+        if easyocr is None:
+            self.available = False
+            startup.set_status('easyocr', startup.UNAVAILABLE)
+            return None
+        try:
+            reader = easyocr.Reader(self.languages, gpu=self.gpu)
+        except Exception as e:
+            print(f'[ocr] Reader не создан: {e}')
+            self.available = False
+            startup.set_status('easyocr', startup.FAILED)
+            return None
+        startup.set_status('easyocr', startup.READY)
+        return reader
+
+    def latest(self):
+        """Последние hp/speed/status_text и ocr_age — сколько секунд назад снят прочитанный кроп."""
+        with self._lock:
+            res = dict(self._result)
+            res['ocr_age'] = (time.monotonic() - self._result_ts) if self._result_ts is not None else None
+        return res
+
+    def _run(self):
+        reader = None
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self._closed:
+                return
+            with self._lock:
+                job, self._job = self._job, None
+                self._busy = job is not None or (reader is None and self._warm)
+            if reader is None and self._busy:
+                reader = self._load()
+                if reader is None:
+                    with self._lock:
+                        self._busy = False
+                    return
+            if job is None:
+                with self._lock:
+                    self._busy = False
+                continue
+            ts, gray = job
+            try:
+                txt = ' '.join(reader.readtext(gray, detail=0))
+            except Exception as e:
+                print(f'[ocr] ошибка распознавания: {e}')
+                txt = None
+            with self._lock:
+                if txt is not None:
+                    self._result = parse_status(txt)
+                    self._result_ts = ts
+                    self.reads += 1
+                self._busy = False
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=1.0)
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_ocr_worker(cfg):
+    """Общий OcrWorker по секции ocr конфига; None, если OCR выключен."""
+    global _worker
+    ocfg = cfg.get('ocr', {}) or {}
+    if not ocfg.get('enabled', True):
+        return None
+    with _worker_lock:
+        if _worker is None:
+            _worker = OcrWorker(languages=ocfg.get('languages', ['en', 'ru']),
+                                max_rate=ocfg.get('max_rate', 2.0),
+                                change_threshold=ocfg.get('change_threshold', 12.0),
+                                gpu=ocfg.get('gpu', False))
+        return _worker
@@ -0,0 +1,285 @@
+"""
+Несколько источников сразу: клиенты игры по PID, области экрана, записи, потоки — каждый в своём
+процессе со своим конфигом, ROI и состоянием детекторов (трекер, лог урона, OCR — синглтоны модуля,
+поэтому источники не делят процесс). Процессов не больше orchestrator.processes: лишние источники
+ждут в очереди (для пачки записей это и есть пул); живым источникам (pid:, screen:, URL) нужен
+свой процесс каждому, иначе run() отказывается запускаться. orchestrator.cpu_budget — сколько ядер всего
+отдаём восприятию; каждый процесс получает свою долю и, если съел больше, досыпает (CpuBudget).
+
+    python orchestrator.py --config config.yaml rec1.mp4 rec2.mp4 rec3.mp4 --processes 2
+    python orchestrator.py --config config.yaml pid:9404 pid:9410 --cpu-budget 1.5
+    python orchestrator.py --config config.yaml          # список из orchestrator.sources
+
+Спек источника — строка (pid:N, screen:x,y,w,h, rtmp://… / http…, иначе путь к записи) или словарь:
+name, config (свой YAML вместо общего), max_frames, остальные ключи накладываются на конфиг
+(rois, detectors, service: {enabled: true, listen: …} — свой порт подписчиков и т.д.).
+По ходу и в конце печатается таблица: кадры, fps, задержка кадра p50/p95/p99, CPU и время сна.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import queue
+import sys
+import time
+import yaml
+
+REPORT_INTERVAL = 2.0  # сек между строками прогресса
+BUDGET_WINDOW = 5.0    # сек: недоиспользованная доля CPU дальше не копится
+
+
+def _merged(base, over):
+    """Глубокое слияние словарей конфига: over поверх base (base не меняется)."""
+    out = dict(base)
+    for k, v in over.items():
+        if isinstance(v, dict) and isinstance(out.get(k), dict):
+            out[k] = _merged(out[k], v)
+        else:
+            out[k] = v
+    return out
+
+
+def parse_spec(spec, index=0):
+    """Строка или словарь -> словарь-спек с name."""
+    if isinstance(spec, dict):
+        spec = dict(spec)
+    elif spec.startswith('pid:'):
+        pid = int(spec[4:])
+        spec = {'name': f'pid{pid}', 'source': 'window', 'window': {'match_by': 'pid', 'pid': pid}}
+    elif spec.startswith('screen:'):
+        region = [int(v) for v in spec[7:].split(',')]
+        if len(region) != 4:
+            raise ValueError(f'screen:x,y,w,h, а не {spec!r}')
+        spec = {'name': f'screen{index}', 'source': 'screen', 'screen_region': region}
+    elif spec.startswith(('rtmp://', 'rtsp://', 'http://', 'https://')):
+        spec = {'name': f'url{index}', 'source': 'hls' if '.m3u8' in spec else 'rtmp', 'url': spec}
+    else:
+        name = os.path.splitext(os.path.basename(os.path.normpath(spec)))[0] or f'replay{index}'
+        spec = {'name': name, 'source': 'replay', 'replay': {'path': spec}}
+    spec.setdefault('name', f'source{index}')
+    return spec
+
+
+def source_config(base_cfg, spec):
+    """Конфиг источника: свой файл или общий, поверх — ключи спека. Имя подставляется в пути метрик."""
+    cfg = base_cfg
+    if spec.get('config'):
+        with open(spec['config'], 'r', encoding='utf-8') as f:
+            cfg = yaml.safe_load(f)
+    over = {k: v for k, v in spec.items() if k not in ('name', 'config', 'max_frames')}
+    cfg = _merged(cfg, over)
+    mcfg = dict(cfg.get('metrics', {}) or {})
+    for key in ('dump_path', 'trace_path'):
+        if mcfg.get(key):
+            root, ext = os.path.splitext(mcfg[key])
+            mcfg[key] = f"{root}.{spec['name']}{ext}"  # у каждого процесса свой файл
+    cfg['metrics'] = mcfg
+    return cfg
+
+
+class CpuBudget:
+    """
+    Доля CPU процесса (в ядрах): если процесс за окно потратил больше share * прошедшее время,
+    spend() спит разницу. process_time считает все потоки процесса (OCR, запись и т.п.).
+    """
+    def __init__(self, share):
+        self.share = float(share)
+        self.throttled = 0.0
+        self._t0 = time.monotonic()
+        self._c0 = time.process_time()
+
+    def spend(self):
+        if self.share <= 0:
+            return
+        now = time.monotonic()
+        ahead = (time.process_time() - self._c0) / self.share - (now - self._t0)
+        if ahead > 0:
+            time.sleep(ahead)
+            self.throttled += ahead
+            now += ahead
+        if now - self._t0 >= BUDGET_WINDOW:
+            self._t0, self._c0 = now, time.process_time()
+
+
+def _source_main(cfg, spec, share, reports):
+    """Процесс одного источника: захват -> analyze_frame -> make_advice (-> publish), отчёты в reports."""
+    import metrics
+    import startup
+    from capture import make_source, recycle, paced_start
+    from perception import analyze_frame
+    from policy import make_advice
+    from service import make_server
+
+    name = spec['name']
+    max_frames = int(spec.get('max_frames', 0) or 0)
+    metrics.configure(cfg)
+    startup.start(cfg)
+    budget = CpuBudget(share)
+    n, error = 0, None
+    t_start = time.monotonic()
+    c_start = time.process_time()
+
+    def stats(status):
+        wall = time.monotonic() - t_start
+        snap = metrics.get_metrics().snapshot()
+        return {'status': status, 'frames': n, 'wall_s': wall, 'fps': n / wall if wall > 0 else 0.0,
+                'cpu_s': time.process_time() - c_start, 'throttled_s': budget.throttled,
+                'frame': snap.get('frame'), 'capture': snap.get('capture')}
+
+    src = server = None
+    try:
+        src = make_source(cfg)
+        server = make_server(cfg)
+        last_report = time.monotonic()
+        while not max_frames or n < max_frames:
+            t0 = time.perf_counter()
+            ok, frame = src.read()
+            t0 = paced_start(src, t0)
+            metrics.record('capture', t0)
+            if not ok or frame is None:
+                if getattr(src, 'eof', False):
+                    break
+                time.sleep(0.05)
+                continue
+            state = analyze_frame(frame, cfg)
+            advice = make_advice(state)
+            metrics.record('frame', t0)  # от начала захвата до совета
+            if server is not None:
+                server.publish(state, advice)
+            recycle(src, frame)
+            metrics.tick()
+            n += 1
+            budget.spend()
+            if time.monotonic() - last_report >= REPORT_INTERVAL:
+                last_report = time.monotonic()
+                reports.put((name, stats('running')))
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        error = f'{e.__class__.__name__}: {e}'
+    finally:
+        if src is not None:
+            src.release()
+        if server is not None:
+            server.close()
+        metrics.close()
+    result = stats('error' if error else 'done')
+    result['error'] = error
+    reports.put((name, result))
+
+
+def _fmt(ms):
+    return f'{ms:8.2f}' if ms is not None else f"{'-':>8}"
+
+
+def print_table(results):
+    print(f"{'source':<16}{'status':>8}{'frames':>8}{'fps':>8}{'p50':>8}{'p95':>8}{'p99':>8}"
+          f"{'cpu s':>8}{'sleep s':>9}  (задержка кадра, ms)")
+    for name, r in results.items():
+        f = r.get('frame') or {}
+        print(f"{name:<16}{r['status']:>8}{r['frames']:>8}{r['fps']:>8.1f}{_fmt(f.get('p50_ms'))}"
+              f"{_fmt(f.get('p95_ms'))}{_fmt(f.get('p99_ms'))}{r['cpu_s']:>8.1f}{r['throttled_s']:>9.1f}")
+        if r.get('error'):
+            print(f'  [{name}] ошибка: {r["error"]}')
+
+
+def run(cfg, specs, processes=0, cpu_budget=0.0, report=True):
+    """Прогнать источники в пуле процессов; {имя: итоговая статистика}."""
+    specs = [parse_spec(s, i) for i, s in enumerate(specs)]
+    names = [s['name'] for s in specs]
+    if len(set(names)) != len(names):
+        raise ValueError(f'имена источников повторяются: {names}')
+    processes = int(processes) or (os.cpu_count() or 1)
+    slots = min(processes, len(specs))
+    live = [s['name'] for s in specs if s.get('source', cfg.get('source')) != 'replay']
+    # живой источник не кончается и слот не освобождает: лишние ждали бы вечно, а записям нужен
+    # хотя бы один слот сверх живых
+    need = len(live) + (1 if len(live) < len(specs) else 0)
+    if need > processes:
+        raise ValueError(f"живых источников {len(live)} ({', '.join(live)}), записей {len(specs) - len(live)}: "
+                         f"нужно процессов не меньше {need}, задано {processes}; в очереди могут ждать только записи")
+    share = float(cpu_budget) / slots if cpu_budget else 0.0
+    print(f"[orchestrator] источников: {len(specs)}, процессов: {slots}, "
+          f"CPU: {f'{share:.2f} ядра на процесс' if share else 'без ограничения'}")
+
+    ctx = mp.get_context('spawn')
+    reports = ctx.Queue()
+    pending = list(specs)
+    running = {}
+    results = {s['name']: {'status': 'queued', 'frames': 0, 'fps': 0.0, 'cpu_s': 0.0, 'throttled_s': 0.0}
+               for s in specs}
+    last_print = time.monotonic()
+    try:
+        while pending or running:
+            while pending and len(running) < slots:
+                spec = pending.pop(0)
+                p = ctx.Process(target=_source_main, args=(source_config(cfg, spec), spec, share, reports),
+                                name=f"source-{spec['name']}", daemon=True)
+                p.start()
+                running[spec['name']] = p
+            try:
+                name, st = reports.get(timeout=0.2)
+                results[name] = st
+            except queue.Empty:
+                pass
+            for name, p in list(running.items()):
+                if results[name]['status'] in ('done', 'error') or not p.is_alive():
+                    p.join(timeout=5.0)
+                    if results[name]['status'] not in ('done', 'error'):
+                        results[name].update(status='error', error=f'процесс завершился с кодом {p.exitcode}')
+                    del running[name]
+            if report and time.monotonic() - last_print >= REPORT_INTERVAL and running:
+                last_print = time.monotonic()
+                print_table(results)
+    except KeyboardInterrupt:
+        # процессы источников получили тот же Ctrl+C и досылают итоги
+        deadline = time.monotonic() + 5.0
+        while running and time.monotonic() < deadline:
+            try:
+                name, st = reports.get(timeout=0.2)
+                results[name] = st
+                if st['status'] in ('done', 'error') and name in running:
+                    running.pop(name).join(timeout=1.0)
+            except queue.Empty:
+                pass
+        for p in running.values():
+            p.terminate()
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--config', default='config.yaml')
+    ap.add_argument('sources', nargs='*', help='pid:N, screen:x,y,w,h, URL или путь к записи (иначе orchestrator.sources)')
+    ap.add_argument('--processes', type=int, default=None, help='процессов одновременно (0 — по числу ядер)')
+    ap.add_argument('--cpu-budget', type=float, default=None, help='ядер на все источники (0 — без ограничения)')
+    ap.add_argument('--frames', type=int, default=0, help='не больше кадров на источник')
+    ap.add_argument('--out', default=None, help='итоговая статистика по источникам в JSON')
+    args = ap.parse_args()
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        cfg = yaml.safe_load(f)
+    ocfg = cfg.get('orchestrator', {}) or {}
+    specs = args.sources or ocfg.get('sources') or []
+    if not specs:
+        ap.error('нет источников: перечислите их в командной строке или в orchestrator.sources')
+    if args.frames:
+        specs = [dict(parse_spec(s, i), max_frames=args.frames) for i, s in enumerate(specs)]
+    processes = args.processes if args.processes is not None else ocfg.get('processes', 0)
+    cpu_budget = args.cpu_budget if args.cpu_budget is not None else ocfg.get('cpu_budget', 0.0)
+
+    t0 = time.monotonic()
+    try:
+        results = run(cfg, specs, processes=processes, cpu_budget=cpu_budget)
+    except ValueError as e:
+        ap.error(str(e))
+    print(f'[orchestrator] готово за {time.monotonic() - t0:.1f}s')
+    print_table(results)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return 1 if any(r['status'] == 'error' for r in results.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
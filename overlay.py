@@ -1,39 +1,161 @@
+"""
+Оверлей советов поверх кадра.
+Затемняется только прямоугольник подложки, текст рисуется в кэшированный слой, который
+перерисовывается лишь при смене советов или «корзины» FPS/задержки (целые значения).
+ui.display_size: [w, h] — сначала уменьшить кадр до размера окна, потом рисовать:
+стоимость оверлея перестаёт зависеть от разрешения игры.
+Пока детекторы прогреваются (startup.py), под заголовком серым — что ещё грузится.
+В режиме отладки справа вверху — таблица p50/p95/p99/max по этапам (metrics.py), раз в STATS_PERIOD.
+"""
 import cv2
+import numpy as np
+import metrics
+from layout import get_layout
+
+ALPHA = 0.45  # непрозрачность подложки
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+STATS_PERIOD = 0.5  # как часто обновлять таблицу этапов, сек
+STATS_COLS = (0, 130, 185, 240, 295)  # x колонок: этап, p50, p95, p99, max
+STATS_ORDER = ('capture', 'crop', 'hud_icons', 'hud_model', 'minimap', 'status_ocr', 'damage_log', 'analyze',
+               'policy', 'overlay', 'imshow', 'waitkey', 'dataset_write', 'dataset_encode', 'video_write',
+               'video_encode', 'latency')
+
+
+class OverlayRenderer:
+    """Кэш текстового слоя и выходного буфера. Результат render() валиден до следующего вызова."""
+    def __init__(self):
+        self._key = None
+        self._layer = None  # (текст BGR, 255 - покрытие текста, ширина и высота подложки)
+        self._out = None
+        self._stats_key = None
+        self._stats_layer = None
+
+    def _text_layer(self, header, note, advice_lines, w, h):
+        key = (header, note, tuple(advice_lines), w, h)
+        if key == self._key:
+            return self._layer
+        lines = [(header, 0.8, (255, 255, 255))]
+        if note:
+            lines.append((note, 0.6, (170, 170, 170)))
+        # слой от точки (10, 10): подложка плюс строки, которые могут выйти за её край
+        lines += [(s, 0.7, (0, 255, 255)) for s in advice_lines]
+        box_w = min(600, int(w * 0.5))
+        box_h = 28 * (len(lines) + 1)
+        text_w = max(cv2.getTextSize(s, FONT, scale, 2)[0][0] for s, scale, _ in lines)
+        lw = max(1, min(w - 10, max(box_w + 1, 10 + text_w + 2)))
+        lh = max(1, min(h - 10, max(box_h + 1, 30 + 28 * (len(lines) - 1) + 10)))
+        # text — цвет, уже умноженный на покрытие (буквы сглажены), keep — 255 минус покрытие
+        text = np.zeros((lh, lw, 3), np.uint8)
+        cover = np.zeros((lh, lw), np.uint8)
+        y = 30
+        for i, (s, scale, colour) in enumerate(lines):
+            cv2.putText(text, s, (10, y), FONT, scale, colour, 2)
+            cv2.putText(cover, s, (10, y), FONT, scale, 255, 2)
+            y += 30 if i == 0 else 28
+        keep = cv2.cvtColor(255 - cover, cv2.COLOR_GRAY2BGR)
+        self._key = key
+        self._layer = (text, keep, min(box_w + 1, lw), min(box_h + 1, lh))
+        return self._layer
+
+    def _stats(self, w, h):
+        """Слой таблицы этапов (text, keep) по кэшированному снимку metrics."""
+        snap = metrics.get_metrics().snapshot(max_age=STATS_PERIOD)
+        names = [n for n in STATS_ORDER if n in snap] + sorted(n for n in snap if n not in STATS_ORDER)
+        rows = [('stage', 'p50', 'p95', 'p99', 'max ms')]
+        rows += [(n,) + tuple(f"{snap[n][k]:.1f}" for k in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms')) for n in names]
+        key = (tuple(rows), w, h)
+        if key == self._stats_key:
+            return self._stats_layer
+        lw = min(w - 20, STATS_COLS[-1] + 70)
+        lh = min(h - 20, 18 * len(rows) + 8)
+        if lw <= 0 or lh <= 0:
+            return None
+        text = np.zeros((lh, lw, 3), np.uint8)
+        cover = np.zeros((lh, lw), np.uint8)
+        for i, row in enumerate(rows):
+            colour = (255, 255, 255) if i == 0 else (200, 255, 200)
+            for x, cell in zip(STATS_COLS, row):
+                cv2.putText(text, cell, (x + 6, 18 * i + 16), FONT, 0.45, colour, 1)
+                cv2.putText(cover, cell, (x + 6, 18 * i + 16), FONT, 0.45, 255, 1)
+        self._stats_key = key
+        self._stats_layer = (text, cv2.cvtColor(255 - cover, cv2.COLOR_GRAY2BGR))
+        return self._stats_layer
+
+    def _frame(self, frame, cfg):
+        """Копия кадра в переиспользуемый буфер (или уменьшенная до ui.display_size) и масштаб."""
+        h, w = frame.shape[:2]
+        size = (cfg.get('ui') or {}).get('display_size')
+        if size and (size[0] < w or size[1] < h):
+            s = min(size[0] / w, size[1] / h)
+            dw, dh = max(1, int(round(w * s))), max(1, int(round(h * s)))
+            shape = (dh, dw, 3)
+        else:
+            s, shape = 1.0, frame.shape
+        if self._out is None or self._out.shape != shape:
+            self._out = np.empty(shape, np.uint8)
+        if s == 1.0:
+            np.copyto(self._out, frame)
+        else:
+            cv2.resize(frame, (shape[1], shape[0]), dst=self._out, interpolation=cv2.INTER_LINEAR)
+        return self._out, s
+
+    def render(self, frame, state, advice_lines, cfg, fps):
+        out, s = self._frame(frame, cfg)
+        h, w = out.shape[:2]
+
+        header = f"WoT Assistant  |  FPS:{fps:.0f}"
+        if state.get('latency_ms'):
+            header += f"  |  lat:{state['latency_ms']:.0f}ms"
+        ready = state.get('ready') or {}
+        loading = [n for n, st in ready.items() if st == 'loading']
+        note = ('загрузка: ' + ', '.join(loading)) if loading else ''
+        if cfg['ui'].get('show_debug', False):
+            off = [n for n, st in ready.items() if st == 'unavailable']
+            if off:
+                note = (note + '  |  ' if note else '') + 'выкл: ' + ', '.join(off)
+        text, keep, bw, bh = self._text_layer(header, note, advice_lines, w, h)
+
+        # Полупрозрачная подложка: чёрный с ALPHA == кадр * (1 - ALPHA), только в прямоугольнике
+        box = out[10:10 + bh, 10:10 + bw]
+        cv2.convertScaleAbs(box, dst=box, alpha=1.0 - ALPHA)
+        roi = out[10:10 + text.shape[0], 10:10 + text.shape[1]]
+        cv2.multiply(roi, keep, dst=roi, scale=1.0 / 255)
+        cv2.add(roi, text, dst=roi)
+
+        # Отладка миникарты: точки врагов/союзников
+        if cfg['ui'].get('show_debug', False):
+            def p(px, py):
+                return int(round(px * s)), int(round(py * s))
+            layout = get_layout(cfg, frame.shape)
+            x, y0, w0, h0 = layout.px['minimap']
+            cv2.rectangle(out, p(x, y0), p(x + w0, y0 + h0), (255, 255, 255), 1)
+            # точки миникарты — в рабочем разрешении кропа, обратно в кадр через layout
+            for (cx, cy) in state.get('enemy_points', []):
+                cv2.circle(out, p(*layout.to_frame('minimap', cx, cy)), 3, (0, 0, 255), -1)
+            for (cx, cy) in state.get('ally_points', []):
+                cv2.circle(out, p(*layout.to_frame('minimap', cx, cy)), 3, (0, 255, 0), -1)
+            if 'dropped_frames' in state:
+                cv2.putText(out, f"dropped: {state['dropped_frames']}", p(x, y0 - 8),
+                            FONT, 0.5, (255, 255, 255), 1)
+            # статус/кроссхэйр рамки
+            for name in ('status', 'damage_log', 'crosshair'):
+                rx, ry, rw, rh = layout.px[name]
+                cv2.rectangle(out, p(rx, ry), p(rx + rw, ry + rh), (255, 255, 0), 1)
+            layer = self._stats(w, h)
+            if layer is not None:
+                text, keep = layer
+                th, tw = text.shape[:2]
+                roi = out[10:10 + th, w - 10 - tw:w - 10]
+                cv2.convertScaleAbs(roi, dst=roi, alpha=1.0 - ALPHA)
+                cv2.multiply(roi, keep, dst=roi, scale=1.0 / 255)
+                cv2.add(roi, text, dst=roi)
+
+        return out
+
+
+_renderer = OverlayRenderer()
 
 
 def draw_overlay(frame, state, advice_lines, cfg, fps):
-    out = frame.copy()
-    h, w = out.shape[:2]
-
-    # Полупрозрачная подложка под советы
-    box_w = min(600, int(w*0.5))
-    box_h = 28 * (len(advice_lines) + 2)
-    overlay = out.copy()
-    cv2.rectangle(overlay, (10, 10), (10+box_w, 10+box_h), (0, 0, 0), -1)
-    alpha = 0.45
-    cv2.addWeighted(overlay, alpha, out, 1-alpha, 0, out)
-
-    y = 40
-    cv2.putText(out, f"WoT Assistant  |  FPS:{fps:.1f}", (20, y), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255,255,255), 2)
-    y += 30
-
-    # Советы
-    for line in advice_lines:
-        cv2.putText(out, line, (20, y), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0,255,255), 2)
-        y += 28
-
-    # Отладка миникарты: точки врагов/союзников
-    if cfg['ui'].get('show_debug', False):
-        # рисуем точки в ROI миникарты
-        x, y0, w0, h0 = cfg['rois']['minimap']
-        cv2.rectangle(out, (x, y0), (x+w0, y0+h0), (255,255,255), 1)
-        for (cx, cy) in state.get('enemy_points', []):
-            cv2.circle(out, (x+cx, y0+cy), 3, (0,0,255), -1)
-        for (cx, cy) in state.get('ally_points', []):
-            cv2.circle(out, (x+cx, y0+cy), 3, (0,255,0), -1)
-        # статус/кроссхэйр рамки
-        for name in ('status','damage_log','crosshair'):
-            rx, ry, rw, rh = cfg['rois'][name]
-            cv2.rectangle(out, (rx, ry), (rx+rw, ry+rh), (255,255,0), 1)
-
-    return out
+    """Кадр с советами; возвращает буфер, который перезаписывается следующим вызовом."""
+    return _renderer.render(frame, state, advice_lines, cfg, fps)
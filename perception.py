@@ -1,6 +1,8 @@
 import cv2
 import numpy as np
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from colorseg import get_hsv_classifier
+import detectors  # модулем: detectors сам импортирует perception
 
 
 def crop(frame, roi):
@@ -8,141 +10,106 @@ def crop(frame, roi):
     return frame[y:y+h, x:x+w]
 
 
-def detect_minimap(minimap_bgr, hsv_cfg):
-    hsv = cv2.cvtColor(minimap_bgr, cv2.COLOR_BGR2HSV)
-    enemy_low = np.array(hsv_cfg['enemy_low'])
-    enemy_high = np.array(hsv_cfg['enemy_high'])
-    ally_low = np.array(hsv_cfg['ally_low'])
-    ally_high = np.array(hsv_cfg['ally_high'])
-
-    enemy_mask = cv2.inRange(hsv, enemy_low, enemy_high)
-    ally_mask = cv2.inRange(hsv, ally_low, ally_high)
-
-    # морфология для удаления шума
-    k = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3,3))
-    enemy_mask = cv2.morphologyEx(enemy_mask, cv2.MORPH_OPEN, k)
-    ally_mask = cv2.morphologyEx(ally_mask, cv2.MORPH_OPEN, k)
-
-    # контуры как точки
-    def centers(mask):
-        cnts, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        pts = []
-        for c in cnts:
-            if cv2.contourArea(c) < 4:
-                continue
-            M = cv2.moments(c)
-            if M['m00']:
-                cx = int(M['m10']/M['m00'])
-                cy = int(M['m01']/M['m00'])
-                pts.append((cx, cy))
-        return pts
-
-    enemies = centers(enemy_mask)
-    allies = centers(ally_mask)
-
-    # простая кластеризация
-    def cluster(points, eps=18):
-        clusters = []
-        used = set()
-        for i, p in enumerate(points):
-            if i in used:
-                continue
-            group = [p]
-            used.add(i)
-            for j, q in enumerate(points):
-                if j in used:
-                    continue
-                if (p[0]-q[0])**2 + (p[1]-q[1])**2 <= eps*eps:
-                    used.add(j)
-                    group.append(q)
-            clusters.append(group)
-        centers_list = [(
-            int(sum(x for x,_ in g)/len(g)),
-            int(sum(y for _,y in g)/len(g))
-        ) for g in clusters]
-        sizes = [len(g) for g in clusters]
-        return centers_list, sizes
-
-    enemy_centers, enemy_sizes = cluster(enemies)
-
-    return {
-        'enemy_points': enemies,
-        'ally_points': allies,
-        'enemy_clusters': enemy_centers,
-        'enemy_cluster_sizes': enemy_sizes
-    }
-
-
-def detect_sixth_sense(crosshair_bgr, template_path: str):
-    if not template_path:
-        return False, 0.0
-    try:
-        tpl = cv2.imread(template_path, cv2.IMREAD_UNCHANGED)
-        if tpl is None:
-            return False, 0.0
-        img = cv2.cvtColor(crosshair_bgr, cv2.COLOR_BGR2GRAY)
-        # если шаблон с альфой — возьмём серый
-        if tpl.shape[2] == 4:
-            tpl = cv2.cvtColor(tpl, cv2.COLOR_BGRA2GRAY)
-        else:
-            tpl = cv2.cvtColor(tpl, cv2.COLOR_BGR2GRAY)
-        res = cv2.matchTemplate(img, tpl, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, _ = cv2.minMaxLoc(res)
-        return max_val > 0.6, float(max_val)
-    except Exception:
-        return False, 0.0
-
-
-def analyze_frame(frame_bgr, cfg) -> Dict[str, Any]:
-    rois = cfg['rois']
-    state = {}
-
-    # Миникарта
-    mini = crop(frame_bgr, rois['minimap'])
-    mini_info = detect_minimap(mini, cfg['minimap_hsv'])
-    state.update(mini_info)
-
-    # Лампочка
-    cross = crop(frame_bgr, rois['crosshair'])
-    on, score = detect_sixth_sense(cross, cfg['assets'].get('sixth_sense_template', ''))
-    state['sixth_sense'] = on
-    state['sixth_sense_score'] = score
-
-    # OCR (опционально)
-    try:
-        import easyocr
-        reader = analyze_frame._reader  # кэш
-    except Exception:
-        reader = None
-    if reader is None:
-        try:
-            import easyocr
-            analyze_frame._reader = easyocr.Reader(['en', 'ru'], gpu=False)
-            reader = analyze_frame._reader
-        except Exception:
-            reader = None
-    state['hp'] = None
-    state['speed'] = None
-    if reader is not None:
-        status = crop(frame_bgr, rois['status'])
-        gray = cv2.cvtColor(status, cv2.COLOR_BGR2GRAY)
-        txt = ' '.join(reader.readtext(gray, detail=0))
-        # грубый парсинг чисел
-        import re
-        nums = re.findall(r"\d+", txt)
-        if nums:
-            # эвристика: предполагаем первое — HP, последнее — скорость
-            state['hp'] = int(nums[0])
-            try:
-                state['speed'] = int(nums[-1])
-            except Exception:
-                state['speed'] = None
-        state['status_text'] = txt
-    else:
-        state['status_text'] = ''
+_OPEN_KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+MIN_MARKER_AREA = 4       # минимальная площадь контура маркера (как contourArea в прежней версии)
+CLUSTER_RADIUS = 0.05     # радиус кластера как доля стороны миникарты (18px при 360px)
+
+
+def marker_centers(mask, min_area=MIN_MARKER_AREA):
+    """
+    Центры маркеров: контуры из findContours, а площадь и центр масс всех контуров сразу
+    считаются векторно по формуле площади многоугольника (те же моменты, что cv2.moments).
+    """
+    cnts, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not cnts:
+        return []
+    lens = np.fromiter((len(c) for c in cnts), dtype=np.int64, count=len(cnts))
+    starts = np.zeros(len(cnts), dtype=np.int64)
+    np.cumsum(lens[:-1], out=starts[1:])
+    pts = np.concatenate(cnts).reshape(-1, 2).astype(np.float64)
+    nxt = np.arange(1, len(pts) + 1)
+    nxt[starts + lens - 1] = starts  # замыкаем каждый контур на его первую точку
+    x, y = pts[:, 0], pts[:, 1]
+    xn, yn = x[nxt], y[nxt]
+    cross = x * yn - xn * y
+    m00 = np.add.reduceat(cross, starts) / 2.0
+    m10 = np.add.reduceat((x + xn) * cross, starts) / 6.0
+    m01 = np.add.reduceat((y + yn) * cross, starts) / 6.0
+    keep = (np.abs(m00) >= min_area) & (m00 != 0)
+    cx = (m10[keep] / m00[keep]).astype(np.int32)
+    cy = (m01[keep] / m00[keep]).astype(np.int32)
+    return list(zip(cx.tolist(), cy.tolist()))
+
+
+def cluster_points(points, eps):
+    """
+    Жадная кластеризация как раньше (точка-затравка забирает всех свободных соседей в радиусе eps),
+    но расстояния считаются одной матрицей NumPy, а цикл идёт только по кластерам.
+    """
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = len(pts)
+    if not n:
+        return [], []
+    d2 = ((pts[:, None, :] - pts[None, :, :]) ** 2).sum(axis=2)
+    near = d2 <= eps * eps
+    labels = np.full(n, -1, dtype=np.int64)
+    k = 0
+    for i in range(n):
+        if labels[i] >= 0:
+            continue
+        labels[near[i] & (labels < 0)] = k
+        k += 1
+    sizes = np.bincount(labels, minlength=k)
+    cx = (np.bincount(labels, weights=pts[:, 0], minlength=k) / sizes).astype(np.int64)
+    cy = (np.bincount(labels, weights=pts[:, 1], minlength=k) / sizes).astype(np.int64)
+    return list(zip(cx.tolist(), cy.tolist())), sizes.tolist()
+
+
+def detect_minimap(minimap_bgr, hsv_cfg, cluster_radius=CLUSTER_RADIUS, min_area=MIN_MARKER_AREA, cluster=True):
+    """
+    Маркеры всех классов из minimap_hsv (enemy, ally и любые добавленные: platoon, arty, ...):
+    <class>_points, <class>_clusters, <class>_cluster_sizes. cluster=False — только <class>_points
+    (трекер кластеризует свои треки сам).
+    """
+    clf = get_hsv_classifier(hsv_cfg)
+    bits = clf.classify(minimap_bgr)  # один проход по кропу на все классы
+    # радиус кластера масштабируется с размером миникарты
+    eps = cluster_radius * min(minimap_bgr.shape[:2])
+
+    out = {}
+    for name in clf.classes:
+        # морфология для удаления шума
+        mask = cv2.morphologyEx(clf.mask(bits, name), cv2.MORPH_OPEN, _OPEN_KERNEL)
+        points = marker_centers(mask, min_area)
+        out[f'{name}_points'] = points
+        if not cluster:
+            continue
+        centers_list, sizes = cluster_points(points, eps)
+        out[f'{name}_clusters'] = centers_list
+        out[f'{name}_cluster_sizes'] = sizes
+    return out
+
+
+def detect_hud_icons(crosshair_bgr, registry):
+    """Все иконки реестра за один проход по ROI прицела: {name: (found, score, scale)}."""
+    return registry.match(crosshair_bgr)
+
+
+def detect_sixth_sense(crosshair_bgr, registry):
+    found, score, _ = registry.match(crosshair_bgr, names=['sixth_sense']).get('sixth_sense', (False, 0.0, None))
+    return found, score
+
+
+def analyze_frame(frame_bgr, cfg, timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """
+    Запускает детекторы, чья очередь подошла (detectors.get_scheduler), остальные поля — последние
+    известные значения. timings — необязательный словарь секунд по детекторам (для bench.py).
+    """
+    state = detectors.get_scheduler(cfg).run(frame_bgr, cfg, timings)
 
     # Производные
-    state['enemy_count'] = len(state['enemy_points'])
-    state['ally_count'] = len(state['ally_points'])
-    state['enemy_max_cluster'] = max(state['enemy_cluster_sizes'], default=0)
+    state['enemy_count'] = len(state.get('enemy_points', ()))
+    state['ally_count'] = len(state.get('ally_points', ()))
+    state['enemy_max_cluster'] = max(state.get('enemy_cluster_sizes', ()), default=0)
+    state['ally_max_cluster'] = max(state.get('ally_cluster_sizes', ()), default=0)
     return state
@@ -0,0 +1,161 @@
+"""
+Конвейерный режим: захват в своём потоке, воркеры восприятия, рендер/вывод в главном потоке.
+Между захватом и восприятием — слот «последний кадр» (старые кадры выбрасываются и считаются),
+между восприятием и рендером — ограниченная очередь результатов.
+С capture.adaptive слот подсказывает темп источнику: выброшенный кадр — Pacer.slower(),
+воркер ждал кадр — Pacer.faster().
+"""
+import queue
+import threading
+import time
+import metrics
+from capture import recycle, paced_start
+from perception import analyze_frame
+from policy import make_advice
+
+
+class LatestSlot:
+    """
+    Хранит только самый свежий элемент. put() затирает непрочитанный и считает его как dropped;
+    on_drop(item) вызывается для выброшенного (например, вернуть кадр в пул).
+    on_starve() — get() пришлось ждать элемент (потребитель простаивает).
+    """
+    def __init__(self, on_drop=None, on_starve=None):
+        self._cond = threading.Condition()
+        self._item = None
+        self.dropped = 0
+        self.closed = False
+        self.on_drop = on_drop
+        self.on_starve = on_starve
+
+    def put(self, item):
+        with self._cond:
+            stale, self._item = self._item, item
+            if stale is not None:
+                self.dropped += 1
+            self._cond.notify()
+        if stale is not None and self.on_drop is not None:
+            self.on_drop(stale)
+
+    def get(self, timeout=None):
+        with self._cond:
+            waited = self._item is None and not self.closed
+            if waited:
+                self._cond.wait(timeout)
+            item, self._item = self._item, None
+        if waited and item is not None and self.on_starve is not None:
+            self.on_starve()
+        return item
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class Pipeline:
+    """
+    get() отдаёт (seq, capture_ts, frame, state, advice) в порядке захвата;
+    capture_ts — time.perf_counter() в момент получения кадра от источника.
+    Кадр, полученный из get(), принадлежит вызывающему: после вывода — recycle(src, frame).
+    """
+    def __init__(self, src, cfg, workers=1, queue_size=2):
+        self.src = src
+        self.cfg = cfg
+        pacer = getattr(src, 'pacer', None)
+
+        def dropped(item):
+            recycle(src, item[2])
+            if pacer is not None:
+                pacer.slower()
+        self.frames = LatestSlot(on_drop=dropped, on_starve=pacer.faster if pacer is not None else None)
+        self.results = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.workers = max(1, int(workers))
+        self.finished = False
+        self.stats = {'captured': 0, 'processed': 0, 'dropped_stale': 0, 'dropped_results': 0}
+        self._stop = threading.Event()
+        self._threads = []
+        self._last_seq = -1
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._threads.append(threading.Thread(target=self._capture_loop, name='capture', daemon=True))
+        for i in range(self.workers):
+            self._threads.append(threading.Thread(target=self._perception_loop, name=f'perception-{i}', daemon=True))
+        for t in self._threads:
+            t.start()
+        return self
+
+    def _capture_loop(self):
+        seq = 0
+        try:
+            while not self._stop.is_set():
+                t0 = time.perf_counter()
+                ok, frame = self.src.read()
+                if not ok or frame is None:
+                    if getattr(self.src, 'eof', False):
+                        break
+                    time.sleep(0.05)
+                    continue
+                self.frames.put((seq, metrics.record('capture', paced_start(self.src, t0)), frame))
+                seq += 1
+                self.stats['captured'] = seq
+        finally:
+            self.frames.close()
+
+    def _perception_loop(self):
+        while not self._stop.is_set():
+            item = self.frames.get(timeout=0.1)
+            if item is None:
+                if self.frames.closed:
+                    break
+                continue
+            seq, ts, frame = item
+            t0 = time.perf_counter()
+            state = analyze_frame(frame, self.cfg)
+            t0 = metrics.record('analyze', t0)
+            advice = make_advice(state)
+            metrics.record('policy', t0)
+            with self._lock:
+                self.stats['processed'] += 1
+            self._put_result((seq, ts, frame, state, advice))
+
+    def _put_result(self, result):
+        # очередь рендера ограничена: при переполнении выкидываем самый старый результат
+        while True:
+            try:
+                self.results.put_nowait(result)
+                return
+            except queue.Full:
+                try:
+                    old = self.results.get_nowait()
+                    recycle(self.src, old[2])
+                    with self._lock:
+                        self.stats['dropped_results'] += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=0.1):
+        """Следующий результат или None. Результаты старше уже отданного пропускаются."""
+        while True:
+            try:
+                item = self.results.get(timeout=timeout)
+            except queue.Empty:
+                if (self.frames.closed and not any(t.is_alive() for t in self._threads)
+                        and self.results.empty()):
+                    self.finished = True
+                return None
+            if item[0] > self._last_seq:
+                self._last_seq = item[0]
+                self.stats['dropped_stale'] = self.frames.dropped
+                return item
+            recycle(self.src, item[2])
+            with self._lock:
+                self.stats['dropped_results'] += 1
+
+    def stop(self):
+        self._stop.set()
+        self.frames.close()
+        for t in self._threads:
+            t.join(timeout=1.0)
+        self.stats['dropped_stale'] = self.frames.dropped
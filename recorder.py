@@ -0,0 +1,232 @@
+"""
+Фоновая запись видео (клавиша V).
+write() только копирует кадр в буфер из пула и ставит в ограниченную очередь — кодирование идёт
+в отдельном потоке. Когда очередь полна, действует policy:
+    drop_newest — новый кадр выбрасывается (по умолчанию, цикл захвата не ждёт);
+    drop_oldest — выбрасывается самый старый из очереди (в записи остаётся «свежее»);
+    block       — write() ждёт места (обратное давление: запись без пропусков, ассистент тормозит).
+Файл режется на сегменты по длительности или размеру; рядом с каждым сегментом пишется
+<сегмент>.ts.csv с реальными временами кадров. Если установлен ffmpeg (ffmpeg: auto/true),
+сырые кадры идут ему в stdin (libx264 ultrafast — дешевле mp4v из OpenCV).
+"""
+import collections
+import os
+import shutil
+import subprocess
+import threading
+import time
+import cv2
+import numpy as np
+import metrics
+from capture import FramePool
+
+POLICIES = ('drop_newest', 'drop_oldest', 'block')
+SIZE_CHECK_EVERY = 30  # кадров между проверками размера сегмента
+
+
+class _CvSink:
+    def __init__(self, path, fps, size, fourcc):
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if not self.writer.isOpened():
+            raise RuntimeError(f'VideoWriter не открылся: {path}')
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def close(self):
+        self.writer.release()
+
+
+class _FfmpegSink:
+    def __init__(self, path, fps, size, exe, codec_args):
+        w, h = size
+        cmd = [exe, '-loglevel', 'error', '-y', '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+               '-s', f'{w}x{h}', '-r', str(fps), '-i', '-'] + list(codec_args) + [path]
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        self.proc.stdin.write(np.ascontiguousarray(frame).data)
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        finally:
+            self.proc.wait(timeout=30)
+
+
+class VideoRecorder:
+    """
+    segment_seconds / segment_mb — порог нарезки (0 — не резать). ffmpeg: False | True | 'auto'.
+    stats: queued, written, dropped, segments, encode_ms (среднее), queue_max.
+    """
+    def __init__(self, path, fps=60, fourcc='mp4v', queue_size=8, policy='drop_newest',
+                 segment_seconds=0, segment_mb=0, ffmpeg='auto',
+                 ffmpeg_args=('-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '23', '-pix_fmt', 'yuv420p')):
+        if policy not in POLICIES:
+            raise ValueError(f"video.policy: ожидается одно из {POLICIES}, задано '{policy}'")
+        self.path = path
+        self.fps = float(fps)
+        self.fourcc = fourcc
+        self.policy = policy
+        self.segment_seconds = float(segment_seconds or 0)
+        self.segment_bytes = float(segment_mb or 0) * 1e6
+        self.ffmpeg_args = tuple(ffmpeg_args)
+        self.ffmpeg = shutil.which('ffmpeg') if ffmpeg in ('auto', True) else None
+        if ffmpeg is True and self.ffmpeg is None:
+            print('[video] ffmpeg не найден, пишу через OpenCV')
+        self.queue_size = max(1, int(queue_size))
+        self.pool = FramePool(size=self.queue_size + 1)
+        self.stats = {'queued': 0, 'written': 0, 'dropped': 0, 'segments': 0, 'encode_ms': 0.0, 'queue_max': 0}
+        self.segments = []
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._sink = None
+        self._sidecar = None
+        self._seg_path = None
+        self._seg_size = None
+        self._seg_start = None
+        self._seg_frames = 0
+        self._thread = threading.Thread(target=self._run, name='video', daemon=True)
+        self._thread.start()
+
+    def write(self, frame, ts=None):
+        """Поставить кадр в очередь записи. ts — время захвата (perf_counter), по умолчанию сейчас.
+        False — кадр выброшен политикой очереди."""
+        ts = time.perf_counter() if ts is None else ts
+        with self._cond:
+            if self._closed:
+                return False
+            if len(self._queue) >= self.queue_size:
+                if self.policy == 'drop_newest':
+                    self.stats['dropped'] += 1
+                    return False
+                if self.policy == 'drop_oldest':
+                    old = self._queue.popleft()
+                    self.pool.release(old[0])
+                    self.stats['dropped'] += 1
+                else:
+                    while len(self._queue) >= self.queue_size and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        return False
+        buf = self.pool.acquire(frame.shape)
+        np.copyto(buf, frame)
+        with self._cond:
+            self._queue.append((buf, ts, time.time()))
+            self.stats['queued'] += 1
+            self.stats['queue_max'] = max(self.stats['queue_max'], len(self._queue))
+            self._cond.notify_all()
+        return True
+
+    def _next_path(self):
+        if not self.segment_seconds and not self.segment_bytes and not self.segments \
+                and not os.path.exists(self.path):
+            return self.path
+        stem, ext = os.path.splitext(self.path)
+        n = len(self.segments)
+        while os.path.exists(f'{stem}_{n:03d}{ext}'):
+            n += 1
+        return f'{stem}_{n:03d}{ext}'
+
+    def _open_segment(self, frame, wall):
+        h, w = frame.shape[:2]
+        path = self._next_path()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        sink = None
+        if self.ffmpeg:
+            try:
+                sink = _FfmpegSink(path, self.fps, (w, h), self.ffmpeg, self.ffmpeg_args)
+            except OSError as e:
+                print(f'[video] ffmpeg не запустился ({e}), пишу через OpenCV')
+                self.ffmpeg = None
+        self._sink = sink or _CvSink(path, self.fps, (w, h), self.fourcc)
+        self._sidecar = open(path + '.ts.csv', 'w', encoding='utf-8')
+        self._sidecar.write('frame,pts_s,capture_ts,wall_ts\n')
+        self._seg_path, self._seg_size, self._seg_start, self._seg_frames = path, (w, h), wall, 0
+        self.segments.append(path)
+        self.stats['segments'] += 1
+        print(f"[video] запись -> {path} @ {self.fps:g}fps, size={w}x{h}, "
+              f"{'ffmpeg' if isinstance(self._sink, _FfmpegSink) else self.fourcc}")
+
+    def _close_segment(self):
+        if self._sink is None:
+            return
+        try:
+            self._sink.close()
+        except Exception as e:
+            print(f'[video] ошибка при закрытии {self._seg_path}: {e}')
+        self._sidecar.close()
+        self._sink = self._sidecar = None
+
+    def _need_rollover(self, frame, wall):
+        if self._sink is None:
+            return True
+        if (frame.shape[1], frame.shape[0]) != self._seg_size:
+            return True
+        if self.segment_seconds and wall - self._seg_start >= self.segment_seconds:
+            return True
+        if self.segment_bytes and self._seg_frames % SIZE_CHECK_EVERY == 0 and self._seg_frames and \
+                os.path.exists(self._seg_path) and os.path.getsize(self._seg_path) >= self.segment_bytes:
+            return True
+        return False
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    break
+                buf, ts, wall = self._queue.popleft()
+                self._cond.notify_all()
+            t0 = time.perf_counter()
+            try:
+                if self._need_rollover(buf, wall):
+                    self._close_segment()
+                    self._open_segment(buf, wall)
+                try:
+                    self._sink.write(buf)
+                except (BrokenPipeError, OSError) as e:
+                    # ffmpeg упал — дальше пишем новый сегмент через OpenCV
+                    print(f'[video] ffmpeg: {e}, переключаюсь на OpenCV')
+                    self.ffmpeg = None
+                    self._close_segment()
+                    self._open_segment(buf, wall)
+                    self._sink.write(buf)
+                self._sidecar.write(f'{self._seg_frames},{self._seg_frames / self.fps:.6f},{ts:.6f},{wall:.6f}\n')
+                self._seg_frames += 1
+                self.stats['written'] += 1
+            except Exception as e:
+                print(f'[video] ошибка записи кадра: {e}')
+                self.stats['dropped'] += 1
+            finally:
+                self.pool.release(buf)
+            dt = time.perf_counter() - t0
+            metrics.add('video_encode', dt)
+            n = self.stats['written']
+            if n:
+                self.stats['encode_ms'] += (dt * 1000.0 - self.stats['encode_ms']) / n
+        self._close_segment()
+
+    def close(self):
+        """Дописать очередь и закрыть текущий сегмент."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        return dict(self.stats)
+
+
+def make_recorder(cfg):
+    """VideoRecorder по секции video конфига."""
+    vcfg = cfg.get('video', {}) or {}
+    return VideoRecorder(vcfg.get('path', 'captures/wot_capture.mp4'),
+                         fps=vcfg.get('fps', 60),
+                         fourcc=vcfg.get('fourcc', 'mp4v'),
+                         queue_size=vcfg.get('queue_size', 8),
+                         policy=vcfg.get('policy', 'drop_newest'),
+                         segment_seconds=vcfg.get('segment_seconds', 0),
+                         segment_mb=vcfg.get('segment_mb', 0),
+                         ffmpeg=vcfg.get('ffmpeg', 'auto'))
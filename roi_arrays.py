@@ -0,0 +1,259 @@
+"""
+Датасет для обучения на CPU: сессии -> по одному memory-mapped массиву uint8 на ROI.
+Конвертер один раз декодирует JPEG (сессии dataset_io или каталоги frame_<ts>[_<roi>].jpg),
+приводит каждый ROI к фиксированному размеру и пишет <out>/<roi>.npy (N, H, W, 3) плюс
+<out>/<roi>_ts.npy и index.json. При обучении кадры читаются прямо из страниц файла:
+декодирования нет, память не растёт с размером датасета.
+
+    python roi_arrays.py dataset/session_* --out arrays/ --size _full=224x224 --size minimap=128x128
+    python train_rotnet.py --data arrays/ --roi _full --epochs 5
+
+RoiArrayDataset / RoiArrayStream — torch Dataset / IterableDataset поверх массивов
+(torch нужен только для них), make_loader — DataLoader с воркерами и предвыборкой.
+"""
+import argparse
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from dataset_io import DatasetReader, FULL_FRAME, is_session
+
+try:
+    import torch
+    from torch.utils.data import Dataset, IterableDataset, DataLoader, get_worker_info
+except ImportError:  # конвертер работает и без torch
+    torch = None
+    Dataset = IterableDataset = object
+
+INDEX_FILE = 'index.json'
+DEFAULT_FULL_SIZE = (384, 216)  # (w, h) полного кадра, если --size не задан
+_FILE_RE = re.compile(r'^frame_(\d+)(?:_([A-Za-z]\w*))?\.(?:jpg|jpeg|png|bmp)$', re.IGNORECASE)
+
+
+def _scan_files(path):
+    """Старый формат каталога: {roi: [(ts, путь)]}; полный кадр — FULL_FRAME."""
+    out = {}
+    for f in sorted(os.listdir(path)):
+        m = _FILE_RE.match(f)
+        if m:
+            out.setdefault(m.group(2) or FULL_FRAME, []).append((int(m.group(1)), os.path.join(path, f)))
+    return out
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _sources(paths):
+    """[(roi, ts, загрузчик байт)] по всем сессиям/каталогам."""
+    items = []
+    for path in paths:
+        if is_session(path):
+            reader = DatasetReader(path)
+            for it in reader.items():
+                items.append((it['roi'], it['ts'], path, lambda it=it, r=reader: r.read_bytes(it)))
+        elif os.path.isdir(path):
+            for roi, files in _scan_files(path).items():
+                for ts, fp in files:
+                    items.append((roi, ts, path, lambda fp=fp: _read_file(fp)))
+        else:
+            print(f'[arrays] {path}: не сессия и не каталог, пропущен')
+    return items
+
+
+def _decode(load, size):
+    img = cv2.imdecode(np.frombuffer(load(), np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    if size is not None and (img.shape[1], img.shape[0]) != size:
+        img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+    return img
+
+
+def _truncate(path, n, chunk=256):
+    """Оставить первые n строк .npy, копируя кусками (без загрузки массива в память)."""
+    src = np.load(path, mmap_mode='r')
+    dst = np.lib.format.open_memmap(path + '.tmp', mode='w+', dtype=src.dtype, shape=(n,) + src.shape[1:])
+    for i in range(0, n, chunk):
+        dst[i:i + chunk] = src[i:min(n, i + chunk)]
+    dst.flush()
+    del src, dst
+    os.replace(path + '.tmp', path)
+
+
+def convert(paths, out_dir, sizes=None, rois=None, workers=4):
+    """
+    sizes — {roi: (w, h)}; без размера ROI берётся форма первого его сэмпла
+    (полный кадр — DEFAULT_FULL_SIZE). rois — какие ROI выгружать (None — все).
+    """
+    sizes = dict(sizes or {})
+    by_roi = {}
+    for roi, ts, src, load in _sources(paths):
+        if rois is None or roi in rois:
+            by_roi.setdefault(roi, []).append((ts, src, load))
+    os.makedirs(out_dir, exist_ok=True)
+    index = {'sources': [os.path.abspath(p) for p in paths], 'rois': {}}
+    with ThreadPoolExecutor(max_workers=max(1, int(workers))) as pool:
+        for roi, items in sorted(by_roi.items()):
+            items.sort(key=lambda t: t[0])
+            size = sizes.get(roi)
+            if size is None:
+                if roi == FULL_FRAME:
+                    size = DEFAULT_FULL_SIZE
+                else:
+                    first = _decode(items[0][2], None) if items else None
+                    size = (first.shape[1], first.shape[0]) if first is not None else (64, 64)
+            w, h = size
+            arr = np.lib.format.open_memmap(os.path.join(out_dir, f'{roi}.npy'), mode='w+',
+                                            dtype=np.uint8, shape=(len(items), h, w, 3))
+            ts = np.zeros(len(items), np.int64)
+            n = 0
+            # imdecode/resize отпускают GIL; map сохраняет порядок по времени
+            for (t, _, _), img in zip(items, pool.map(lambda it: _decode(it[2], (w, h)), items)):
+                if img is None:
+                    continue
+                arr[n] = img
+                ts[n] = t
+                n += 1
+            arr.flush()
+            del arr
+            if n < len(items):
+                _truncate(os.path.join(out_dir, f'{roi}.npy'), n)  # битые JPEG пропущены
+            np.save(os.path.join(out_dir, f'{roi}_ts.npy'), ts[:n])
+            index['rois'][roi] = {'count': n, 'shape': [h, w, 3], 'file': f'{roi}.npy'}
+            print(f'[arrays] {roi:<12} {n} x {w}x{h} -> {out_dir}/{roi}.npy')
+    with open(os.path.join(out_dir, INDEX_FILE), 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    return index
+
+
+def open_roi(path, roi):
+    """Массив (N, H, W, 3) uint8 только для чтения, без загрузки в память."""
+    return np.load(os.path.join(path, f'{roi}.npy'), mmap_mode='r')
+
+
+def _augment(img, rng, rotnet, flip):
+    """HWC uint8 -> (CHW uint8, метка поворота или -1)."""
+    if flip and rng.random() < 0.5:
+        img = img[:, ::-1]
+    label = -1
+    if rotnet:
+        label = int(rng.integers(4))
+        img = np.rot90(img, label)
+    return np.ascontiguousarray(img.transpose(2, 0, 1)), label
+
+
+class RoiArrayDataset(Dataset):
+    """
+    Случайный доступ по индексу: (тензор uint8 CHW, метка поворота). rotnet=True — случайный
+    поворот на k*90 градусов и метка k (нужны квадратные кадры). Во float переводить батч целиком.
+    """
+    def __init__(self, path, roi, rotnet=True, flip=False, seed=None):
+        if torch is None:
+            raise RuntimeError('Установи torch: pip install torch')
+        self.path, self.roi = path, roi
+        self.rotnet, self.flip = bool(rotnet), bool(flip)
+        self.seed = seed
+        self._arr = None
+        self._rng = None
+        arr = open_roi(path, roi)
+        self.shape = arr.shape
+        if self.rotnet and arr.shape[1] != arr.shape[2]:
+            raise ValueError(f'{roi}: для поворотов RotNet нужен квадрат, а не {arr.shape[2]}x{arr.shape[1]} '
+                             f'(конвертируй с --size {roi}=NxN)')
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _open(self):
+        # memmap открывается лениво в каждом воркере, а не копируется из главного процесса
+        if self._arr is None:
+            self._arr = open_roi(self.path, self.roi)
+            info = get_worker_info()
+            self._rng = np.random.default_rng(None if self.seed is None else self.seed + (info.id if info else 0))
+        return self._arr
+
+    def __getitem__(self, i):
+        img, label = _augment(self._open()[i], self._rng, self.rotnet, self.flip)
+        return torch.from_numpy(img), label
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_arr'] = state['_rng'] = None
+        return state
+
+
+class RoiArrayStream(IterableDataset):
+    """
+    Потоковое чтение: индексы делятся между воркерами, порядок — перемешанные блоки по block
+    подряд идущих кадров (последовательное чтение страниц файла), внутри блока — тоже случайно.
+    """
+    def __init__(self, path, roi, rotnet=True, flip=False, shuffle=True, block=256, seed=0):
+        self.ds = RoiArrayDataset(path, roi, rotnet=rotnet, flip=flip, seed=seed)
+        self.shuffle, self.block, self.seed = bool(shuffle), max(1, int(block)), int(seed)
+        self.epoch = 0
+        self._iters = 0  # у persistent-воркеров своя копия: set_epoch до неё не доходит, а счётчик — да
+
+    def __len__(self):
+        return len(self.ds)
+
+    def set_epoch(self, epoch):
+        self.epoch = int(epoch)
+
+    def __iter__(self):
+        info = get_worker_info()
+        wid, nw = (info.id, info.num_workers) if info else (0, 1)
+        n = len(self.ds)
+        blocks = np.arange(0, n, self.block)
+        # одинаковый порядок блоков во всех воркерах, каждый берёт свою долю
+        rng = np.random.default_rng(self.seed + self.epoch + self._iters)
+        self._iters += 1
+        if self.shuffle:
+            rng.shuffle(blocks)
+        for start in blocks[wid::nw]:
+            idx = np.arange(start, min(n, start + self.block))
+            if self.shuffle:
+                rng.shuffle(idx)
+            for i in idx:
+                yield self.ds[int(i)]
+
+
+def make_loader(path, roi, batch_size=64, workers=2, rotnet=True, flip=False, stream=True,
+                shuffle=True, prefetch=4):
+    """DataLoader с воркерами и предвыборкой prefetch батчей на воркер."""
+    if torch is None:
+        raise RuntimeError('Установи torch: pip install torch')
+    ds = RoiArrayStream(path, roi, rotnet=rotnet, flip=flip, shuffle=shuffle) if stream else \
+        RoiArrayDataset(path, roi, rotnet=rotnet, flip=flip)
+    kwargs = {'batch_size': batch_size, 'num_workers': workers}
+    if workers > 0:
+        kwargs.update(prefetch_factor=prefetch, persistent_workers=True)
+    if not stream:
+        kwargs['shuffle'] = shuffle
+    return DataLoader(ds, **kwargs)
+
+
+def _parse_size(s):
+    roi, _, wh = s.partition('=')
+    w, h = wh.lower().split('x')
+    return roi, (int(w), int(h))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('sources', nargs='+', help='сессии dataset_io или каталоги frame_<ts>[_<roi>].jpg')
+    ap.add_argument('--out', required=True)
+    ap.add_argument('--size', action='append', default=[], metavar='ROI=WxH',
+                    help=f'размер ROI в массиве (полный кадр — {FULL_FRAME}), можно несколько раз')
+    ap.add_argument('--roi', action='append', default=None, help='выгрузить только эти ROI')
+    ap.add_argument('--workers', type=int, default=4)
+    args = ap.parse_args()
+    convert(args.sources, args.out, sizes=dict(_parse_size(s) for s in args.size), rois=args.roi,
+            workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
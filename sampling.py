@@ -0,0 +1,110 @@
+"""
+Адаптивный отбор кадров для датасета (collect.py).
+Подпись кадра — 64-битные dHash полного кадра и каждого ROI. Кадр пропускается, если по всем
+частям он в пределах max_distance бит от одного из недавно сохранённых (гараж, загрузка,
+долгий снайперский режим). Интервал между сохранениями подстраивается под активность сцены —
+сколько бит подписи меняется от кадра к кадру: статика -> max_interval, быстрые изменения ->
+min_interval. События из state (загорелась лампочка, изменилось число врагов на миникарте)
+сохраняются сразу, если кадр не дубликат.
+"""
+import collections
+import time
+import cv2
+import numpy as np
+from layout import DEFAULT_BASE, layout_for
+
+_HASH_W, _HASH_H = 9, 8
+
+
+def dhash(bgr):
+    """64-битный разностный хеш: знак горизонтального градиента на уменьшенной 9x8 серой копии."""
+    h, w = bgr.shape[:2]
+    if w > _HASH_W * 16 or h > _HASH_H * 16:
+        # сначала дёшево до 144x128, иначе INTER_AREA по 1080p стоит миллисекунды
+        bgr = cv2.resize(bgr, (_HASH_W * 16, _HASH_H * 16), interpolation=cv2.INTER_LINEAR)
+    small = cv2.resize(cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY), (_HASH_W, _HASH_H), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class AdaptiveSampler:
+    """
+    decide(frame, state) -> (сохранять ли, причина). Причины: 'first', 'event', 'interval',
+    'duplicate' (пропуск), 'rate' (рано). stats — счётчики по причинам и число просмотренных кадров.
+    base_interval — интервал при «обычной» активности ref_activity (доля изменившихся бит).
+    rois — как в конфиге (доли кадра или пиксели roi_base).
+    """
+    def __init__(self, rois=None, base_interval=1.0, min_interval=0.25, max_interval=10.0,
+                 max_distance=6, history=32, ref_activity=0.1, alpha=0.3, roi_base=DEFAULT_BASE):
+        self.rois = dict(rois or {})
+        self.roi_base = tuple(roi_base)
+        self.base_interval = float(base_interval)
+        self.min_interval = float(min_interval)
+        self.max_interval = float(max_interval)
+        self.max_distance = int(max_distance)
+        self.ref_activity = float(ref_activity)
+        self.alpha = float(alpha)
+        self.activity = ref_activity
+        self.history = collections.deque(maxlen=int(history))
+        self.stats = collections.Counter()
+        self._prev = None
+        self._last_save = None
+        self._prev_state = {}
+
+    def signature(self, frame):
+        sig = [dhash(frame)]
+        for x, y, w, h in layout_for(self.rois, frame.shape[1], frame.shape[0], self.roi_base).px.values():
+            sig.append(dhash(frame[y:y + h, x:x + w]))
+        return sig
+
+    def interval(self):
+        """Текущий интервал между сохранениями, сек."""
+        if self.activity <= 0:
+            return self.max_interval
+        iv = self.base_interval * self.ref_activity / self.activity
+        return min(self.max_interval, max(self.min_interval, iv))
+
+    def _event(self, state):
+        if not state:
+            return False
+        prev, self._prev_state = self._prev_state, state
+        return bool(state.get('sixth_sense') and not prev.get('sixth_sense')) or \
+            state.get('enemy_count', 0) != prev.get('enemy_count', state.get('enemy_count', 0))
+
+    def _duplicate(self, sig):
+        for old in self.history:
+            if max(hamming(a, b) for a, b in zip(sig, old)) <= self.max_distance:
+                return True
+        return False
+
+    def decide(self, frame, state=None, now=None):
+        now = time.monotonic() if now is None else now
+        sig = self.signature(frame)
+        self.stats['seen'] += 1
+        if self._prev is not None:
+            changed = max(hamming(a, b) for a, b in zip(sig, self._prev)) / 64.0
+            self.activity += self.alpha * (changed - self.activity)
+        self._prev = sig
+        event = self._event(state)
+
+        if self._last_save is None:
+            reason = 'first'
+        elif event:
+            reason = 'event'
+        elif now - self._last_save < self.interval():
+            self.stats['rate'] += 1
+            return False, 'rate'
+        else:
+            reason = 'interval'
+        if reason != 'first' and self._duplicate(sig):
+            self.stats['duplicate'] += 1
+            return False, 'duplicate'
+        self.history.append(sig)
+        self._last_save = now
+        self.stats[reason] += 1
+        self.stats['saved'] += 1
+        return True, reason
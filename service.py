@@ -0,0 +1,479 @@
+"""
+Безоконный режим и раздача состояния восприятия другим программам (оверлеи стрима, логгеры,
+боты в тренировочной комнате).
+
+    python main.py --headless --config config.yaml            # захват + восприятие + советы без окна
+    python service.py subscribe --connect 127.0.0.1:8765      # посмотреть поток изменений
+
+StateServer слушает локальный TCP-порт (или Unix-сокет: service.listen: unix:/tmp/wot.sock) и шлёт
+каждому подписчику не весь state, а только изменившиеся поля. Новый подписчик сначала получает
+полный снимок (ключевой кадр). У каждого подписчика своя ограниченная очередь и свой поток записи:
+медленный клиент не тормозит восприятие — при переполнении его очередь сбрасывается и следующим
+сообщением он получает свежий ключевой кадр. Буферы сокетов маленькие с обеих сторон (SNDBUF),
+чтобы отставание копилось в этой очереди, а не в ядре; сторонним клиентам стоит тоже уменьшить SO_RCVBUF.
+
+Дельту вызывает только изменение публикуемых полей. Служебные поля, которые меняются каждый кадр
+(VOLATILE: ages, latency_ms, dropped_frames, tracks, tracker_mode), по умолчанию не публикуются
+(service.exclude), а возрасты событий округляются (QUANTIZE, service.quantize: ocr_age и
+damage_log_event_age — до 0.1 с). Иначе дельта уходила бы на каждый кадр. Поле, явно названное
+в service.fields, публикуется, даже если оно в exclude.
+
+Сообщение: u32 длина (big-endian) | u8 вид (0 — ключевой кадр, 1 — дельта) | u32 seq | f64 время
+(time.time) | тело. Тело — компактное двоичное значение (pack/unpack ниже): ключевой кадр —
+словарь полей, дельта — [словарь изменившихся полей, список удалённых]. Кодирование значения:
+байт-тег, затем 0 None / 1 False / 2 True / 3 int (zigzag varint) / 4 f64 / 5 str (varint длины,
+UTF-8) / 6 список (varint n, элементы) / 7 словарь (varint n, пары строка-ключ + значение).
+"""
+import argparse
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+import numpy as np
+
+KEY, DELTA = 0, 1
+_HEADER = struct.Struct('>IBId')  # длина, вид, seq, время
+_F64 = struct.Struct('>d')
+DEFAULT_LISTEN = '127.0.0.1:8765'
+SNDBUF = 16 * 1024
+VOLATILE = ('ages', 'latency_ms', 'dropped_frames', 'tracks', 'tracker_mode')
+QUANTIZE = {'ocr_age': 0.1, 'damage_log_event_age': 0.1, 'ages': 0.1}
+
+
+# --- кодек ---
+
+def _varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _pack(out, v):
+    if v is None:
+        out.append(0)
+    elif v is True:
+        out.append(2)
+    elif v is False:
+        out.append(1)
+    elif isinstance(v, int):
+        out.append(3)
+        _varint(out, (v << 1) if v >= 0 else ((-v << 1) - 1))
+    elif isinstance(v, float):
+        out.append(4)
+        out += _F64.pack(v)
+    elif isinstance(v, str):
+        b = v.encode('utf-8')
+        out.append(5)
+        _varint(out, len(b))
+        out += b
+    elif isinstance(v, (list, tuple)):
+        out.append(6)
+        _varint(out, len(v))
+        for x in v:
+            _pack(out, x)
+    elif isinstance(v, dict):
+        out.append(7)
+        _varint(out, len(v))
+        for k, x in v.items():
+            b = str(k).encode('utf-8')
+            _varint(out, len(b))
+            out += b
+            _pack(out, x)
+    else:
+        raise TypeError(f'service: не кодируется {type(v).__name__}')
+
+
+def pack(value):
+    out = bytearray()
+    _pack(out, value)
+    return bytes(out)
+
+
+def _read_varint(buf, i):
+    n = shift = 0
+    while True:
+        b = buf[i]
+        i += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, i
+        shift += 7
+
+
+def _unpack(buf, i):
+    tag = buf[i]
+    i += 1
+    if tag <= 2:
+        return (None, False, True)[tag], i
+    if tag == 3:
+        n, i = _read_varint(buf, i)
+        return (n >> 1) ^ -(n & 1), i
+    if tag == 4:
+        return _F64.unpack_from(buf, i)[0], i + 8
+    if tag == 5:
+        n, i = _read_varint(buf, i)
+        return bytes(buf[i:i + n]).decode('utf-8'), i + n
+    if tag == 6:
+        n, i = _read_varint(buf, i)
+        out = []
+        for _ in range(n):
+            v, i = _unpack(buf, i)
+            out.append(v)
+        return out, i
+    if tag == 7:
+        n, i = _read_varint(buf, i)
+        out = {}
+        for _ in range(n):
+            k, i = _read_varint(buf, i)
+            key = bytes(buf[i:i + k]).decode('utf-8')
+            out[key], i = _unpack(buf, i + k)
+        return out, i
+    raise ValueError(f'service: неизвестный тег {tag}')
+
+
+def unpack(data):
+    return _unpack(memoryview(data), 0)[0]
+
+
+def plain(v):
+    """Значение state -> то, что кодируется: numpy-скаляры и массивы в числа/списки, кортежи в списки."""
+    if isinstance(v, dict):
+        return {str(k): plain(x) for k, x in v.items()}
+    if isinstance(v, (list, tuple)):
+        return [plain(x) for x in v]
+    if isinstance(v, np.generic):
+        return v.item()
+    if isinstance(v, np.ndarray):
+        return v.tolist()
+    return v
+
+
+def quantize(v, step):
+    """Число (или словарь чисел, как ages) с шагом step; None и прочее — как есть."""
+    if isinstance(v, dict):
+        return {k: quantize(x, step) for k, x in v.items()}
+    if isinstance(v, float):
+        return round(round(v / step) * step, 6)
+    return v
+
+
+def _message(kind, seq, body):
+    payload = pack(body)
+    return _HEADER.pack(_HEADER.size - 4 + len(payload), kind, seq, time.time()) + payload
+
+
+# --- сервер ---
+
+class _Subscriber:
+    """Очередь сообщений и поток записи одного подписчика."""
+    def __init__(self, sock, addr, queue_size, on_close):
+        self.sock = sock
+        self.addr = addr
+        self.queue_size = max(1, int(queue_size))
+        self.need_key = True
+        self.sent = 0
+        self.resets = 0
+        self.closed = False
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._on_close = on_close
+        self._thread = threading.Thread(target=self._run, name=f'service-{addr}', daemon=True)
+        self._thread.start()
+
+    def offer(self, delta, key):
+        """delta/key — готовые байты (key() строит ключевой кадр лениво, один на всех)."""
+        with self._cond:
+            if self.closed:
+                return
+            if not self.need_key and len(self._queue) >= self.queue_size:
+                # клиент не успевает: дельты без пропусков уже не применить — сброс и свежий снимок
+                self._queue.clear()
+                self.resets += 1
+                self.need_key = True
+            if self.need_key:
+                self._queue.append(key())
+                self.need_key = False
+            elif delta is not None:
+                self._queue.append(delta)
+            self._cond.notify()
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    while not self._queue and not self.closed:
+                        self._cond.wait()
+                    if self.closed:
+                        return
+                    msg = self._queue.popleft()
+                self.sock.sendall(msg)
+                self.sent += 1
+        except OSError:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        with self._cond:
+            if self.closed:
+                return
+            self.closed = True
+            self._cond.notify_all()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        self._on_close(self)
+
+
+def _parse_address(addr):
+    """'host:port' -> (AF_INET, (host, port)); 'unix:/path' -> (AF_UNIX, path)."""
+    if addr.startswith('unix:'):
+        return socket.AF_UNIX, addr[5:]
+    host, _, port = addr.rpartition(':')
+    return socket.AF_INET, (host or '127.0.0.1', int(port))
+
+
+class StateServer:
+    """
+    publish(state, advice) из цикла восприятия: считает дельту к прошлой публикации один раз
+    и раздаёт её всем подписчикам, не дожидаясь отправки. fields — публиковать только эти поля;
+    exclude — не публиковать эти (если fields не задан); quantize — {поле: шаг округления}.
+    """
+    def __init__(self, listen=DEFAULT_LISTEN, queue_size=64, fields=None, exclude=VOLATILE, quantize=None):
+        self.listen = listen
+        self.queue_size = int(queue_size)
+        self.fields = set(fields) if fields else None
+        self.exclude = set(exclude or ())
+        self.quantize = dict(QUANTIZE if quantize is None else quantize)
+        self.stats = {'published': 0, 'bytes': 0, 'subscribers': 0, 'resets': 0}
+        self._state = {}
+        self._seq = 0
+        self._subs = []
+        self._lock = threading.Lock()
+        family, address = _parse_address(listen)
+        if family == socket.AF_UNIX and os.path.exists(address):
+            os.unlink(address)
+        self._sock = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(address)
+        self._sock.listen(16)
+        self._family = family
+        self._address = address
+        self._closed = False
+        self._thread = threading.Thread(target=self._accept_loop, name='service-accept', daemon=True)
+        self._thread.start()
+        print(f'[service] состояние -> {listen}')
+
+    def _accept_loop(self):
+        while not self._closed:
+            try:
+                sock, addr = self._sock.accept()
+            except OSError:
+                return
+            if self._family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            # маленький буфер ядра: отставание копится в нашей очереди (где его видно и можно
+            # сбросить), а не мегабайтами устаревших дельт в сокете
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SNDBUF)
+            sub = _Subscriber(sock, addr or 'unix', self.queue_size, self._drop)
+            with self._lock:
+                self._subs.append(sub)
+                self.stats['subscribers'] = len(self._subs)
+                state, seq = self._state, self._seq
+            if state:
+                sub.offer(None, lambda: _message(KEY, seq, state))
+
+    def _drop(self, sub):
+        with self._lock:
+            if sub in self._subs:
+                self._subs.remove(sub)
+                self.stats['resets'] += sub.resets
+            self.stats['subscribers'] = len(self._subs)
+
+    def publish(self, state, advice=None):
+        if self.fields is not None:
+            cur = {k: plain(v) for k, v in state.items() if k in self.fields}
+        else:
+            cur = {k: plain(v) for k, v in state.items() if k not in self.exclude}
+        for k, step in self.quantize.items():
+            if k in cur:
+                cur[k] = quantize(cur[k], step)
+        if advice is not None:
+            cur['advice'] = list(advice)
+        with self._lock:
+            prev = self._state
+            changed = {k: v for k, v in cur.items() if k not in prev or prev[k] != v}
+            removed = [k for k in prev if k not in cur]
+            if not changed and not removed:
+                return
+            self._seq += 1
+            seq = self._seq
+            self._state = cur
+            subs = list(self._subs)
+            self.stats['published'] += 1
+        if not subs:
+            return
+        delta = _message(DELTA, seq, [changed, removed])
+        key_msg = []
+
+        def key():
+            if not key_msg:
+                key_msg.append(_message(KEY, seq, cur))
+            return key_msg[0]
+        for sub in subs:
+            sub.offer(delta, key)
+        self.stats['bytes'] += len(delta)
+
+    def close(self):
+        self._closed = True
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+        with self._lock:
+            subs = list(self._subs)
+        for sub in subs:
+            sub.close()
+        if self._family == socket.AF_UNIX and os.path.exists(self._address):
+            os.unlink(self._address)
+
+
+def make_server(cfg, listen=None):
+    """StateServer по секции service; None — выключен (и адрес не задан явно)."""
+    scfg = cfg.get('service', {}) or {}
+    if listen is None and not scfg.get('enabled', False):
+        return None
+    return StateServer(listen or scfg.get('listen', DEFAULT_LISTEN), queue_size=scfg.get('queue_size', 64),
+                       fields=scfg.get('fields'), exclude=scfg.get('exclude', VOLATILE),
+                       quantize=scfg.get('quantize'))
+
+
+# --- клиент ---
+
+class StateClient:
+    """Подписчик: updates() отдаёт (seq, время, вид, полное текущее состояние, изменившиеся поля)."""
+    def __init__(self, connect=DEFAULT_LISTEN, timeout=None):
+        family, address = _parse_address(connect)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        # и на приёме буфер маленький — иначе медленный клиент читает секундами устаревшие дельты
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SNDBUF)
+        self.sock.settimeout(timeout)
+        self.sock.connect(address)
+        self.state = {}
+
+    def _recv(self, n):
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self.sock.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError('service: соединение закрыто')
+            buf += chunk
+        return buf
+
+    def read(self):
+        length, kind, seq, ts = _HEADER.unpack(self._recv(_HEADER.size))
+        body = unpack(self._recv(length - (_HEADER.size - 4)))
+        if kind == KEY:
+            self.state = body
+            changed = body
+        else:
+            changed, removed = body
+            self.state.update(changed)
+            for k in removed:
+                self.state.pop(k, None)
+        return seq, ts, kind, self.state, changed
+
+    def updates(self):
+        while True:
+            yield self.read()
+
+    def close(self):
+        self.sock.close()
+
+
+# --- безоконный цикл ---
+
+def run_headless(cfg, server=None, max_frames=0):
+    """Захват -> analyze_frame -> make_advice -> publish без окна; Ctrl+C — выход."""
+    import metrics
+    from capture import make_source, recycle, paced_start
+    from perception import analyze_frame
+    from policy import make_advice
+    from pipeline import Pipeline
+
+    src = make_source(cfg)
+    pcfg = cfg.get('pipeline', {}) or {}
+    pipe = None
+    if pcfg.get('enabled', False):
+        pipe = Pipeline(src, cfg, workers=pcfg.get('workers', 1), queue_size=pcfg.get('queue_size', 2)).start()
+    n = 0
+    print('[service] безоконный режим, Ctrl+C — выход')
+    try:
+        while not max_frames or n < max_frames:
+            if pipe is not None:
+                item = pipe.get(timeout=0.05)
+                if item is None:
+                    if pipe.finished:
+                        break
+                    continue
+                _, _, frame, state, advice = item
+            else:
+                t0 = time.perf_counter()
+                ok, frame = src.read()
+                metrics.record('capture', paced_start(src, t0))
+                if not ok or frame is None:
+                    if getattr(src, 'eof', False):
+                        break
+                    time.sleep(0.05)
+                    continue
+                t = time.perf_counter()
+                state = analyze_frame(frame, cfg)
+                t = metrics.record('analyze', t)
+                advice = make_advice(state)
+                metrics.record('policy', t)
+            if server is not None:
+                t = time.perf_counter()
+                server.publish(state, advice)
+                metrics.record('publish', t)
+            recycle(src, frame)
+            metrics.tick()
+            n += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if pipe is not None:
+            pipe.stop()
+        src.release()
+    if server is not None:
+        st = server.stats
+        print(f"[service] кадров: {n}, опубликовано: {st['published']}, "
+              f"{st['bytes']} байт дельт, подписчиков: {st['subscribers']}")
+    return n
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    s = sub.add_parser('subscribe', help='печатать изменения состояния')
+    s.add_argument('--connect', default=DEFAULT_LISTEN, help='host:port или unix:/путь')
+    s.add_argument('--fields', nargs='*', default=None, help='печатать только эти поля')
+    args = ap.parse_args()
+    client = StateClient(args.connect)
+    try:
+        for seq, ts, kind, state, changed in client.updates():
+            shown = {k: v for k, v in changed.items() if not args.fields or k in args.fields}
+            if shown:
+                print(f"{seq:6d} {'KEY' if kind == KEY else 'Δ  '} {shown}")
+    except (KeyboardInterrupt, ConnectionError):
+        pass
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Быстрый старт: окно показывает кадры сразу, а тяжёлое (импорт easyocr/torch, веса HUD-модели,
+шаблоны иконок и глифов) грузится в фоне. У каждого ресурса свой статус — loading / ready /
+unavailable (зависимости или файлов нет) / failed; детекторы объявляют, какие ресурсы им нужны,
+и планировщик не запускает их до готовности (detectors.py), а оверлей показывает, что ещё грузится.
+optional_import кэширует и удачный, и неудачный импорт: отсутствующий пакет не ищется повторно.
+mark()/report() — профиль старта (main.py --profile-startup): время до первого кадра и до полной
+готовности по этапам.
+"""
+import importlib
+import threading
+import time
+
+LOADING, READY, UNAVAILABLE, FAILED = 'loading', 'ready', 'unavailable', 'failed'
+
+_T0 = time.perf_counter()  # модуль импортируется первым в main.py — почти старт процесса
+
+_imports = {}
+_import_lock = threading.Lock()
+_status = {}
+_marks = {}
+_lock = threading.Lock()
+_changed = threading.Condition(_lock)
+_started = False
+
+
+def optional_import(name):
+    """Модуль или None; результат (в том числе неудача) запоминается на весь процесс."""
+    with _import_lock:
+        if name in _imports:
+            return _imports[name]
+        t0 = time.perf_counter()
+        try:
+            mod = importlib.import_module(name)
+        except Exception as e:  # не только ImportError: сломанный torch падает и с OSError
+            print(f'[startup] {name} недоступен ({e.__class__.__name__}: {e})')
+            mod = None
+        _imports[name] = mod
+        if mod is not None:
+            mark(f'import {name}', since=t0)
+        return mod
+
+
+def mark(event, since=None):
+    """Запомнить момент события (первый раз) относительно старта; since — записать длительность."""
+    now = time.perf_counter()
+    with _lock:
+        if event not in _marks:
+            _marks[event] = (now - _T0, None if since is None else now - since)
+
+
+def set_status(name, status):
+    with _changed:
+        if _status.get(name) == status:
+            return
+        _status[name] = status
+        _changed.notify_all()
+    if status != LOADING:
+        mark(f'{name}: {status}')
+        if not loading():
+            mark('all ready')
+
+
+def status(name=None):
+    """Статус ресурса (None — о нём ещё не слышали) или копия всех статусов."""
+    with _lock:
+        return _status.get(name) if name is not None else dict(_status)
+
+
+def loading():
+    """Имена ресурсов, которые ещё грузятся."""
+    with _lock:
+        return [n for n, s in _status.items() if s == LOADING]
+
+
+def wait(timeout=None):
+    """Дождаться, пока ничего не грузится. False — вышел timeout."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with _changed:
+        while any(s == LOADING for s in _status.values()):
+            left = None if deadline is None else deadline - time.monotonic()
+            if left is not None and left <= 0:
+                return False
+            _changed.wait(left)
+    return True
+
+
+def _task(name, load):
+    """load() -> READY/UNAVAILABLE (или None == READY); исключение — FAILED."""
+    t0 = time.perf_counter()
+    try:
+        result = load()
+    except Exception as e:
+        print(f'[startup] {name}: ошибка прогрева ({e})')
+        result = FAILED
+    set_status(name, result or READY)
+    mark(f'{name} load', since=t0)
+
+
+def start(cfg, only=None):
+    """
+    Запустить фоновый прогрев (повторный вызов ничего не делает). Сразу помечает ресурсы loading.
+    only — грузить только эти ресурсы. С procs.enabled ресурсы грузят процессы-воркеры framebus.py:
+    ProcessExecutor помечает их loading, а статусы воркеров приходят сюда через set_status.
+    """
+    global _started
+    if (cfg.get('procs', {}) or {}).get('enabled', False):
+        return
+    from templates import get_registry
+    from digits import get_digit_reader
+    from hud_model import get_hud_model, hud_model_configured
+    from ocr import get_ocr_worker
+    with _lock:
+        if _started:
+            return
+        _started = True
+    names = [n for n in ('templates', 'digits', 'hud_model', 'easyocr') if only is None or n in only]
+    for name in names:
+        set_status(name, LOADING)
+
+    def light():
+        if 'templates' in names:
+            _task('templates', lambda: get_registry(cfg) and None)
+        if 'digits' in names:
+            _task('digits', lambda: READY if get_digit_reader(cfg) is not None else UNAVAILABLE)
+
+    def model():
+        if 'hud_model' not in names:
+            return
+        if not hud_model_configured(cfg):
+            set_status('hud_model', UNAVAILABLE)
+            return
+        _task('hud_model', lambda: READY if get_hud_model(cfg) is not None else FAILED)
+
+    # easyocr прогревается в потоке самого OcrWorker (Reader живёт там) и сам ставит статус
+    if 'easyocr' in names:
+        worker = get_ocr_worker(cfg)
+        if worker is None:
+            set_status('easyocr', UNAVAILABLE)
+        else:
+            worker.warm()
+    for target, name in ((light, 'warmup-light'), (model, 'warmup-model')):
+        threading.Thread(target=target, name=name, daemon=True).start()
+
+
+def report():
+    """Строки профиля старта: события по времени от старта и длительности загрузок."""
+    with _lock:
+        marks = sorted(_marks.items(), key=lambda kv: kv[1][0])
+        pending = [n for n, s in _status.items() if s == LOADING]
+    lines = ['[startup] профиль старта (секунды от запуска):']
+    for event, (at, took) in marks:
+        lines.append(f'[startup] {at:8.3f}  {event}' + (f'  ({took:.3f}s)' if took is not None else ''))
+    if pending:
+        lines.append(f"[startup] ещё грузится: {', '.join(pending)}")
+    return lines
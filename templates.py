@@ -0,0 +1,167 @@
+"""
+Реестр шаблонов HUD-иконок (лампочка шестого чувства и др.).
+Все PNG из assets/ читаются и готовятся один раз: серый вариант, набор масштабов
+и диапазон «ярких» оттенков иконки для предфильтра. В кадре ROI переводится в серый
+и HSV-гистограмму один раз, затем matchTemplate запускается только для иконок,
+чьих цветов в ROI достаточно.
+"""
+import os
+import threading
+import cv2
+import numpy as np
+from layout import work_scale
+
+VIVID_S = 100  # пиксель считается «цветным», если S и V не ниже порогов
+VIVID_V = 120
+
+
+def _vivid_mask(hsv):
+    return cv2.inRange(hsv, (0, VIVID_S, VIVID_V), (179, 255, 255))
+
+
+def _hue_range(hues):
+    """Узкий диапазон оттенков (5..95 перцентиль) с учётом того, что красный переходит через 0/179."""
+    best = None
+    for shift in (0, 90):
+        h = (hues.astype(np.int32) + shift) % 180
+        lo, hi = np.percentile(h, [5, 95])
+        if best is None or hi - lo < best[1] - best[0]:
+            best = (lo, hi, shift)
+    lo, hi, shift = best
+    return int(np.floor(lo) - shift) % 180, int(np.ceil(hi) - shift) % 180
+
+
+class HudTemplate:
+    def __init__(self, name, image, scales=(1.0,), threshold=0.6):
+        if image.ndim == 3 and image.shape[2] == 4:
+            bgr = image[:, :, :3]
+            opaque = image[:, :, 3] > 128
+        else:
+            bgr = image if image.ndim == 3 else cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+            opaque = np.ones(bgr.shape[:2], bool)
+        self.name = name
+        self.threshold = float(threshold)
+        gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+        self.levels = []  # [(scale, серый шаблон)]
+        for s in scales:
+            g = gray if s == 1.0 else cv2.resize(gray, None, fx=s, fy=s, interpolation=cv2.INTER_AREA)
+            if min(g.shape[:2]) >= 4:
+                self.levels.append((float(s), g))
+
+        vivid = (_vivid_mask(cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)) > 0) & opaque
+        self.vivid_frac = float(vivid.sum()) / max(1, int(opaque.sum()))
+        if self.vivid_frac >= 0.05:
+            hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+            self.hue_range = _hue_range(hsv[:, :, 0][vivid])
+        else:
+            self.hue_range = None  # серая иконка — предфильтр по цвету бессмыслен
+
+    def colour_pixels_needed(self, ratio):
+        """Сколько пикселей цвета иконки должно быть в ROI, чтобы стоило запускать matchTemplate."""
+        area = min(g.shape[0] * g.shape[1] for _, g in self.levels)
+        return ratio * self.vivid_frac * area
+
+
+class TemplateRegistry:
+    def __init__(self, scales=(1.0,), prefilter=True, prefilter_ratio=0.3, default_threshold=0.6):
+        self.scales = tuple(scales) or (1.0,)
+        self.prefilter = bool(prefilter)
+        self.prefilter_ratio = float(prefilter_ratio)
+        self.default_threshold = float(default_threshold)
+        self.templates = {}
+        self.stats = {'matched': 0, 'skipped': 0}
+
+    def add(self, name, image, threshold=None):
+        tpl = HudTemplate(name, image, self.scales,
+                          self.default_threshold if threshold is None else threshold)
+        if not tpl.levels:
+            print(f"[templates] шаблон '{name}' слишком мал для масштабов {self.scales}, пропущен")
+            return None
+        self.templates[name] = tpl
+        return tpl
+
+    def load_file(self, path, name=None, threshold=None):
+        img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if img is None:
+            print(f"[templates] не удалось прочитать шаблон {path}")
+            return None
+        name = name or os.path.splitext(os.path.basename(path))[0]
+        return self.add(name, img, threshold)
+
+    def load_dir(self, path, thresholds=None):
+        thresholds = thresholds or {}
+        if not os.path.isdir(path):
+            print(f"[templates] каталог шаблонов {path} не найден")
+            return self
+        for f in sorted(os.listdir(path)):
+            if f.lower().endswith('.png'):
+                name = os.path.splitext(f)[0]
+                self.load_file(os.path.join(path, f), name, thresholds.get(name))
+        return self
+
+    def _hue_hist(self, hsv):
+        hist = cv2.calcHist([hsv], [0], _vivid_mask(hsv), [180], [0, 180]).ravel()
+        return np.concatenate([[0.0], np.cumsum(hist)])
+
+    @staticmethod
+    def _hue_count(cum, hue_range):
+        lo, hi = hue_range
+        if lo <= hi:
+            return cum[hi + 1] - cum[lo]
+        return (cum[180] - cum[lo]) + cum[hi + 1]  # диапазон через 0 (красный)
+
+    def match(self, roi_bgr, names=None):
+        """{name: (found, score, scale)} для всех (или перечисленных) иконок за один проход по ROI."""
+        gray = cv2.cvtColor(roi_bgr, cv2.COLOR_BGR2GRAY)
+        cum = self._hue_hist(cv2.cvtColor(roi_bgr, cv2.COLOR_BGR2HSV)) if self.prefilter else None
+        out = {}
+        for name in (names or self.templates):
+            tpl = self.templates.get(name)
+            if tpl is None:
+                continue
+            if cum is not None and tpl.hue_range is not None and \
+                    self._hue_count(cum, tpl.hue_range) < tpl.colour_pixels_needed(self.prefilter_ratio):
+                self.stats['skipped'] += 1
+                out[name] = (False, 0.0, None)
+                continue
+            best, best_scale = 0.0, None
+            for scale, g in tpl.levels:
+                if g.shape[0] > gray.shape[0] or g.shape[1] > gray.shape[1]:
+                    continue
+                res = cv2.matchTemplate(gray, g, cv2.TM_CCOEFF_NORMED)
+                _, max_val, _, _ = cv2.minMaxLoc(res)
+                if max_val > best:
+                    best, best_scale = float(max_val), scale
+            self.stats['matched'] += 1
+            out[name] = (best > tpl.threshold, best, best_scale)
+        return out
+
+
+_registry = None
+_registry_key = None
+_registry_lock = threading.Lock()
+
+
+def get_registry(cfg):
+    """
+    Общий реестр по секциям templates/assets конфига; пересобирается только при их изменении.
+    Шаблоны сняты на layout.base: при другом layout.work_size масштабы домножаются на work_scale.
+    """
+    global _registry, _registry_key
+    tcfg = cfg.get('templates', {}) or {}
+    sixth = (cfg.get('assets', {}) or {}).get('sixth_sense_template', '')
+    k = work_scale(cfg)
+    key = (tcfg.get('dir', 'assets'), tuple(float(s) * k for s in tcfg.get('scales', [1.0])), bool(tcfg.get('prefilter', True)),
+           float(tcfg.get('prefilter_ratio', 0.3)), tuple(sorted((tcfg.get('thresholds') or {}).items())), sixth)
+    with _registry_lock:
+        if _registry is None or key != _registry_key:
+            reg = TemplateRegistry(scales=key[1], prefilter=key[2], prefilter_ratio=key[3])
+            reg.load_dir(key[0], dict(key[4]))
+            if sixth and os.path.exists(sixth):
+                in_dir = os.path.abspath(os.path.dirname(sixth)) == os.path.abspath(key[0])
+                if not (in_dir and os.path.splitext(os.path.basename(sixth))[0] == 'sixth_sense'):
+                    reg.load_file(sixth, 'sixth_sense', dict(key[4]).get('sixth_sense'))
+            elif sixth:
+                print(f"[templates] шаблон шестого чувства {sixth} не найден")
+            _registry, _registry_key = reg, key
+        return _registry
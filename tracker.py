@@ -0,0 +1,244 @@
+"""
+Трекинг маркеров миникарты между кадрами.
+Треки (id, класс, позиция, скорость, время последнего наблюдения) обновляются дёшево:
+окна поиска вокруг предсказанных позиций активных треков (видны в пределах hold) собираются
+в одну мозаику, классифицируются одним вызовом HsvClassifier, центры масс считаются векторно.
+Полный detect_minimap запускается по расписанию (новые маркеры), когда доля найденных треков
+падает ниже min_confidence или когда окон так много, что полный проход дешевле.
+"""
+import threading
+import time
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+import perception  # модулем, а не from-import: perception сам импортирует tracker
+from colorseg import get_hsv_classifier
+from layout import work_scale
+
+
+# треки — строки структурного массива: обновления векторные, без объекта на трек
+TRACK_DTYPE = np.dtype([('id', np.int64), ('cls', np.int16), ('x', np.float64), ('y', np.float64),
+                        ('vx', np.float64), ('vy', np.float64), ('t_seen', np.float64),
+                        ('hits', np.int64), ('misses', np.int64)])
+
+
+class MinimapTracker:
+    """
+    Радиусы (search_radius, gate) — доли стороны миникарты, как cluster_radius.
+    hold — сколько секунд трек без подтверждения ещё считается видимым (против мерцания счётчиков);
+    локально ищутся только такие треки, потерянные ждут полного поиска до max_age.
+    max_local_area — если окна активных треков вместе больше этой доли площади миникарты, локальный
+    поиск дороже полного прохода detect_minimap, и кадр идёт полным.
+    """
+    def __init__(self, full_interval=0.5, search_radius=0.035, gate=0.06, hold=0.5, max_age=3.0,
+                 min_confidence=0.7, max_local_area=0.25, cluster_radius=None, min_area=None, min_pixels=6):
+        self.full_interval = float(full_interval)
+        self.search_radius = float(search_radius)
+        self.gate = float(gate)
+        self.hold = float(hold)
+        self.max_age = float(max_age)
+        self.min_confidence = float(min_confidence)
+        self.max_local_area = float(max_local_area)
+        self.cluster_radius = float(perception.CLUSTER_RADIUS if cluster_radius is None else cluster_radius)
+        self.min_area = perception.MIN_MARKER_AREA if min_area is None else min_area
+        self.min_pixels = int(min_pixels)
+        self.tracks = np.empty(0, TRACK_DTYPE)
+        self.stats = {'full': 0, 'local': 0}
+        self._classes = ()
+        self._class_bits = np.empty(0, np.uint8)
+        self._next_id = 1
+        self._last_full = None
+        self._force_full = True
+        self._lock = threading.Lock()
+
+    def update(self, minimap_bgr, hsv_cfg, now=None):
+        now = time.monotonic() if now is None else now
+        clf = get_hsv_classifier(hsv_cfg)
+        with self._lock:
+            self._sync_classes(clf)
+            h, w = minimap_bgr.shape[:2]
+            side = min(h, w)
+            win = self._window(side)
+            t = self.tracks
+            active = np.flatnonzero((t['misses'] == 0) | (now - t['t_seen'] <= self.hold))
+            if self._force_full or not len(active) or self._last_full is None or \
+                    now - self._last_full >= self.full_interval or win > side or \
+                    len(active) * win * win > self.max_local_area * h * w:
+                self._full(minimap_bgr, hsv_cfg, clf, side, now)
+                mode = 'full'
+            else:
+                self._local(minimap_bgr, clf, active, win, now)
+                mode = 'local'
+            self.stats[mode] += 1
+            self.tracks = self.tracks[now - self.tracks['t_seen'] <= self.max_age]
+            if mode == 'local':
+                self._merge_duplicates(side)  # после полного кадра треки и детекции один к одному
+            return self._state(side, now, mode)
+
+    def _sync_classes(self, clf):
+        """Другой набор классов minimap_hsv — старые треки не с чем сопоставить."""
+        classes = tuple(clf.classes)
+        if classes != self._classes:
+            self._classes = classes
+            self._class_bits = np.array([clf.class_bits[c] for c in classes], np.uint8)
+            self.tracks = np.empty(0, TRACK_DTYPE)
+            self._force_full = True
+
+    def _window(self, side):
+        return 2 * max(3, int(round(self.search_radius * side))) + 1
+
+    def _predict(self, idx, now):
+        t = self.tracks[idx]
+        dt = now - t['t_seen']
+        return t['x'] + t['vx'] * dt, t['y'] + t['vy'] * dt
+
+    def _observe(self, idx, x, y, now, alpha=0.5):
+        """Подтвердить треки idx позициями x, y (сглаживание скорости alpha)."""
+        t = self.tracks
+        dt = now - t['t_seen'][idx]
+        moved = dt > 0
+        dt = np.where(moved, dt, 1.0)
+        t['vx'][idx] += np.where(moved, alpha * ((x - t['x'][idx]) / dt - t['vx'][idx]), 0.0)
+        t['vy'][idx] += np.where(moved, alpha * ((y - t['y'][idx]) / dt - t['vy'][idx]), 0.0)
+        t['x'][idx] = x
+        t['y'][idx] = y
+        t['t_seen'][idx] = now
+        t['hits'][idx] += 1
+        t['misses'][idx] = 0
+
+    def _full(self, minimap_bgr, hsv_cfg, clf, side, now):
+        det = perception.detect_minimap(minimap_bgr, hsv_cfg, cluster_radius=self.cluster_radius,
+                                        min_area=self.min_area, cluster=False)
+        gate = self.gate * side
+        for ci, cls in enumerate(self._classes):
+            self._associate(ci, det[f'{cls}_points'], gate, now)
+        self._last_full = now
+        self._force_full = False
+
+    def _associate(self, ci, points, gate, now):
+        idx = np.flatnonzero(self.tracks['cls'] == ci)
+        det = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        hit_t = np.zeros(len(idx), bool)
+        hit_d = np.zeros(len(det), bool)
+        if len(idx) and len(det):
+            px, py = self._predict(idx, now)
+            dx = px[:, None] - np.ascontiguousarray(det[:, 0])
+            dy = py[:, None] - np.ascontiguousarray(det[:, 1])
+            d = dx * dx + dy * dy  # квадраты расстояний: порядок пар тот же
+            d[d > gate * gate] = np.inf
+            # жадно, ближайшие пары первыми. Взаимно ближайшие пары жадный проход берёт всегда, поэтому
+            # раундами: все взаимно ближайшие пары разом, потом то же на оставшихся
+            rows, cols = np.arange(len(idx)), np.arange(len(det))
+            pairs_t, pairs_d = [], []
+            while len(rows) and len(cols) and np.isfinite(d).any():
+                best = d.argmin(axis=1)
+                r = np.arange(len(rows))
+                mutual = np.isfinite(d[r, best]) & (d.argmin(axis=0)[best] == r)
+                pairs_t += rows[mutual].tolist()
+                pairs_d += cols[best[mutual]].tolist()
+                keep_c = np.ones(len(cols), bool)
+                keep_c[best[mutual]] = False
+                keep_r = ~mutual & np.isfinite(d).any(axis=1)
+                rows, cols = rows[keep_r], cols[keep_c]
+                d = d[keep_r][:, keep_c]
+            hit_t[pairs_t] = True
+            hit_d[pairs_d] = True
+            if pairs_t:
+                self._observe(idx[pairs_t], det[pairs_d, 0], det[pairs_d, 1], now)
+        self.tracks['misses'][idx[~hit_t]] += 1
+        new = det[~hit_d]
+        if len(new):
+            born = np.zeros(len(new), TRACK_DTYPE)
+            born['id'] = np.arange(self._next_id, self._next_id + len(new))
+            born['cls'] = ci
+            born['x'], born['y'] = new[:, 0], new[:, 1]
+            born['t_seen'] = now
+            born['hits'] = 1
+            self._next_id += len(new)
+            self.tracks = np.concatenate([self.tracks, born])
+
+    def _local(self, minimap_bgr, clf, active, win, now):
+        h, w = minimap_bgr.shape[:2]
+        r = win // 2
+        px, py = self._predict(active, now)
+        x0 = np.clip(np.round(px).astype(np.int64) - r, 0, w - win)
+        y0 = np.clip(np.round(py).astype(np.int64) - r, 0, h - win)
+        off = np.arange(win)
+        # окна всех активных треков одним индексированием -> мозаика (N*win, win, 3) -> один проход классификатора
+        windows = sliding_window_view(minimap_bgr, (win, win), axis=(0, 1))  # вид (h', w', 3, win, win), без копии
+        patches = np.ascontiguousarray(windows[y0, x0].transpose(0, 2, 3, 1))
+        bits = clf.classify(patches.reshape(-1, win, 3)).reshape(-1, win, win)
+        cls_bits = self._class_bits[self.tracks['cls'][active]]
+        m = ((bits & cls_bits[:, None, None]) != 0).astype(np.float32)
+        m00 = m.sum(axis=(1, 2))
+        m10 = m.sum(axis=1) @ off
+        m01 = m.sum(axis=2) @ off
+        found = (m00 >= self.min_pixels) & (m00 <= 0.5 * win * win)  # слишком много пикселей — окно захватило соседей
+        m00 = np.where(found, m00, 1.0)
+        self._observe(active[found], (x0 + m10 / m00)[found], (y0 + m01 / m00)[found], now)
+        self.tracks['misses'][active[~found]] += 1
+        if found.mean() < self.min_confidence:
+            self._force_full = True
+
+    def _merge_duplicates(self, side):
+        """Два трека одного класса на одном маркере (окна захватили одно пятно) — оставляем старший."""
+        t = self.tracks
+        if len(t) < 2:
+            return
+        x, y = t['x'].copy(), t['y'].copy()
+        dx, dy = x[:, None] - x, y[:, None] - y
+        close = dx * dx + dy * dy <= (0.5 * self.search_radius * side) ** 2
+        close &= t['cls'][:, None] == t['cls'][None, :]
+        np.fill_diagonal(close, False)
+        if not close.any():
+            return
+        keep = np.ones(len(t), bool)
+        order = np.lexsort((t['id'], -t['hits']))
+        for i in order[close.any(axis=1)[order]].tolist():  # только треки, у которых есть дубль
+            if keep[i]:
+                keep[close[i]] = False
+        self.tracks = t[keep]
+
+    def _state(self, side, now, mode):
+        eps = self.cluster_radius * side
+        t = self.tracks
+        out = {'tracks': [], 'tracker_mode': mode}
+        visible = now - t['t_seen'] <= self.hold
+        for ci, cls in enumerate(self._classes):
+            sel = t[visible & (t['cls'] == ci)]
+            points = list(zip(sel['x'].astype(int).tolist(), sel['y'].astype(int).tolist()))
+            centers_list, sizes = perception.cluster_points(points, eps)
+            out[f'{cls}_points'] = points
+            out[f'{cls}_clusters'] = centers_list
+            out[f'{cls}_cluster_sizes'] = sizes
+        out['tracks'] = [{'id': i, 'cls': self._classes[c], 'x': x, 'y': y, 'vx': vx, 'vy': vy, 'since_seen': now - ts}
+                         for i, c, x, y, vx, vy, ts in zip(t['id'].tolist(), t['cls'].tolist(), t['x'].tolist(),
+                                                           t['y'].tolist(), t['vx'].tolist(), t['vy'].tolist(),
+                                                           t['t_seen'].tolist())]
+        return out
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_tracker(cfg):
+    """Общий трекер по секции tracker конфига; None, если трекинг выключен."""
+    global _tracker
+    tcfg = cfg.get('tracker', {}) or {}
+    if not tcfg.get('enabled', True):
+        return None
+    with _tracker_lock:
+        if _tracker is None:
+            mcfg = cfg.get('minimap', {}) or {}
+            _tracker = MinimapTracker(
+                full_interval=tcfg.get('full_interval', 0.5),
+                search_radius=tcfg.get('search_radius', 0.035),
+                gate=tcfg.get('gate', 0.06),
+                hold=tcfg.get('hold', 0.5),
+                max_age=tcfg.get('max_age', 3.0),
+                min_confidence=tcfg.get('min_confidence', 0.7),
+                max_local_area=tcfg.get('max_local_area', 0.25),
+                cluster_radius=mcfg.get('cluster_radius'),
+                min_area=mcfg.get('min_marker_area', perception.MIN_MARKER_AREA) * work_scale(cfg) ** 2,
+            )
+        return _tracker
@@ -0,0 +1,68 @@
+"""
+Самообучение RotNet на записанных кадрах: сеть угадывает поворот (0/90/180/270) кадра.
+Данные — memory-mapped массивы из roi_arrays.py (квадратный размер ROI):
+
+    python roi_arrays.py dataset/session_* --out arrays/ --size _full=224x224
+    python train_rotnet.py --data arrays/ --roi _full --epochs 5 --batch-size 64
+"""
+import argparse
+import os
+import time
+
+
+def main():
+    try:
+        import torch
+        from torchvision.models import resnet18
+    except Exception:
+        print('Установи torch и torchvision: pip install torch torchvision')
+        return
+    from roi_arrays import make_loader
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--data', required=True, help='каталог массивов roi_arrays.py')
+    ap.add_argument('--roi', default='_full')
+    ap.add_argument('--epochs', type=int, default=5)
+    ap.add_argument('--batch-size', type=int, default=64)
+    ap.add_argument('--lr', type=float, default=1e-3)
+    ap.add_argument('--workers', type=int, default=2, help='процессы DataLoader')
+    ap.add_argument('--threads', type=int, default=0, help='torch.set_num_threads, 0 — по умолчанию')
+    ap.add_argument('--out', default='models/rotnet_resnet18.pth')
+    args = ap.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    loader = make_loader(args.data, args.roi, batch_size=args.batch_size, workers=args.workers, rotnet=True)
+    model = resnet18(num_classes=4)
+    opt = torch.optim.Adam(model.parameters(), lr=args.lr)
+    loss_fn = torch.nn.CrossEntropyLoss()
+    mean = torch.tensor([0.485, 0.456, 0.406]).view(1, 3, 1, 1)
+    std = torch.tensor([0.229, 0.224, 0.225]).view(1, 3, 1, 1)
+
+    for epoch in range(args.epochs):
+        loader.dataset.set_epoch(epoch)
+        model.train()
+        t0 = time.perf_counter()
+        seen, correct, total_loss = 0, 0, 0.0
+        for x, y in loader:
+            # uint8 BGR -> float RGB одним действием на батч
+            x = (x[:, [2, 1, 0]].float().div_(255) - mean) / std
+            logits = model(x)
+            loss = loss_fn(logits, y)
+            opt.zero_grad()
+            loss.backward()
+            opt.step()
+            seen += len(y)
+            correct += int((logits.argmax(1) == y).sum())
+            total_loss += float(loss) * len(y)
+        dt = time.perf_counter() - t0
+        print(f'[rotnet] эпоха {epoch + 1}/{args.epochs}: loss {total_loss / max(1, seen):.4f}, '
+              f'acc {correct / max(1, seen):.3f}, {dt:.1f}s ({seen / dt:.0f} img/s)')
+
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    torch.save(model.state_dict(), args.out)
+    print(f'[rotnet] модель -> {args.out}')
+
+
+if __name__ == '__main__':
+    main()
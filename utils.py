@@ -2,14 +2,31 @@ import time
 
 
 class FpsMeter:
-    def __init__(self):
-        self.prev = time.time()
+    """FPS по сглаженному (EMA) интервалу между кадрами, а не мгновенное 1/dt."""
+    def __init__(self, alpha=0.1):
+        self.alpha = alpha
+        self.prev = time.perf_counter()
+        self.dt = 0.0
         self.fps = 0.0
 
     def tick(self):
-        now = time.time()
+        now = time.perf_counter()
         dt = now - self.prev
         self.prev = now
         if dt > 0:
-            self.fps = 1.0/dt
+            self.dt = dt if self.dt == 0.0 else self.dt + self.alpha * (dt - self.dt)
+            self.fps = 1.0 / self.dt
         return self.fps
+
+
+class LatencyMeter:
+    """Задержка «кадр захвачен -> совет показан»: последняя и сглаженная (EMA), в секундах."""
+    def __init__(self, alpha=0.1):
+        self.alpha = alpha
+        self.last = 0.0
+        self.avg = 0.0
+
+    def add(self, seconds):
+        self.last = seconds
+        self.avg = seconds if self.avg == 0.0 else self.avg + self.alpha * (seconds - self.avg)
+        return self.avg